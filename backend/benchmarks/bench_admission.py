@@ -0,0 +1,159 @@
+"""Benchmark Earth Engine admission control under mixed interactive and batch load
+
+Dashboard users call /api/analyze one at a time with a short think time
+while batch workers flood /api/analyze/batch. The simulated Earth Engine
+serves a fixed number of requests at once and rejects the rest with a quota
+error, as the real service does. Each scenario runs with admission control
+off (everything goes straight to the backend) and on, and reports
+interactive latency percentiles, 429s and 5xx errors, and the batch
+throughput that got through.
+
+Run from the backend folder:
+    python -m benchmarks.bench_admission --seconds 10 --users 16 --batch-workers 8
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import threading
+import time
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+import main
+from services import admission_service
+from services.admission_service import AdmissionController
+from benchmarks.simulated_backends import LatencyProfile, SimulatedFailure, SimulatedImageryBackend
+
+POLYGON = [[36.80, -1.30], [36.82, -1.30], [36.82, -1.28], [36.80, -1.28], [36.80, -1.30]]
+
+
+class QuotaImageryBackend(SimulatedImageryBackend):
+    """Simulated imagery that fails calls beyond max_concurrent in flight"""
+
+    def __init__(self, profile: LatencyProfile, max_concurrent: int):
+        super().__init__(profile)
+        self.max_concurrent = max_concurrent
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def calculate_degradation_indicators(self, polygon: List[List[float]], date: str) -> Dict:
+        with self._lock:
+            self._in_flight += 1
+            over = self._in_flight > self.max_concurrent
+        try:
+            if over:
+                raise SimulatedFailure("Too many concurrent aggregations")
+            return super().calculate_degradation_indicators(polygon, date)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+def install(args: argparse.Namespace, admission: bool) -> None:
+    main.imagery_backend = QuotaImageryBackend(
+        LatencyProfile(args.ee_latency, args.ee_latency * 0.2, seed=1),
+        args.ee_max_concurrent
+    )
+    main.db_service = None
+    main.monitor = None
+    controller = AdmissionController(
+        rate=args.rate,
+        burst=args.burst,
+        max_queued={'interactive': args.max_queued, 'batch': args.max_queued * 10},
+        max_wait={'interactive': args.max_wait, 'batch': args.max_wait * 30},
+        quota_backoff=1.0
+    ) if admission else None
+    # imagery_service reads the controller from admission_service, main from its own import
+    admission_service.ee_admission = controller
+    main.ee_admission = controller
+
+
+async def run_scenario(args: argparse.Namespace, admission: bool) -> Dict:
+    install(args, admission)
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    batch_polygons = 0
+    deadline = time.perf_counter() + args.seconds
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url='http://bench', timeout=None) as client:
+        async def user(i: int):
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await client.post('/api/analyze', json={'polygon': POLYGON, 'location_name': f'User {i}', 'end_date': '2024-06-01'})
+                key = str(response.status_code)
+                statuses[key] = statuses.get(key, 0) + 1
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+                    await asyncio.sleep(args.think)
+                elif response.status_code == 429:
+                    await asyncio.sleep(min(args.think * 4, float(response.headers.get('Retry-After', 1))))
+                else:
+                    await asyncio.sleep(args.think)
+
+        async def batch_worker(i: int):
+            nonlocal batch_polygons
+            polygons = [{'name': f'batch-{i}-{j}', 'polygon': POLYGON} for j in range(args.batch_size)]
+            while time.perf_counter() < deadline:
+                response = await client.post('/api/analyze/batch', json={'polygons': polygons, 'end_date': '2024-06-01'})
+                if response.status_code == 200:
+                    body = response.json()
+                    batch_polygons += body['count'] - body['failed']
+                else:
+                    await asyncio.sleep(float(response.headers.get('Retry-After', 0.5)))
+
+        await asyncio.gather(
+            *(user(i) for i in range(args.users)),
+            *(batch_worker(i) for i in range(args.batch_workers))
+        )
+
+    ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        'admission': admission,
+        'interactive_ok': len(latencies),
+        'interactive_statuses': dict(sorted(statuses.items())),
+        'interactive_p50_ms': round(float(np.percentile(ms, 50)), 1),
+        'interactive_p95_ms': round(float(np.percentile(ms, 95)), 1),
+        'interactive_p99_ms': round(float(np.percentile(ms, 99)), 1),
+        'batch_polygons_per_second': round(batch_polygons / args.seconds, 1),
+        'admission_stats': admission_service.ee_admission.stats() if admission else None
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--users', type=int, default=16, help='Interactive clients')
+    parser.add_argument('--think', type=float, default=0.2, help='Seconds between a user\'s requests')
+    parser.add_argument('--batch-workers', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=5, help='Polygons per batch request')
+    parser.add_argument('--ee-latency', type=float, default=0.1, help='Seconds per Earth Engine call')
+    parser.add_argument('--ee-max-concurrent', type=int, default=8, help='Calls Earth Engine serves at once')
+    parser.add_argument('--rate', type=float, default=60, help='Admitted requests per second')
+    parser.add_argument('--burst', type=float, default=8)
+    parser.add_argument('--max-queued', type=int, default=100, help='Interactive queue bound (batch gets 10x)')
+    parser.add_argument('--max-wait', type=float, default=2, help='Interactive max wait (batch gets 30x)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = [asyncio.run(run_scenario(args, admission)) for admission in (False, True)]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{args.users} users + {args.batch_workers} batch workers for {args.seconds}s; "
+          f"Earth Engine serves {args.ee_max_concurrent} calls at once, {args.ee_latency}s each")
+    print(f"{'admission':<11}{'ok':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'batch poly/s':>14}  statuses")
+    for r in results:
+        print(f"{'on' if r['admission'] else 'off':<11}{r['interactive_ok']:>7}{r['interactive_p50_ms']:>9}"
+              f"{r['interactive_p95_ms']:>9}{r['interactive_p99_ms']:>9}{r['batch_polygons_per_second']:>14}  "
+              f"{r['interactive_statuses']}")
+
+
+if __name__ == '__main__':
+    main_cli()
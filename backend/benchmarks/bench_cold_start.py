@@ -0,0 +1,140 @@
+"""Benchmark cold start: import time and time to first response
+
+Each run starts a fresh interpreter, so nothing is cached between runs.
+Measures:
+  - how long `import main` takes, and the slowest top-level imports
+    (from python -X importtime)
+  - for a real uvicorn process, the time from launch to the first 200 from
+    /api/health, and to /api/ready settling (every dependency out of the
+    pending state), with the per-dependency warm-up times it reports
+
+Without Earth Engine, Supabase or Anthropic credentials the dependencies
+settle as failed; the timings still show what the warm-up costs.
+
+Run from the backend folder:
+    python -m benchmarks.bench_cold_start --runs 5
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+
+def import_seconds() -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def slowest_imports(count: int) -> list:
+    """Top-level modules imported by main, by cumulative import time"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], capture_output=True, text=True).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Direct imports of main are nested one level (two spaces) in the report
+        if name.startswith('   ') and not name.startswith('    '):
+            modules.append((name.strip(), int(cumulative) / 1e6))
+    return [{'module': name, 'seconds': round(seconds, 3)} for name, seconds in sorted(modules, key=lambda m: -m[1])[:count]]
+
+
+def get_json(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve_timings(ready_timeout: float) -> dict:
+    """Launch uvicorn and time /api/health and /api/ready from process start"""
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning'],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env=dict(os.environ, PYTHONUNBUFFERED='1')
+    )
+    try:
+        health = None
+        while health is None and time.perf_counter() - start < ready_timeout:
+            try:
+                if get_json(base + '/api/health')[0] == 200:
+                    health = time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+
+        settled, body = None, {}
+        while health is not None and time.perf_counter() - start < ready_timeout:
+            _, body = get_json(base + '/api/ready')
+            if all(d['state'] != 'pending' for d in body['dependencies'].values()):
+                settled = time.perf_counter() - start
+                break
+            time.sleep(0.02)
+
+        return {
+            'first_response_seconds': round(health, 3) if health is not None else None,
+            'ready_settled_seconds': round(settled, 3) if settled is not None else None,
+            'status': body.get('status'),
+            'dependencies': {name: (d['state'], d.get('seconds')) for name, d in body.get('dependencies', {}).items()}
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--ready-timeout', type=float, default=60)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    imports = [import_seconds() for _ in range(args.runs)]
+    serves = [serve_timings(args.ready_timeout) for _ in range(args.runs)]
+    first = [s['first_response_seconds'] for s in serves if s['first_response_seconds'] is not None]
+    settled = [s['ready_settled_seconds'] for s in serves if s['ready_settled_seconds'] is not None]
+
+    results = {
+        'runs': args.runs,
+        'import_main_seconds': {'p50': round(float(np.median(imports)), 3), 'max': round(max(imports), 3)},
+        'slowest_imports': slowest_imports(8),
+        'first_response_seconds': {'p50': round(float(np.median(first)), 3), 'max': round(max(first), 3)} if first else None,
+        'ready_settled_seconds': {'p50': round(float(np.median(settled)), 3), 'max': round(max(settled), 3)} if settled else None,
+        'last_ready': {'status': serves[-1]['status'], 'dependencies': serves[-1]['dependencies']}
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"import main: p50 {results['import_main_seconds']['p50']}s, max {results['import_main_seconds']['max']}s over {args.runs} runs")
+    for module in results['slowest_imports']:
+        print(f"  {module['module']:<40}{module['seconds']:>8}s")
+    if first:
+        print(f"launch to first /api/health: p50 {results['first_response_seconds']['p50']}s")
+    if settled:
+        print(f"launch to /api/ready settled: p50 {results['ready_settled_seconds']['p50']}s ({results['last_ready']['status']})")
+    for name, (state, seconds) in results['last_ready']['dependencies'].items():
+        print(f"  {name:<16}{state:<10}{'-' if seconds is None else f'{seconds}s'}")
+
+
+if __name__ == '__main__':
+    main()
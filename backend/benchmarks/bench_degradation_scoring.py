@@ -0,0 +1,115 @@
+"""Benchmark vectorized vs scalar degradation scoring
+
+Run from the backend folder:
+    python -m benchmarks.bench_degradation_scoring --rows 1000000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from services.degradation_service import DegradationAnalyzer
+
+
+def make_rows(n: int, seed: int = 42) -> dict:
+    rng = np.random.default_rng(seed)
+    return {
+        'ndvi': rng.uniform(-0.2, 0.9, n),
+        'ndmi': rng.uniform(-0.3, 0.6, n),
+        'bsi': rng.uniform(-0.3, 0.6, n),
+        'erosion': rng.uniform(0.0, 1.0, n)
+    }
+
+
+def make_fixed_precision_rows(n: int, decimals: int, seed: int = 7) -> dict:
+    """Rows quantized like stored indicators, which is where rounding ties show up"""
+    return {k: np.round(v, decimals) for k, v in make_rows(n, seed).items()}
+
+
+def make_tie_rows(n: int, seed: int = 11) -> dict:
+    """Rows whose indicator percentages sit exactly on a rounding tie (12.35 -> 1 decimal)"""
+    rng = np.random.default_rng(seed)
+    def ties(low: float, high: float):
+        return (rng.integers(int(low * 1000), int(high * 1000), n) * 10 + 5) / 10000
+    return {
+        'ndvi': ties(-0.2, 0.9),
+        'ndmi': ties(-0.3, 0.6),
+        'bsi': ties(-0.3, 0.6),
+        'erosion': ties(0.0, 1.0)
+    }
+
+
+def check_parity(analyzer: DegradationAnalyzer, rows: dict, sample: int) -> int:
+    """Compare the vectorized output with calculate_score row by row"""
+    subset = {k: v[:sample] for k, v in rows.items()}
+    vectorized = analyzer.calculate_scores(subset)
+    mismatches = 0
+    for i in range(sample):
+        scalar = analyzer.calculate_score({
+            'ndvi': float(subset['ndvi'][i]),
+            'ndmi': float(subset['ndmi'][i]),
+            'bare_soil_index': float(subset['bsi'][i]),
+            'erosion_risk': float(subset['erosion'][i])
+        })
+        factors = [f for f in (vectorized['primary_factor_1'][i], vectorized['primary_factor_2'][i]) if f]
+        if (scalar['degradation_score'] != vectorized['degradation_score'][i]
+                or scalar['severity'] != vectorized['severity'][i]
+                or scalar['primary_factors'] != factors
+                or any(scalar['indicators'][k] != vectorized[k][i] for k in scalar['indicators'])):
+            mismatches += 1
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--scalar-rows', type=int, default=20_000)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    analyzer = DegradationAnalyzer()
+    rows = make_rows(args.rows)
+
+    vectorized_times = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        analyzer.calculate_scores(rows)
+        vectorized_times.append(time.perf_counter() - start)
+    best = min(vectorized_times)
+
+    scalar_rows = min(args.scalar_rows, args.rows)
+    start = time.perf_counter()
+    for i in range(scalar_rows):
+        analyzer.calculate_score({
+            'ndvi': float(rows['ndvi'][i]),
+            'ndmi': float(rows['ndmi'][i]),
+            'bare_soil_index': float(rows['bsi'][i]),
+            'erosion_risk': float(rows['erosion'][i])
+        })
+    scalar_elapsed = time.perf_counter() - start
+
+    results = {
+        'rows': args.rows,
+        'vectorized_seconds': round(best, 4),
+        'vectorized_rows_per_second': round(args.rows / best),
+        'scalar_rows_per_second': round(scalar_rows / scalar_elapsed),
+        'speedup': round((args.rows / best) / (scalar_rows / scalar_elapsed), 1),
+        'parity_mismatches': {
+            'uniform': check_parity(analyzer, rows, scalar_rows),
+            'three_decimals': check_parity(analyzer, make_fixed_precision_rows(scalar_rows, 3), scalar_rows),
+            'four_decimals': check_parity(analyzer, make_fixed_precision_rows(scalar_rows, 4), scalar_rows),
+            'ties': check_parity(analyzer, make_tie_rows(scalar_rows), scalar_rows)
+        }
+    }
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for key, value in results.items():
+            print(f"{key:>28}: {value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""Endpoint latency benchmark against simulated Earth Engine, Supabase and Anthropic
+
+Drives the FastAPI app in-process (no sockets) with the real handlers and
+services wired to stand-ins with injected latency and failure rates, and
+reports p50/p95/p99 latency and requests per second per endpoint and
+concurrency level.
+
+Run from the backend folder:
+    python -m benchmarks.bench_endpoints --concurrency 1 8 32 --requests 200 \
+        --ee-latency 0.05 --db-latency 0.01 --ai-latency 0.1 --out bench_endpoints.json
+
+Compare runs by diffing the JSON files written with --out. Earth Engine
+admission control and the recommendation cache are off unless --admission
+or --cache is given, so the numbers reflect the handlers and backends.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import httpx
+
+import main
+from benchmarks.simulated_backends import (
+    LatencyProfile,
+    SimulatedImageryBackend,
+    simulated_database_service,
+    simulated_ai_service
+)
+from services import admission_service
+from services.cache_service import ResultCache
+
+POLYGON = [[36.80, -1.30], [36.82, -1.30], [36.82, -1.28], [36.80, -1.28], [36.80, -1.30]]
+
+ENDPOINTS = {
+    'analyze': ('POST', '/api/analyze', {'polygon': POLYGON, 'location_name': 'Bench Field', 'end_date': '2024-06-01'}),
+    'predict': ('POST', '/api/predict', {'polygon': POLYGON, 'start_date': '2024-01-01', 'end_date': '2024-06-01'}),
+    'time-series': ('POST', '/api/time-series', {'polygon': POLYGON, 'start_date': '2023-06-01', 'end_date': '2024-06-01'}),
+    'recommendations': ('POST', '/api/recommendations', {
+        'severity': 'At Risk',
+        'degradation_score': 43.5,
+        'primary_factors': ['Soil moisture deficit'],
+        'indicators': {'vegetation_health': 66.7, 'moisture_level': 50.0, 'soil_exposure': 60.0, 'erosion_risk': 30.0}
+    }),
+    'history': ('GET', '/api/location/1/history?limit=10', None)
+}
+
+
+class UncachedResult(ResultCache):
+    """ResultCache that never stores or coalesces, so every call reaches the backend"""
+
+    def __init__(self, name: str):
+        super().__init__(name, max_entries=0)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return default
+
+    def contains(self, key: str) -> bool:
+        return False
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        pass
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl_seconds: Optional[float] = None) -> Any:
+        return compute()
+
+
+def install_simulated_backends(args: argparse.Namespace) -> None:
+    """Point main's service globals at the stand-ins
+
+    Every request repeats the same body, so the cache would answer all but
+    the first, and the token bucket would cap Earth Engine calls at
+    EE_REQUESTS_PER_SECOND whatever the simulated latency.
+    """
+    main.imagery_backend = SimulatedImageryBackend(
+        LatencyProfile(args.ee_latency, args.ee_latency * args.jitter, args.ee_failure_rate, seed=1)
+    )
+    main.db_service = simulated_database_service(
+        LatencyProfile(args.db_latency, args.db_latency * args.jitter, args.db_failure_rate, seed=2)
+    )
+    main.ai_service = simulated_ai_service(
+        LatencyProfile(args.ai_latency, args.ai_latency * args.jitter, args.ai_failure_rate, seed=3)
+    )
+    if not args.cache:
+        main.ai_service.cache = UncachedResult('ai')
+    if not args.admission:
+        admission_service.ee_admission = None
+        main.ee_admission = None
+
+
+async def run_level(client: httpx.AsyncClient, endpoint: str, concurrency: int, total: int) -> Dict:
+    """Issue total requests to endpoint with at most concurrency in flight"""
+    method, url, body = ENDPOINTS[endpoint]
+    latencies: List[float] = []
+    errors = 0
+    issued = 0
+
+    async def worker():
+        nonlocal errors, issued
+        while issued < total:
+            issued += 1
+            start = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    wall = time.perf_counter() - wall_start
+
+    ms = np.array(latencies) * 1000
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(float(np.percentile(ms, 50)), 2),
+        'p95_ms': round(float(np.percentile(ms, 95)), 2),
+        'p99_ms': round(float(np.percentile(ms, 99)), 2),
+        'mean_ms': round(float(ms.mean()), 2),
+        'rps': round(len(latencies) / wall, 1)
+    }
+
+
+async def run(args: argparse.Namespace) -> List[Dict]:
+    results = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+        for endpoint in args.endpoints:
+            # Warm up imports, pools and any lazy state outside the timed runs
+            await run_level(client, endpoint, 1, 3)
+            for concurrency in args.concurrency:
+                results.append(await run_level(client, endpoint, concurrency, args.requests))
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoints', nargs='+', default=list(ENDPOINTS), choices=list(ENDPOINTS))
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and concurrency level')
+    parser.add_argument('--ee-latency', type=float, default=0.05, help='Seconds per Earth Engine call')
+    parser.add_argument('--db-latency', type=float, default=0.01, help='Seconds per Supabase call')
+    parser.add_argument('--ai-latency', type=float, default=0.1, help='Seconds per Anthropic call')
+    parser.add_argument('--jitter', type=float, default=0.2, help='Latency std-dev as a fraction of the mean')
+    parser.add_argument('--ee-failure-rate', type=float, default=0.0)
+    parser.add_argument('--db-failure-rate', type=float, default=0.0)
+    parser.add_argument('--ai-failure-rate', type=float, default=0.0)
+    parser.add_argument('--admission', action='store_true', help='Keep Earth Engine admission control on')
+    parser.add_argument('--cache', action='store_true', help='Keep the recommendation cache on')
+    parser.add_argument('--out', help='Write machine-readable results to this JSON file')
+    parser.add_argument('--verbose', action='store_true', help='Keep handler stdout')
+    args = parser.parse_args()
+
+    install_simulated_backends(args)
+
+    sink = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with sink:
+        results = asyncio.run(run(args))
+
+    print(f"{'endpoint':<16}{'conc':>6}{'reqs':>7}{'errs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>9}")
+    for r in results:
+        print(f"{r['endpoint']:<16}{r['concurrency']:>6}{r['requests']:>7}{r['errors']:>6}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['rps']:>9}")
+
+    if args.out:
+        report = {
+            'timestamp': datetime.now().isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'config': {k: v for k, v in vars(args).items() if k not in ('out', 'verbose')},
+            'results': results
+        }
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == '__main__':
+    main_cli()
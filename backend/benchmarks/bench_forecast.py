@@ -0,0 +1,90 @@
+"""Benchmark the Monte Carlo degradation forecast
+
+Times monte_carlo_forecast one location at a time and for all locations in
+one batched call, at several path counts, alongside the linear forecast
+loop it replaces. The target is well under 50 ms per location at 10k paths.
+
+Run from the backend folder:
+    python -m benchmarks.bench_forecast --locations 500 --paths 1000 10000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.bench_prediction import make_items
+from services.feature_service import extract_features_batch, feature_rows
+from services.forecast_service import FORECAST_HORIZONS, monte_carlo_forecast
+from services.prediction_service import PredictionService
+
+
+def forecast_inputs(items: list) -> tuple:
+    """monte_carlo_forecast arguments for the synthetic locations, scored by the rules"""
+    features = extract_features_batch([h for h, _ in items], [c for _, c in items])
+    scorer = PredictionService(model_path='missing')
+    risk_scores = np.array([scorer._calculate_risk_score(row) for row in feature_rows(features)])
+    start_scores = np.array([c['degradation_score'] for _, c in items])
+    return start_scores, risk_scores, features['current_ndvi'], features['ndvi_trend_30d'], features['ndvi_monthly_volatility']
+
+
+def time_forecast(inputs: tuple, paths: int, horizons: tuple, single_sample: int) -> dict:
+    count = len(inputs[0])
+
+    start = time.perf_counter()
+    monte_carlo_forecast(*inputs, horizons=horizons, paths=paths, seed=0)
+    batched_seconds = time.perf_counter() - start
+
+    sample = min(single_sample, count)
+    start = time.perf_counter()
+    for i in range(sample):
+        monte_carlo_forecast(*(a[i:i + 1] for a in inputs), horizons=horizons, paths=paths, seed=i)
+    single_seconds = (time.perf_counter() - start) / sample * count
+
+    return {
+        'paths': paths,
+        'batched_ms_per_location': round(batched_seconds / count * 1000, 3),
+        'single_ms_per_location': round(single_seconds / count * 1000, 3),
+        'batched_seconds': round(batched_seconds, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--locations', type=int, default=500)
+    parser.add_argument('--paths', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--horizons', type=int, nargs='+', default=list(FORECAST_HORIZONS))
+    parser.add_argument('--single', type=int, default=50, help='Locations timed one call at a time')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    items = make_items(args.locations)
+    inputs = forecast_inputs(items)
+    horizons = tuple(args.horizons)
+
+    service = PredictionService(model_path='missing')
+    start = time.perf_counter()
+    for risk_score, (_, current) in zip(inputs[1], items):
+        service._generate_forecast(float(risk_score), current, horizons)
+    linear_seconds = time.perf_counter() - start
+
+    results = {
+        'locations': args.locations,
+        'horizons': list(horizons),
+        'linear_ms_per_location': round(linear_seconds / args.locations * 1000, 4),
+        'monte_carlo': [time_forecast(inputs, paths, horizons, args.single) for paths in args.paths]
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{args.locations:,} locations, horizons {list(horizons)} months")
+    print(f"linear forecast: {results['linear_ms_per_location']} ms/location")
+    print(f"{'paths':>8}{'batched ms/loc':>16}{'single ms/loc':>16}")
+    for r in results['monte_carlo']:
+        print(f"{r['paths']:>8,}{r['batched_ms_per_location']:>16}{r['single_ms_per_location']:>16}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Benchmark single vs batched degradation risk inference
+
+Trains a small XGBoost model on synthetic features labelled by the
+rule-based scorer, saves it in the native JSON format, and compares one
+predict_degradation_risk call per location against one
+predict_degradation_risk_batch call for all of them. The rule-based path
+(no model file) is timed the same way for reference.
+
+Run from the backend folder:
+    python -m benchmarks.bench_prediction --locations 5000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from services.feature_service import extract_features_batch, feature_rows
+from services.prediction_service import FEATURE_NAMES, PredictionService
+
+
+def make_items(n: int, history: int = 12, seed: int = 42) -> list:
+    """Synthetic (historical_data, current_indicators) pairs"""
+    rng = np.random.default_rng(seed)
+    items = []
+    for _ in range(n):
+        base = rng.uniform(0.1, 0.8)
+        slope = rng.normal(0, 0.01)
+        ndvi = base + slope * np.arange(history) + rng.normal(0, 0.05, history)
+        historical = [{'date': f'2024-{m % 12 + 1:02d}-01', 'ndvi': float(v)} for m, v in enumerate(ndvi)]
+        current = {
+            'ndvi': float(ndvi[-1]),
+            'ndmi': float(rng.uniform(-0.1, 0.5)),
+            'bare_soil_index': float(rng.uniform(0.0, 0.7)),
+            'erosion_risk': float(rng.uniform(0.0, 1.0)),
+            'degradation_score': float(rng.uniform(10, 90))
+        }
+        items.append((historical, current))
+    return items
+
+
+def train_synthetic_model(items: list, path: str, rounds: int = 100) -> None:
+    """Fit a regressor to the rule-based scores (plus noise) and save it natively"""
+    import xgboost as xgb
+
+    rules = PredictionService(model_path=os.path.join(os.path.dirname(path), 'missing'))
+    columns = extract_features_batch([h for h, _ in items], [c for _, c in items])
+    matrix = np.column_stack([columns[name] for name in FEATURE_NAMES]).astype(np.float32)
+    labels = np.array([rules._calculate_risk_score(row) for row in feature_rows(columns)])
+    labels += np.random.default_rng(0).normal(0, 2, len(items))
+
+    dtrain = xgb.DMatrix(matrix, label=labels, feature_names=list(FEATURE_NAMES))
+    booster = xgb.train({'max_depth': 4, 'eta': 0.2, 'objective': 'reg:squarederror'}, dtrain, num_boost_round=rounds)
+    booster.save_model(path)
+
+
+def time_paths(service: PredictionService, items: list) -> dict:
+    service.predict_degradation_risk_batch(items[:2])  # load the model outside the timings
+
+    start = time.perf_counter()
+    single = [service.predict_degradation_risk(h, c) for h, c in items]
+    single_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = service.predict_degradation_risk_batch(items)
+    batched_seconds = time.perf_counter() - start
+
+    mismatches = sum(a['risk_score'] != b['risk_score'] for a, b in zip(single, batched))
+    return {
+        'scorer': batched[0].get('scorer'),
+        'single_seconds': round(single_seconds, 4),
+        'batched_seconds': round(batched_seconds, 4),
+        'single_per_second': round(len(items) / single_seconds),
+        'batched_per_second': round(len(items) / batched_seconds),
+        'speedup': round(single_seconds / batched_seconds, 1),
+        'mismatches': mismatches
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--locations', type=int, default=5000)
+    parser.add_argument('--train', type=int, default=20000, help='Synthetic training rows')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    items = make_items(args.locations)
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = os.path.join(tmp, 'degradation_model.json')
+        train_synthetic_model(make_items(args.train, seed=1), model_path)
+
+        results = {
+            'locations': args.locations,
+            'xgboost': time_paths(PredictionService(model_path=model_path), items),
+            'rules': time_paths(PredictionService(model_path=os.path.join(tmp, 'missing')), items)
+        }
+
+        # The model call alone: N one-row predictions vs one N-row prediction
+        service = PredictionService(model_path=model_path)
+        model = service._load_model()
+        matrix = service._feature_matrix(extract_features_batch([h for h, _ in items], [c for _, c in items]), len(items))
+        start = time.perf_counter()
+        for row in matrix:
+            model.inplace_predict(row[None, :])
+        per_row = time.perf_counter() - start
+        start = time.perf_counter()
+        model.inplace_predict(matrix)
+        one_call = time.perf_counter() - start
+        results['model_call'] = {
+            'per_row_seconds': round(per_row, 4),
+            'one_call_seconds': round(one_call, 4),
+            'speedup': round(per_row / one_call, 1)
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{args.locations:,} locations")
+    print(f"{'scorer':<10}{'single/s':>12}{'batched/s':>12}{'speedup':>10}{'mismatch':>10}")
+    for name in ('xgboost', 'rules'):
+        r = results[name]
+        print(f"{name:<10}{r['single_per_second']:>12,}{r['batched_per_second']:>12,}{r['speedup']:>9}x{r['mismatches']:>10}")
+    m = results['model_call']
+    print(f"model call only: {m['per_row_seconds']}s one row at a time vs {m['one_call_seconds']}s batched ({m['speedup']}x)")
+
+
+if __name__ == '__main__':
+    main()
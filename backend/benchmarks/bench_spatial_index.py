@@ -0,0 +1,120 @@
+"""Benchmark bounding-box and nearest-neighbour queries on the location index
+
+Builds a LocationIndex from synthetic locations spread over a region, then
+times within() for several box sizes and nearest() for several k, checking
+a sample of answers against a brute-force scan.
+
+Run from the backend folder:
+    python -m benchmarks.bench_spatial_index --locations 100000 --queries 2000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from services.location_service import LocationIndex, haversine_km
+
+
+def make_rows(n: int, bounds: tuple, seed: int = 42) -> list:
+    rng = np.random.default_rng(seed)
+    lons = rng.uniform(bounds[0], bounds[2], n)
+    lats = rng.uniform(bounds[1], bounds[3], n)
+    return [{'id': i + 1, 'name': f'Field {i + 1}', 'geom': f'POINT({lon} {lat})'} for i, (lon, lat) in enumerate(zip(lons, lats))]
+
+
+def percentiles(seconds: list) -> dict:
+    us = np.array(seconds) * 1e6
+    return {
+        'p50_us': round(float(np.percentile(us, 50)), 1),
+        'p95_us': round(float(np.percentile(us, 95)), 1),
+        'p99_us': round(float(np.percentile(us, 99)), 1),
+        'max_us': round(float(us.max()), 1)
+    }
+
+
+def brute_force_check(index: LocationIndex, points: np.ndarray, ids: np.ndarray, rng, bounds: tuple, samples: int) -> int:
+    """Compare nearest() and within() with a full scan; returns the number of mismatches"""
+    mismatches = 0
+    for _ in range(samples):
+        lon, lat = rng.uniform(bounds[0], bounds[2]), rng.uniform(bounds[1], bounds[3])
+        distances = [haversine_km(lon, lat, x, y) for x, y in points]
+        expected = [int(ids[i]) for i in np.argsort(distances, kind='stable')[:10]]
+        mismatches += [r['id'] for r in index.nearest(lon, lat, 10)] != expected
+
+        box = (lon, lat, lon + 0.5, lat + 0.5)
+        inside = (points[:, 0] >= box[0]) & (points[:, 0] <= box[2]) & (points[:, 1] >= box[1]) & (points[:, 1] <= box[3])
+        mismatches += [r['id'] for r in index.within(*box)] != sorted(int(i) for i in ids[inside])
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--locations', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=2000, help='Queries per configuration')
+    parser.add_argument('--bounds', type=float, nargs=4, default=[33.0, -5.0, 42.0, 5.0],
+                        metavar=('MIN_LON', 'MIN_LAT', 'MAX_LON', 'MAX_LAT'))
+    parser.add_argument('--grid-degrees', type=float, default=0.1)
+    parser.add_argument('--check', type=int, default=20, help='Queries verified against a brute-force scan')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    bounds = tuple(args.bounds)
+    rows = make_rows(args.locations, bounds)
+    index = LocationIndex(grid_degrees=args.grid_degrees)
+    start = time.perf_counter()
+    indexed = index.load(rows)
+    build_seconds = time.perf_counter() - start
+
+    # Near-coincident rows are merged onto one location; compare against what was indexed
+    records = (index.get(row['id']) for row in rows)
+    unique = {r['id']: (r['longitude'], r['latitude']) for r in records if r is not None}
+    ids = np.array(list(unique))
+    points = np.array(list(unique.values()))
+
+    rng = np.random.default_rng(7)
+    results = {
+        'locations': args.locations,
+        'indexed': indexed,
+        'grid_degrees': args.grid_degrees,
+        'build_seconds': round(build_seconds, 3),
+        'within': {},
+        'nearest': {}
+    }
+
+    for size in (0.05, 0.2, 1.0):
+        timings, matches = [], 0
+        for _ in range(args.queries):
+            lon = rng.uniform(bounds[0], bounds[2] - size)
+            lat = rng.uniform(bounds[1], bounds[3] - size)
+            start = time.perf_counter()
+            found = index.within(lon, lat, lon + size, lat + size, limit=1000)
+            timings.append(time.perf_counter() - start)
+            matches += len(found)
+        results['within'][f'{size}deg'] = dict(percentiles(timings), mean_matches=round(matches / args.queries, 1))
+
+    for k in (1, 10, 50):
+        timings = []
+        for _ in range(args.queries):
+            lon, lat = rng.uniform(bounds[0], bounds[2]), rng.uniform(bounds[1], bounds[3])
+            start = time.perf_counter()
+            index.nearest(lon, lat, k)
+            timings.append(time.perf_counter() - start)
+        results['nearest'][f'k={k}'] = percentiles(timings)
+
+    results['brute_force_mismatches'] = brute_force_check(index, points, ids, rng, bounds, args.check)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"Indexed {indexed:,} locations in {results['build_seconds']}s (grid {args.grid_degrees} deg)")
+    print(f"{'query':<16}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}{'max us':>10}")
+    for name, stats in list(results['within'].items()) + list(results['nearest'].items()):
+        label = name if name.startswith('k=') else f'within {name}'
+        print(f"{label:<16}{stats['p50_us']:>10}{stats['p95_us']:>10}{stats['p99_us']:>10}{stats['max_us']:>10}")
+    print(f"Brute-force mismatches over {args.check} checks: {results['brute_force_mismatches']}")
+
+
+if __name__ == '__main__':
+    main()
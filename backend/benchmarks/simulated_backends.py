@@ -0,0 +1,197 @@
+"""In-process stand-ins for Earth Engine, Supabase and Anthropic
+
+Each stand-in sleeps for a configurable latency and fails at a configurable
+rate, and otherwise returns payloads shaped like the real services, so the
+real handler and service code runs end to end without the network.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from services.imagery_service import ImageryBackend
+from services.database_service import DatabaseService
+from services.ai_service import AIRecommendationService
+
+
+class SimulatedFailure(Exception):
+    """Injected failure from a simulated backend"""
+
+
+class LatencyProfile:
+    """Latency (seconds, normally distributed and clipped at zero) plus failure rate"""
+
+    def __init__(self, mean: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.mean = mean
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+
+    def wait(self, name: str) -> None:
+        delay = max(0.0, self._random.gauss(self.mean, self.jitter)) if self.jitter else self.mean
+        if delay:
+            time.sleep(delay)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            raise SimulatedFailure(f"Simulated {name} failure")
+
+
+class SimulatedImageryBackend(ImageryBackend):
+    """Imagery backend returning deterministic indices after an injected delay"""
+
+    name = 'simulated'
+
+    def __init__(self, profile: LatencyProfile, scenes_per_month: int = 6):
+        super().__init__()
+        self.profile = profile
+        self.scenes_per_month = scenes_per_month
+
+    def calculate_ndvi_time_series(self, polygon: List[List[float]], start_date: str, end_date: str) -> List[Dict]:
+        self.profile.wait('Earth Engine time series')
+        return self._time_series(start_date, end_date)
+
+    def calculate_degradation_indicators(self, polygon: List[List[float]], date: str) -> Dict:
+        self.profile.wait('Earth Engine indicators')
+        return self._indicators()
+
+    def calculate_prediction_inputs(self, polygon: List[List[float]], start_date: str, end_date: str) -> Dict:
+        # One simulated round trip, like the fused Earth Engine plan
+        self.profile.wait('Earth Engine prediction inputs')
+        return {
+            'time_series': self._time_series(start_date, end_date),
+            'indicators': self._indicators()
+        }
+
+    def requests(self, query: str, polygon: List[List[float]], *args) -> int:
+        # Every simulated query is one round trip, the fused one included
+        return 1
+
+    def _time_series(self, start_date: str, end_date: str) -> List[Dict]:
+        start = datetime.strptime(start_date, '%Y-%m-%d')
+        days = max(0, (datetime.strptime(end_date, '%Y-%m-%d') - start).days)
+        step = max(1, 30 // self.scenes_per_month)
+        return [
+            {
+                'type': 'Feature',
+                'geometry': None,
+                'id': f'SIM_{i}',
+                'properties': {
+                    'date': (start + timedelta(days=offset)).strftime('%Y-%m-%d'),
+                    'ndvi': 0.45 + 0.1 * ((offset // step) % 5) / 5
+                }
+            }
+            for i, offset in enumerate(range(0, days, step))
+        ]
+
+    def _indicators(self) -> Dict:
+        return {'ndvi': 0.42, 'ndmi': 0.21, 'bare_soil_index': 0.27}
+
+
+class _SimulatedResponse:
+    def __init__(self, data: List[Dict]):
+        self.data = data
+
+
+class _SimulatedQuery:
+    """Chainable stand-in for a postgrest query builder"""
+
+    def __init__(self, client: 'SimulatedSupabaseClient', table: str):
+        self._client = client
+        self._table = table
+        self._insert: Optional[object] = None
+        self._limit: Optional[int] = None
+
+    def select(self, *args, **kwargs) -> '_SimulatedQuery':
+        return self
+
+    def eq(self, *args, **kwargs) -> '_SimulatedQuery':
+        return self
+
+    def in_(self, *args, **kwargs) -> '_SimulatedQuery':
+        return self
+
+    def gt(self, *args, **kwargs) -> '_SimulatedQuery':
+        return self
+
+    def or_(self, *args, **kwargs) -> '_SimulatedQuery':
+        return self
+
+    def order(self, *args, **kwargs) -> '_SimulatedQuery':
+        return self
+
+    def range(self, start: int, end: int, *args, **kwargs) -> '_SimulatedQuery':
+        self._limit = end - start + 1
+        return self
+
+    def limit(self, count: int, *args, **kwargs) -> '_SimulatedQuery':
+        self._limit = count
+        return self
+
+    def insert(self, payload: object, *args, **kwargs) -> '_SimulatedQuery':
+        self._insert = payload
+        return self
+
+    def execute(self) -> _SimulatedResponse:
+        self._client.profile.wait(f'Supabase {self._table}')
+        if self._insert is not None:
+            rows = self._insert if isinstance(self._insert, list) else [self._insert]
+            return _SimulatedResponse([dict(row, id=self._client.next_id()) for row in rows])
+        rows = self._client.rows(self._table)
+        return _SimulatedResponse(rows[:self._limit] if self._limit else rows)
+
+
+class SimulatedSupabaseClient:
+    """Stand-in for supabase.Client backed by canned rows"""
+
+    def __init__(self, profile: LatencyProfile, locations: int = 50, history: int = 10):
+        self.profile = profile
+        self._id = max(locations, history)
+        self._locations = [
+            {'id': i, 'name': f'Field {i}', 'geom': f'POINT({36 + i * 0.01} {-1 + i * 0.01})'}
+            for i in range(1, locations + 1)
+        ]
+        self._history = [
+            {
+                'id': i,
+                'location_id': 1,
+                'result': {'degradation_score': 40.0 + i, 'severity': 'At Risk'},
+                'created_at': datetime(2024, 1, 1 + i).isoformat()
+            }
+            for i in range(history)
+        ]
+
+    def next_id(self) -> int:
+        self._id += 1
+        return self._id
+
+    def rows(self, table: str) -> List[Dict]:
+        return self._locations if table == 'locations' else self._history
+
+    def table(self, name: str) -> _SimulatedQuery:
+        return _SimulatedQuery(self, name)
+
+
+class _SimulatedMessage:
+    def __init__(self, text: str):
+        self.content = [type('TextBlock', (), {'text': text})()]
+
+
+class SimulatedAnthropicClient:
+    """Stand-in for anthropic.Anthropic with a messages.create method"""
+
+    def __init__(self, profile: LatencyProfile):
+        self.profile = profile
+        self.messages = self
+
+    def create(self, **kwargs) -> _SimulatedMessage:
+        self.profile.wait('Anthropic')
+        return _SimulatedMessage('1. Establish cover crops.\n2. Apply mulch.\n3. Build contour bunds.')
+
+
+def simulated_database_service(profile: LatencyProfile) -> DatabaseService:
+    """A real DatabaseService wired to a simulated Supabase client"""
+    return DatabaseService(client=SimulatedSupabaseClient(profile))  # type: ignore
+
+
+def simulated_ai_service(profile: LatencyProfile) -> AIRecommendationService:
+    """A real AIRecommendationService wired to a simulated Anthropic client"""
+    return AIRecommendationService(client=SimulatedAnthropicClient(profile))  # type: ignore
@@ -0,0 +1,229 @@
+"""Local stand-in for the Anthropic Messages API, with streaming
+
+Serves POST /v1/messages in both the plain JSON and the server-sent-event
+streaming format the anthropic SDK expects, with configurable time to first
+token, per-token delay and an optional mid-stream failure. Point the backend
+at it through the SDK's base URL override:
+
+    python -m benchmarks.stub_anthropic_server --port 8765 --first-token 0.8 --token-delay 0.02
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 ANTHROPIC_API_KEY=stub uvicorn main:app
+    curl -N -X POST 'http://localhost:8000/api/recommendations/stream?format=ndjson' \
+        -H 'Content-Type: application/json' -d '{"severity": "At Risk", "degradation_score": 43.5}'
+
+Use --fail-after N to send an overloaded error after N text chunks, and
+--rate-limit-every N to answer every Nth request with a 429. Message batches
+(POST /v1/messages/batches) end --batch-delay seconds after submission.
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPONSE_TEXT = (
+    "1. Establish cover crops on exposed ground before the long rains. "
+    "2. Apply mulch to reduce evaporation and protect the surface. "
+    "3. Build contour bunds on slopes above 5% to slow runoff. "
+    "4. Reassess NDVI and soil moisture monthly for the next two seasons."
+)
+
+
+def _chunks(text: str):
+    """Split text into word-sized chunks, roughly one per token"""
+    words = text.split(' ')
+    return [word + (' ' if i < len(words) - 1 else '') for i, word in enumerate(words)]
+
+
+def _message(model: str) -> dict:
+    return {
+        'id': 'msg_stub',
+        'type': 'message',
+        'role': 'assistant',
+        'model': model,
+        'content': [{'type': 'text', 'text': RESPONSE_TEXT}],
+        'stop_reason': 'end_turn',
+        'stop_sequence': None,
+        'usage': {'input_tokens': 200, 'output_tokens': len(_chunks(RESPONSE_TEXT))}
+    }
+
+
+class StubAnthropicHandler(BaseHTTPRequestHandler):
+    first_token = 0.5
+    token_delay = 0.02
+    fail_after = None
+    rate_limit_every = None
+    batch_delay = 2.0
+
+    _requests = itertools.count(1)
+    _batches = {}
+    _lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        path = self.path.rstrip('/')
+
+        if self.rate_limit_every and next(self._requests) % self.rate_limit_every == 0:
+            self._json(429, {
+                'type': 'error', 'error': {'type': 'rate_limit_error', 'message': 'Rate limited'}
+            }, {'retry-after': '0.1'})
+        elif path == '/v1/messages':
+            if request.get('stream'):
+                self._stream(request.get('model', 'stub'))
+            else:
+                self._complete(request.get('model', 'stub'))
+        elif path == '/v1/messages/batches':
+            self._create_batch(request)
+        else:
+            self.send_error(404)
+
+    def do_GET(self):
+        parts = self.path.split('?')[0].strip('/').split('/')
+        if parts[:3] != ['v1', 'messages', 'batches'] or len(parts) < 4:
+            self.send_error(404)
+            return
+        with self._lock:
+            batch = self._batches.get(parts[3])
+        if batch is None:
+            self.send_error(404)
+        elif len(parts) == 5 and parts[4] == 'results':
+            self._batch_results(batch)
+        else:
+            self._json(200, self._batch_status(batch))
+
+    def _complete(self, model: str):
+        time.sleep(self.first_token + self.token_delay * len(_chunks(RESPONSE_TEXT)))
+        self._json(200, _message(model))
+
+    def _create_batch(self, request: dict):
+        batch_id = f'msgbatch_{uuid.uuid4().hex[:24]}'
+        batch = {
+            'id': batch_id,
+            'created': time.time(),
+            'requests': [(r['custom_id'], r['params'].get('model', 'stub')) for r in request.get('requests', [])]
+        }
+        with self._lock:
+            self._batches[batch_id] = batch
+        self._json(200, self._batch_status(batch))
+
+    def _batch_status(self, batch: dict) -> dict:
+        ended = time.time() - batch['created'] >= self.batch_delay
+        count = len(batch['requests'])
+        host = self.headers.get('Host', 'localhost')
+        return {
+            'id': batch['id'],
+            'type': 'message_batch',
+            'processing_status': 'ended' if ended else 'in_progress',
+            'request_counts': {
+                'processing': 0 if ended else count,
+                'succeeded': count if ended else 0,
+                'errored': 0, 'canceled': 0, 'expired': 0
+            },
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(batch['created'])),
+            'expires_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(batch['created'] + 86400)),
+            'ended_at': time.strftime('%Y-%m-%dT%H:%M:%SZ') if ended else None,
+            'archived_at': None,
+            'cancel_initiated_at': None,
+            'results_url': f"http://{host}/v1/messages/batches/{batch['id']}/results" if ended else None
+        }
+
+    def _batch_results(self, batch: dict):
+        body = ''.join(
+            json.dumps({'custom_id': custom_id, 'result': {'type': 'succeeded', 'message': _message(model)}}) + '\n'
+            for custom_id, model in batch['requests']
+        ).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/binary')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, model: str):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        chunks = _chunks(RESPONSE_TEXT)
+        self._event('message_start', {
+            'type': 'message_start',
+            'message': {
+                'id': 'msg_stub', 'type': 'message', 'role': 'assistant', 'model': model,
+                'content': [], 'stop_reason': None, 'stop_sequence': None,
+                'usage': {'input_tokens': 200, 'output_tokens': 1}
+            }
+        })
+        self._event('content_block_start', {
+            'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''}
+        })
+        time.sleep(self.first_token)
+
+        for i, chunk in enumerate(chunks):
+            if self.fail_after is not None and i >= self.fail_after:
+                self._event('error', {
+                    'type': 'error', 'error': {'type': 'overloaded_error', 'message': 'Overloaded'}
+                })
+                return
+            if i:
+                time.sleep(self.token_delay)
+            self._event('content_block_delta', {
+                'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': chunk}
+            })
+
+        self._event('content_block_stop', {'type': 'content_block_stop', 'index': 0})
+        self._event('message_delta', {
+            'type': 'message_delta',
+            'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+            'usage': {'output_tokens': len(chunks)}
+        })
+        self._event('message_stop', {'type': 'message_stop'})
+
+    def _event(self, name: str, data: dict):
+        self.wfile.write(f'event: {name}\ndata: {json.dumps(data)}\n\n'.encode())
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--first-token', type=float, default=0.5, help='Seconds before the first text chunk')
+    parser.add_argument('--token-delay', type=float, default=0.02, help='Seconds between text chunks')
+    parser.add_argument('--fail-after', type=int, help='Send an overloaded error after this many chunks')
+    parser.add_argument('--rate-limit-every', type=int, help='Answer every Nth request with a 429')
+    parser.add_argument('--batch-delay', type=float, default=2.0, help='Seconds until a message batch ends')
+    args = parser.parse_args()
+
+    StubAnthropicHandler.first_token = args.first_token
+    StubAnthropicHandler.token_delay = args.token_delay
+    StubAnthropicHandler.fail_after = args.fail_after
+    StubAnthropicHandler.rate_limit_every = args.rate_limit_every
+    StubAnthropicHandler.batch_delay = args.batch_delay
+
+    server = ThreadingHTTPServer((args.host, args.port), StubAnthropicHandler)
+    print(f"Stub Anthropic API on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main_cli()
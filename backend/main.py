@@ -1,24 +1,46 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
+import asyncio
+import json
+import logging
 import os
+import time
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 # Import services
-from services.earth_engine_service import (
-    initialize_earth_engine,
-    calculate_ndvi_time_series,
-    calculate_degradation_indicators
+from services.imagery_service import create_imagery_backend
+from services.cache_service import ee_cache, ai_cache, polygon_hash
+from services.observation_service import observation_store
+from services.write_behind_service import write_queue_from_env
+from services.monitoring_service import monitor_from_env
+from services.executor_service import executors, run_blocking, shutdown_executors, BackendTimeoutError
+from services.metrics_service import (
+    registry,
+    stage,
+    begin_request,
+    end_request,
+    current_stages,
+    server_timing_header,
+    http_request_seconds,
+    http_requests,
+    log_event
 )
+from services.admission_service import AdmissionRejected, admission_priority, ee_admission
+from services.composite_service import composite_features, parse_composite
 from services.degradation_service import DegradationAnalyzer
-from services.ai_service import AIRecommendationService
-from services.prediction_service import PredictionService
-from services.database_service import DatabaseService
+from services.forecast_service import parse_horizons
+from services.geometry_service import InvalidPolygonError
+from services.job_service import JobFailure, JobQueueFullError, job_manager_from_env
+from services.prediction_service import FORECAST_MODES, PredictionService
+# ai_service (anthropic) and database_service (supabase) are imported by the
+# startup warm-up, not here, so importing this module stays fast
 
 app = FastAPI(
     title="SoilSense AI API",
@@ -29,6 +51,27 @@ app = FastAPI(
 # Configure CORS for production
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*").split(",")
 
+# Upper bound on polygons accepted by /api/analyze/batch
+BATCH_MAX_POLYGONS = int(os.getenv("BATCH_MAX_POLYGONS", 1000))
+
+# Upper bound on analyses accepted by /api/recommendations/bulk
+BULK_MAX_ANALYSES = int(os.getenv("BULK_MAX_ANALYSES", 1000))
+
+# Retry-After (seconds) sent when the job queue is full
+JOB_RETRY_AFTER_SECONDS = int(os.getenv("JOB_RETRY_AFTER_SECONDS", 30))
+
+# Total seconds a job waits out Earth Engine 429s before it is marked failed
+JOB_MAX_THROTTLED_SECONDS = float(os.getenv("JOB_MAX_THROTTLED_SECONDS", 600))
+
+# Seconds allowed for loading the locations table into the index at startup
+LOCATION_WARM_TIMEOUT = float(os.getenv("LOCATION_WARM_TIMEOUT", 120))
+
+# Dependencies that must be ready before /api/ready reports ready (comma separated)
+READINESS_REQUIRED = [name.strip() for name in os.getenv("READINESS_REQUIRED", "imagery").split(",") if name.strip()]
+
+# Attach per-stage timings to responses as a Server-Timing header
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() in ("1", "true", "yes")
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS if ALLOWED_ORIGINS != ["*"] else ["*"],
@@ -37,37 +80,181 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    token = begin_request()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - start
+        stages = end_request(token)
+        # Label by route template, not raw path, to keep cardinality bounded
+        route = getattr(request.scope.get('route'), 'path', 'unmatched')
+        http_request_seconds.observe(elapsed, method=request.method, route=route)
+        http_requests.inc(method=request.method, route=route, status=str(status))
+    
+    if SERVER_TIMING_ENABLED:
+        response.headers['Server-Timing'] = server_timing_header(stages, elapsed)
+    return response
+
+def _collect_service_gauges() -> List:
+    """Gauge samples for caches and executors, read at scrape time"""
+    samples = []
+    for cache in (ee_cache, ai_cache):
+        for name, value in cache.stats().items():
+            if isinstance(value, (int, float)) and name != 'hit_ratio':
+                samples.append(('soilsense_cache_' + name, 'Result cache counters', {'cache': cache.name}, value))
+    for backend, executor in executors.items():
+        stats = executor.stats()
+        samples.append(('soilsense_executor_in_flight', 'Blocking calls queued or running per backend', {'backend': backend}, stats['in_flight']))
+        samples.append(('soilsense_executor_timeouts', 'Blocking calls that timed out per backend', {'backend': backend}, stats['timeouts']))
+    if write_queue:
+        stats = write_queue.stats()
+        samples.append(('soilsense_write_queue_pending', 'Analyses waiting to be written to the database', {}, stats['pending']))
+        samples.append(('soilsense_write_queue_journal_entries', 'Analyses spilled to the local journal', {}, stats['journal_entries']))
+    if ee_admission:
+        for priority, stats in ee_admission.stats()['classes'].items():
+            samples.append(('soilsense_admission_queue_depth', 'Earth Engine requests waiting for admission', {'priority': priority}, stats['depth']))
+            samples.append(('soilsense_admission_estimated_wait_seconds', 'Estimated admission wait for a new request', {'priority': priority}, stats['estimated_wait']))
+    if job_manager:
+        stats = job_manager.stats()
+        samples.append(('soilsense_jobs_queued', 'Background jobs waiting for a worker', {}, stats['queued']))
+        samples.append(('soilsense_jobs_running', 'Background jobs running', {}, stats['running']))
+    if monitor:
+        stats = monitor.stats()
+        samples.append(('soilsense_monitor_fresh_sites', 'Monitored locations with a result younger than the max age', {}, stats['fresh']))
+        samples.append(('soilsense_monitor_failing_sites', 'Monitored locations whose last refresh failed', {}, stats['failing']))
+    return samples
+
+registry.register_collector(_collect_service_gauges)
+
 # Initialize services
+imagery_backend = create_imagery_backend()
 degradation_analyzer = DegradationAnalyzer()
 ai_service = None
 prediction_service = PredictionService()
 db_service = None
+write_queue = None
+monitor = None
+job_manager = job_manager_from_env()
+
+# Warm-up state per dependency for /api/ready: pending, ready or failed
+dependencies: Dict[str, Dict] = {
+    name: {"state": "pending"} for name in ("imagery", "ai", "database", "location_index")
+}
+warm_tasks: Dict[str, asyncio.Task] = {}
 
-# Initialize Earth Engine on startup
 @app.on_event("startup")
 async def startup_event():
-    global ai_service, db_service
-    
-    # Initialize Earth Engine
-    ee_initialized = initialize_earth_engine()
-    if ee_initialized:
-        print("✓ Earth Engine initialized successfully")
+    # Heavy clients are imported and initialized in the background so the
+    # server answers straight away; /api/ready reports their progress
+    warm_tasks["imagery"] = asyncio.create_task(_warm("imagery", _init_imagery))
+    warm_tasks["ai"] = asyncio.create_task(_warm("ai", _init_ai))
+    warm_tasks["database"] = asyncio.create_task(_warm("database", _init_database))
+    if job_manager:
+        await job_manager.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in warm_tasks.values():
+        task.cancel()
+    try:
+        if job_manager:
+            await job_manager.stop()
+        if monitor:
+            await monitor.stop()
+        if write_queue:
+            await write_queue.stop()
+    finally:
+        shutdown_executors()
+
+async def _warm(name: str, init) -> bool:
+    """Run one dependency's initialization and record the outcome"""
+    start = time.perf_counter()
+    try:
+        ok = await init()
+        dependencies[name] = {"state": "ready" if ok else "failed"}
+    except Exception as e:
+        ok = False
+        dependencies[name] = {"state": "failed", "error": str(e)}
+    dependencies[name]["seconds"] = round(time.perf_counter() - start, 3)
+    log_event("dependency_warmed", sample=False, dependency=name, **dependencies[name])
+    return ok
+
+async def _init_imagery() -> bool:
+    # Earth Engine initialization is blocking network I/O
+    initialized = await imagery_backend.ensure_initialized_async()
+    if initialized:
+        print(f"✓ Imagery backend '{imagery_backend.name}' initialized successfully")
     else:
-        print("✗ Earth Engine initialization failed")
+        print(f"✗ Imagery backend '{imagery_backend.name}' initialization failed")
+    return initialized
+
+async def _init_ai() -> bool:
+    global ai_service
+    
+    def create():
+        from services.ai_service import AIRecommendationService
+        return AIRecommendationService()
     
-    # Initialize AI service
     try:
-        ai_service = AIRecommendationService()
+        ai_service = await run_blocking("ai", create)
         print("✓ AI Recommendation Service initialized")
+        return True
     except Exception as e:
         print(f"✗ AI Service initialization failed: {e}")
+        raise
+
+async def _init_database() -> bool:
+    global db_service, write_queue, monitor
+    
+    def create():
+        from services.database_service import DatabaseService
+        return DatabaseService()
     
-    # Initialize Database service
     try:
-        db_service = DatabaseService()
+        db_service = await run_blocking("database", create)
         print("✓ Database Service initialized")
     except Exception as e:
         print(f"✗ Database Service initialization failed: {e}")
+        dependencies["location_index"] = {"state": "failed", "error": "database unavailable"}
+        raise
+    
+    # Buffer analysis writes and flush them in bulk off the response path
+    write_queue = write_queue_from_env(db_service)
+    if write_queue:
+        await write_queue.start()
+    
+    # Scheduled re-analysis of monitored locations (MONITOR_ENABLED)
+    monitor = monitor_from_env(db_service.locations, _scheduled_analysis, _save_analysis)
+    
+    # Loading the index can take a while; requests only need the client
+    warm_tasks["location_index"] = asyncio.create_task(_warm("location_index", _init_location_index))
+    return True
+
+async def _init_location_index() -> bool:
+    # Warm the location index so saves resolve locations without a lookup
+    try:
+        indexed = await run_blocking("database", db_service.warm_location_index, timeout=LOCATION_WARM_TIMEOUT)
+        print(f"✓ Location index warmed ({indexed} locations)")
+        return True
+    except Exception as e:
+        print(f"✗ Location index warm-up failed, falling back to lookups: {e}")
+        raise
+    finally:
+        # The scheduler walks the index, so it starts once the load is settled
+        if monitor:
+            await monitor.start()
+
+async def _dependency(name: str) -> None:
+    """Wait for a dependency that is still warming up"""
+    task = warm_tasks.get(name)
+    if task is not None and not task.done():
+        # Shielded: a cancelled request mustn't cancel the shared warm-up
+        await asyncio.shield(task)
 
 # Pydantic models
 class AnalysisRequest(BaseModel):
@@ -75,6 +262,19 @@ class AnalysisRequest(BaseModel):
     location_name: Optional[str] = "Unnamed Location"
     start_date: Optional[str] = None
     end_date: Optional[str] = None
+    location_id: Optional[int] = None
+
+class NamedPolygon(BaseModel):
+    name: str
+    polygon: List[List[float]]
+
+class BatchAnalysisRequest(BaseModel):
+    polygons: List[NamedPolygon]
+    end_date: Optional[str] = None
+
+class BulkRecommendationRequest(BaseModel):
+    analyses: List[Dict]
+    mode: str = "interactive"  # or "batch" for non-interactive message batch jobs
 
 class LocationData(BaseModel):
     name: str
@@ -89,11 +289,26 @@ async def root():
         "version": "1.0.0",
         "endpoints": [
             "/api/health",
+            "/api/ready",
             "/api/analyze",
+            "/api/analyze/batch",
             "/api/recommendations",
+            "/api/recommendations/stream",
+            "/api/recommendations/bulk",
             "/api/predict",
             "/api/time-series",
-            "/api/locations"
+            "/api/jobs/{analyze,predict,time-series}",
+            "/api/jobs/{job_id}",
+            "/api/jobs/{job_id}/events",
+            "/api/locations",
+            "/api/locations/within",
+            "/api/locations/nearest",
+            "/api/cache/stats",
+            "/api/executors/stats",
+            "/api/writes/stats",
+            "/api/monitor/stats",
+            "/api/admission/stats",
+            "/api/metrics"
         ]
     }
 
@@ -105,56 +320,134 @@ async def health_check():
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/api/ready")
+async def readiness():
+    """Per-dependency warm-up state; 503 until the required dependencies are ready"""
+    ready = all(dependencies.get(name, {}).get("state") == "ready" for name in READINESS_REQUIRED)
+    if ready:
+        status = "ready"
+    elif any(dependency["state"] == "pending" for dependency in dependencies.values()):
+        status = "starting"
+    else:
+        status = "unavailable"
+    return JSONResponse(
+        {
+            "status": status,
+            "required": READINESS_REQUIRED,
+            "dependencies": dependencies
+        },
+        status_code=200 if ready else 503
+    )
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Get hit/miss counters for the Earth Engine and recommendation caches"""
+    return {
+        "earth_engine": ee_cache.stats(),
+        "recommendations": ai_cache.stats(),
+        "observations": observation_store.stats(),
+        "locations": db_service.locations.stats() if db_service else None
+    }
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: stage and request latency histograms, counters and gauges"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/executors/stats")
+async def executor_stats():
+    """Get concurrency limits and in-flight counts for each backend executor"""
+    return {name: executor.stats() for name, executor in executors.items()}
+
+@app.get("/api/writes/stats")
+async def write_stats():
+    """Get queue depth, flush and journal counters for buffered database writes"""
+    if not write_queue:
+        return {"enabled": False}
+    return {"enabled": True, **write_queue.stats()}
+
+@app.get("/api/admission/stats")
+async def admission_stats():
+    """Get Earth Engine admission control state: queue depth, waits and sheds per priority class"""
+    if not ee_admission:
+        return {"enabled": False}
+    return {"enabled": True, **ee_admission.stats()}
+
+@app.get("/api/monitor/stats")
+async def monitor_stats():
+    """Get scheduler progress: fresh and failing sites, last cycle and rate limiter state"""
+    if not monitor:
+        return {"enabled": False}
+    return {"enabled": True, **monitor.stats()}
+
 @app.post("/api/analyze")
-async def analyze_soil_degradation(request: AnalysisRequest):
-    """Analyze soil degradation for a given area"""
+async def analyze_soil_degradation(request: AnalysisRequest, refresh: bool = False):
+    """Analyze soil degradation for a given area
+    
+    For a monitored location with no end_date, a result the scheduler
+    computed for the same polygon within MONITOR_MAX_AGE_SECONDS is returned
+    instead (marked precomputed); refresh=true always analyzes live.
+    """
     try:
-        # Set default date if not provided
-        end_date = request.end_date or datetime.now().strftime('%Y-%m-%d')
+        await _dependency("database")
+        location_id = request.location_id
+        if db_service and location_id is None:
+            with stage('location_resolve'):
+                # Geometry only: the name fallback would match every "Unnamed Location"
+                location_id = db_service.locations.resolve(
+                    _location_data(request.location_name, request.polygon), by_name=False
+                )
         
-        print(f"Analyzing area: {request.location_name}")
-        print(f"Polygon: {request.polygon}")
-        print(f"End date: {end_date}")
+        if monitor and location_id is not None and request.end_date is None and not refresh:
+            fresh = monitor.fresh_result(location_id, polygon_hash(request.polygon))
+            if fresh is not None:
+                log_event('analysis_served_precomputed', location_id=location_id, computed_at=fresh['computed_at'])
+                return fresh
         
-        # Calculate indicators using Earth Engine
-        indicators = calculate_degradation_indicators(
-            request.polygon,
-            end_date
-        )
-        
-        print(f"Indicators calculated: {indicators}")
-        
-        # Add erosion risk estimate (simplified)
-        indicators['erosion_risk'] = 0.3
-        
-        # Calculate degradation score
-        analysis = degradation_analyzer.calculate_score(indicators)
-        analysis['date'] = end_date
-        analysis['location_name'] = request.location_name
+        # Set default date if not provided
+        end_date = request.end_date or datetime.now().strftime('%Y-%m-%d')
+        analysis = await _analyze_polygon(request.location_name, request.polygon, end_date)
         
         # Save to database if available
         if db_service:
             try:
-                # Calculate center point of polygon
-                polygon_coords = request.polygon[0] if isinstance(request.polygon[0], list) else request.polygon
-                lons = [float(p[0]) for p in polygon_coords if isinstance(p, (list, tuple))]
-                lats = [float(p[1]) for p in polygon_coords if isinstance(p, (list, tuple))]
-                location_data = {
-                    'name': request.location_name,
-                    'longitude': sum(lons) / len(lons),
-                    'latitude': sum(lats) / len(lats)
-                }
-                db_service.save_analysis(location_data, analysis)
+                with stage('polygon_parse'):
+                    location_data = _location_data(request.location_name, request.polygon)
+                await _save_analysis(location_data, analysis)
             except Exception as e:
-                print(f"Database save failed: {e}")
+                log_event('database_save_failed', level=logging.WARNING, location=request.location_name, error=str(e))
+        
+        # Scheduled runs reuse the user's polygon, which also warms the cache for it
+        if monitor and location_id is not None:
+            monitor.remember_polygon(location_id, request.polygon)
         
-        print(f"Analysis completed successfully: {analysis}")
+        log_event(
+            'analysis_completed',
+            location=request.location_name,
+            vertices=len(request.polygon),
+            end_date=end_date,
+            score=analysis['degradation_score'],
+            severity=analysis['severity'],
+            stages_ms=current_stages()
+        )
         return analysis
         
+    except InvalidPolygonError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid polygon: {str(e)}")
+    except AdmissionRejected as e:
+        raise _admission_rejected(e)
+    except BackendTimeoutError as e:
+        raise HTTPException(status_code=504, detail=f"Analysis timed out: {str(e)}")
     except Exception as e:
         import traceback
-        print(f"ERROR in analyze_soil_degradation: {str(e)}")
-        print(traceback.format_exc())
+        log_event(
+            'analysis_failed',
+            level=logging.ERROR,
+            location=request.location_name,
+            error=str(e),
+            traceback=traceback.format_exc(),
+            stages_ms=current_stages()
+        )
         
         # Check if it's an Earth Engine imagery issue
         if "may not be null" in str(e) or "No satellite imagery" in str(e):
@@ -165,25 +458,224 @@ async def analyze_soil_degradation(request: AnalysisRequest):
         
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@app.post("/api/analyze/batch")
+async def analyze_soil_degradation_batch(request: BatchAnalysisRequest):
+    """Analyze soil degradation for many named polygons in a few Earth Engine requests"""
+    if not request.polygons:
+        raise HTTPException(status_code=400, detail="At least one polygon is required")
+    if len(request.polygons) > BATCH_MAX_POLYGONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many polygons: {len(request.polygons)} (max {BATCH_MAX_POLYGONS})"
+        )
+    
+    polygons = {item.name: item.polygon for item in request.polygons}
+    if len(polygons) != len(request.polygons):
+        raise HTTPException(status_code=400, detail="Polygon names must be unique")
+    
+    try:
+        end_date = request.end_date or datetime.now().strftime('%Y-%m-%d')
+        # Bulk work: queued behind interactive requests for Earth Engine
+        with admission_priority("batch"):
+            indicators_by_name = await imagery_backend.calculate_degradation_indicators_batch_async(polygons, end_date)
+        
+        results = []
+        for name, polygon in polygons.items():
+            indicators = indicators_by_name.get(name, {'error': 'No result returned for polygon'})
+            if 'error' in indicators:
+                results.append({'location_name': name, 'error': indicators['error']})
+                continue
+            
+            indicators['erosion_risk'] = 0.3
+            with stage('scoring'):
+                analysis = degradation_analyzer.calculate_score(indicators)
+            analysis['date'] = end_date
+            analysis['location_name'] = name
+            results.append(analysis)
+            
+            await _dependency("database")
+            if db_service:
+                try:
+                    await _save_analysis(_location_data(name, polygon), analysis)
+                except Exception as e:
+                    log_event('database_save_failed', level=logging.WARNING, location=name, error=str(e))
+        
+        return {
+            'date': end_date,
+            'count': len(results),
+            'failed': sum(1 for r in results if 'error' in r),
+            'results': results
+        }
+        
+    except AdmissionRejected as e:
+        raise _admission_rejected(e)
+    except BackendTimeoutError as e:
+        raise HTTPException(status_code=504, detail=f"Batch analysis timed out: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch analysis failed: {str(e)}")
+
+async def _analyze_polygon(name: str, polygon: List[List[float]], end_date: str) -> Dict:
+    """Indicators and degradation score for one polygon; used by /api/analyze and the scheduler"""
+    # Calculate indicators using Earth Engine
+    indicators = await imagery_backend.calculate_degradation_indicators_async(polygon, end_date)
+    
+    # Add erosion risk estimate (simplified)
+    indicators['erosion_risk'] = 0.3
+    
+    # Calculate degradation score
+    with stage('scoring'):
+        analysis = degradation_analyzer.calculate_score(indicators)
+    analysis['date'] = end_date
+    analysis['location_name'] = name
+    # Resolution the indices were reduced at, and tile count for large areas
+    for key in ('scale_m', 'tiles'):
+        if key in indicators:
+            analysis[key] = indicators[key]
+    return analysis
+
+def _admission_rejected(e: AdmissionRejected) -> HTTPException:
+    """429 telling the client when Earth Engine capacity should be free again"""
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+async def _scheduled_analysis(name: str, polygon: List[List[float]], end_date: str) -> Dict:
+    """_analyze_polygon for the scheduler, queued behind interactive requests"""
+    with admission_priority("batch"):
+        return await _analyze_polygon(name, polygon, end_date)
+
+def _location_data(name: str, polygon: List) -> Dict:
+    """Build the location record for a polygon from its vertex centroid and shape hash"""
+    polygon_coords = polygon[0] if isinstance(polygon[0][0], list) else polygon
+    lons = [float(p[0]) for p in polygon_coords if isinstance(p, (list, tuple))]
+    lats = [float(p[1]) for p in polygon_coords if isinstance(p, (list, tuple))]
+    return {
+        'name': name,
+        'longitude': sum(lons) / len(lons),
+        'latitude': sum(lats) / len(lats),
+        'polygon_hash': polygon_hash(polygon)
+    }
+
+def _split_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma-separated fields parameter"""
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+async def _save_analysis(location_data: Dict, analysis: Dict) -> None:
+    """Queue the analysis for a bulk write, or save it inline when write-behind is off"""
+    if write_queue:
+        write_queue.enqueue(location_data, analysis)
+    else:
+        await db_service.save_analysis_async(location_data, analysis)
+
 @app.post("/api/recommendations")
 async def get_recommendations(analysis_data: Dict):
     """Get AI-powered restoration recommendations"""
     try:
+        await _dependency("ai")
         if not ai_service:
             raise HTTPException(
                 status_code=503,
                 detail="AI service not available. Check ANTHROPIC_API_KEY."
             )
         
-        recommendations = ai_service.generate_recommendations(analysis_data)
+        recommendations = await ai_service.generate_recommendations_async(analysis_data)
         return recommendations
         
+    except BackendTimeoutError as e:
+        raise HTTPException(status_code=504, detail=f"Recommendation generation timed out: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Recommendation generation failed: {str(e)}")
 
+@app.post("/api/recommendations/stream")
+async def stream_recommendations(analysis_data: Dict, format: str = "sse"):
+    """Stream recommendations: the envelope first, then text as Claude writes it
+    
+    format=sse sends Server-Sent Events named after each event type;
+    format=ndjson sends one JSON event per line.
+    """
+    await _dependency("ai")
+    if not ai_service:
+        raise HTTPException(
+            status_code=503,
+            detail="AI service not available. Check ANTHROPIC_API_KEY."
+        )
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'sse' or 'ndjson'")
+    
+    async def events():
+        async for event in ai_service.stream_recommendations_async(analysis_data):
+            if format == "sse":
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            else:
+                yield json.dumps(event) + "\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if format == "sse" else "application/x-ndjson",
+        # Stop reverse proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/recommendations/bulk")
+async def bulk_recommendations(request: BulkRecommendationRequest):
+    """Recommendations for many analyses, streamed as NDJSON in completion order
+    
+    Each line is the /api/recommendations result for one analysis plus its
+    'index' in the request. Identical prompts are generated once.
+    
+    mode=batch submits a message batch, which can take hours to end, so it
+    runs as a background job instead: the response is 202 with the job, and
+    /api/jobs/{job_id} has the results in index order once the batch ends.
+    """
+    await _dependency("ai")
+    if not ai_service:
+        raise HTTPException(
+            status_code=503,
+            detail="AI service not available. Check ANTHROPIC_API_KEY."
+        )
+    if request.mode not in ("interactive", "batch"):
+        raise HTTPException(status_code=400, detail="mode must be 'interactive' or 'batch'")
+    if len(request.analyses) > BULK_MAX_ANALYSES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many analyses: {len(request.analyses)} (max {BULK_MAX_ANALYSES})"
+        )
+    if request.mode == "batch":
+        return JSONResponse(await _queue_job("recommendations-bulk", {"analyses": request.analyses}), status_code=202)
+    
+    async def results():
+        async for result in ai_service.generate_recommendations_bulk(request.analyses, mode=request.mode):
+            yield json.dumps(result) + "\n"
+    
+    return StreamingResponse(
+        results(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _bulk_recommendations_job(params: Dict) -> Dict:
+    """Job handler for /api/recommendations/bulk?mode=batch"""
+    await _dependency("ai")
+    if not ai_service:
+        raise JobFailure(503, "AI service not available. Check ANTHROPIC_API_KEY.")
+    results = [result async for result in ai_service.generate_recommendations_bulk(params["analyses"], mode="batch")]
+    return {"count": len(results), "results": sorted(results, key=lambda result: result["index"])}
+
 @app.post("/api/predict")
-async def predict_degradation(request: AnalysisRequest):
-    """Predict future degradation risk"""
+async def predict_degradation(request: AnalysisRequest, forecast: Optional[str] = None, horizons: Optional[str] = None):
+    """Predict future degradation risk
+    
+    forecast=monte_carlo returns p10/p50/p90 score bands per horizon;
+    forecast=linear the single projected score. horizons is a comma
+    separated list of months, e.g. 1,3,6,12.
+    """
+    if forecast is not None and forecast not in FORECAST_MODES:
+        raise HTTPException(status_code=400, detail="forecast must be 'monte_carlo' or 'linear'")
+    try:
+        forecast_horizons = parse_horizons(horizons)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     try:
         # Get historical data
         end_date = request.end_date or datetime.now().strftime('%Y-%m-%d')
@@ -191,78 +683,321 @@ async def predict_degradation(request: AnalysisRequest):
             datetime.now() - timedelta(days=180)
         ).strftime('%Y-%m-%d')
         
-        historical = calculate_ndvi_time_series(
-            request.polygon,
-            start_date,
-            end_date
-        )
-        
-        # Get current indicators
-        current = calculate_degradation_indicators(
-            request.polygon,
-            end_date
-        )
+        if request.location_id is not None:
+            # Monitored location: history comes from the observation store,
+            # which only asks the backend for scenes it hasn't seen yet
+            historical, current = await asyncio.gather(
+                _ndvi_history(request, start_date, end_date),
+                imagery_backend.calculate_degradation_indicators_async(request.polygon, end_date)
+            )
+        else:
+            # History and current indicators come back from one Earth Engine request
+            inputs = await imagery_backend.calculate_prediction_inputs_async(
+                request.polygon,
+                start_date,
+                end_date
+            )
+            historical = inputs['time_series']
+            current = inputs['indicators']
         current['erosion_risk'] = 0.3
-        current['degradation_score'] = degradation_analyzer.calculate_score(current)['degradation_score']
+        with stage('scoring'):
+            current['degradation_score'] = degradation_analyzer.calculate_score(current)['degradation_score']
         
         # Make prediction
         prediction = prediction_service.predict_degradation_risk(
             historical,
-            current
+            current,
+            forecast_mode=forecast,
+            horizons=forecast_horizons
         )
         
         return prediction
         
+    except InvalidPolygonError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid polygon: {str(e)}")
+    except AdmissionRejected as e:
+        raise _admission_rejected(e)
+    except BackendTimeoutError as e:
+        raise HTTPException(status_code=504, detail=f"Prediction timed out: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
 @app.post("/api/time-series")
-async def get_time_series(request: AnalysisRequest):
-    """Get NDVI time series for an area"""
+async def get_time_series(
+    request: AnalysisRequest,
+    composite: Optional[str] = None,
+    reducer: Optional[str] = None
+):
+    """Get NDVI time series for an area
+    
+    composite=day|week|month returns one point per period, compositing the
+    period's scenes (reducer=median or max_ndvi) before reduction; the
+    default, scene, returns one point per Sentinel-2 scene.
+    """
+    try:
+        period, method = parse_composite(composite, reducer)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     try:
         end_date = request.end_date or datetime.now().strftime('%Y-%m-%d')
         start_date = request.start_date or (
             datetime.now() - timedelta(days=365)
         ).strftime('%Y-%m-%d')
         
-        time_series = calculate_ndvi_time_series(
-            request.polygon,
-            start_date,
-            end_date
-        )
+        time_series = await _ndvi_history(request, start_date, end_date, (period, method))
+        # Scale the series was reduced at, when the backend reports one
+        scale = next((f['properties']['scale'] for f in time_series if f.get('properties', {}).get('scale')), None)
         
         return {
             'location': request.location_name,
             'start_date': start_date,
             'end_date': end_date,
+            'scale_m': scale,
+            'composite': period,
+            'reducer': method if period != 'scene' else None,
             'data': time_series
         }
         
+    except InvalidPolygonError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid polygon: {str(e)}")
+    except AdmissionRejected as e:
+        raise _admission_rejected(e)
+    except BackendTimeoutError as e:
+        raise HTTPException(status_code=504, detail=f"Time series calculation timed out: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Time series calculation failed: {str(e)}")
 
+async def _ndvi_history(request: AnalysisRequest, start_date: str, end_date: str,
+                       composite: Tuple[str, str] = ('scene', 'median')) -> List[Dict]:
+    """NDVI time series, served incrementally for requests tied to a location"""
+    period, method = composite
+    if request.location_id is None:
+        if period == 'scene':
+            return await imagery_backend.calculate_ndvi_time_series_async(request.polygon, start_date, end_date)
+        return await imagery_backend.calculate_composite_time_series_async(
+            request.polygon,
+            start_date,
+            end_date,
+            period,
+            method
+        )
+    # The store keeps per-scene observations so any composite can be built from them
+    series = await observation_store.get_time_series_async(
+        request.location_id,
+        request.polygon,
+        start_date,
+        end_date,
+        imagery_backend.calculate_ndvi_time_series_async
+    )
+    return composite_features(series, period, method, start_date)
+
+# Endpoints that can also run as background jobs, by job type
+JOB_ENDPOINTS = {
+    "analyze": analyze_soil_degradation,
+    "predict": predict_degradation,
+    "time-series": get_time_series
+}
+
+def _job_handler(endpoint):
+    async def run(params: Dict):
+        # Jobs are queued behind interactive requests for Earth Engine, and
+        # wait out 429s for up to JOB_MAX_THROTTLED_SECONDS before failing
+        waited = 0.0
+        with admission_priority("batch"):
+            while True:
+                try:
+                    return await endpoint(AnalysisRequest(**params["request"]), **params["query"])
+                except HTTPException as e:
+                    if e.status_code != 429:
+                        raise JobFailure(e.status_code, e.detail)
+                    retry_after = float(e.headers["Retry-After"])
+                    if waited + retry_after > JOB_MAX_THROTTLED_SECONDS:
+                        raise JobFailure(429, f"{e.detail} (gave up after waiting {waited:.0f}s)")
+                    await asyncio.sleep(retry_after)
+                    waited += retry_after
+    return run
+
+if job_manager:
+    for job_type, endpoint in JOB_ENDPOINTS.items():
+        job_manager.register(job_type, _job_handler(endpoint))
+    job_manager.register("recommendations-bulk", _bulk_recommendations_job)
+
+@app.post("/api/jobs/analyze", status_code=202)
+async def submit_analysis_job(request: AnalysisRequest, refresh: bool = False):
+    """Run /api/analyze as a background job; poll /api/jobs/{job_id} for the result"""
+    return await _submit_job("analyze", request, {"refresh": refresh})
+
+@app.post("/api/jobs/predict", status_code=202)
+async def submit_prediction_job(request: AnalysisRequest, forecast: Optional[str] = None, horizons: Optional[str] = None):
+    """Run /api/predict as a background job"""
+    if forecast is not None and forecast not in FORECAST_MODES:
+        raise HTTPException(status_code=400, detail="forecast must be 'monte_carlo' or 'linear'")
+    try:
+        parse_horizons(horizons)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await _submit_job("predict", request, {"forecast": forecast, "horizons": horizons})
+
+@app.post("/api/jobs/time-series", status_code=202)
+async def submit_time_series_job(request: AnalysisRequest, composite: Optional[str] = None, reducer: Optional[str] = None):
+    """Run /api/time-series as a background job"""
+    try:
+        parse_composite(composite, reducer)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await _submit_job("time-series", request, {"composite": composite, "reducer": reducer})
+
+async def _submit_job(job_type: str, request: AnalysisRequest, query: Dict) -> Dict:
+    """Queue a job, returning the existing one for an identical request"""
+    return await _queue_job(job_type, {"request": request.model_dump(), "query": query})
+
+async def _queue_job(job_type: str, params: Dict) -> Dict:
+    if not job_manager:
+        raise HTTPException(status_code=503, detail="Background jobs are disabled (JOBS_ENABLED)")
+    try:
+        job = await job_manager.submit(job_type, params)
+    except JobQueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Job queue is full: {str(e)}",
+            headers={"Retry-After": str(JOB_RETRY_AFTER_SECONDS)}
+        )
+    job["status_url"] = f"/api/jobs/{job['job_id']}"
+    job["events_url"] = f"/api/jobs/{job['job_id']}/events"
+    return job
+
+@app.get("/api/jobs/stats")
+async def job_stats():
+    """Get job counts by state, deduplicated submissions and worker settings"""
+    if not job_manager:
+        return {"enabled": False}
+    return {"enabled": True, **job_manager.stats()}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get a job's status and progress, and its result or error once finished
+    
+    error carries the status code and detail the synchronous endpoint would
+    have responded with.
+    """
+    job = await job_manager.get(job_id) if job_manager else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Follow a job as Server-Sent Events: its current state, each completed
+    stage as a progress event, then completed, failed or cancelled with the job
+    """
+    job = await job_manager.get(job_id) if job_manager else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    
+    async def events():
+        async for event in job_manager.events(job_id):
+            yield f"event: {event['type']}\ndata: {json.dumps(event['job'], default=str)}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; finished jobs are returned unchanged"""
+    job = await job_manager.cancel(job_id) if job_manager else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
 @app.get("/api/locations")
-async def get_locations():
-    """Get all monitored locations"""
+async def get_locations(
+    limit: int = Query(1000, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get monitored locations, one page at a time
+    
+    Pass next_cursor back as cursor for the following page; fields is a
+    comma-separated subset of id, name, geom.
+    """
     try:
+        await _dependency("database")
         if not db_service:
-            return {"locations": [], "note": "Database service not available"}
+            return {"locations": [], "next_cursor": None, "note": "Database service not available"}
         
-        locations = db_service.get_all_locations()
-        return {"locations": locations}
+        page = await db_service.get_locations_page_async(limit, cursor, _split_fields(fields))
+        return {"locations": page["items"], "next_cursor": page["next_cursor"]}
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch locations: {str(e)}")
 
+@app.get("/api/locations/within")
+async def get_locations_within(
+    bbox: str,
+    limit: int = Query(1000, ge=1, le=10000)
+):
+    """Monitored locations whose centroid lies in bbox=min_lon,min_lat,max_lon,max_lat"""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be min_lon,min_lat,max_lon,max_lat")
+    if min_lon > max_lon or min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="bbox minimums must not exceed maximums")
+    if not db_service or not db_service.locations.loaded:
+        raise HTTPException(status_code=503, detail="Location index not available")
+    
+    with stage('spatial_within'):
+        # One extra match tells us whether the result was truncated
+        locations = db_service.locations.within(min_lon, min_lat, max_lon, max_lat, limit=limit + 1)
+    return {
+        "locations": locations[:limit],
+        "count": min(len(locations), limit),
+        "truncated": len(locations) > limit
+    }
+
+@app.get("/api/locations/nearest")
+async def get_nearest_locations(
+    lon: float = Query(..., ge=-180, le=180),
+    lat: float = Query(..., ge=-90, le=90),
+    k: int = Query(5, ge=1, le=100),
+    max_km: Optional[float] = Query(None, gt=0)
+):
+    """The k monitored locations nearest to a point, with great-circle distance_km"""
+    if not db_service or not db_service.locations.loaded:
+        raise HTTPException(status_code=503, detail="Location index not available")
+    
+    with stage('spatial_nearest'):
+        locations = db_service.locations.nearest(lon, lat, k, max_km=max_km)
+    return {"locations": locations}
+
 @app.get("/api/location/{location_id}/history")
-async def get_location_history(location_id: int, limit: int = 10):
-    """Get analysis history for a location"""
+async def get_location_history(
+    location_id: int,
+    limit: int = Query(10, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get analysis history for a location, newest first, one page at a time
+    
+    fields is a comma-separated list of columns (id, location_id, created_at,
+    result) or result keys such as degradation_score, severity and date, so
+    callers can skip the full result blob.
+    """
     try:
+        await _dependency("database")
         if not db_service:
-            return {"history": [], "note": "Database service not available"}
+            return {"history": [], "next_cursor": None, "note": "Database service not available"}
         
-        history = db_service.get_location_history(location_id, limit)
-        return {"location_id": location_id, "history": history}
+        page = await db_service.get_location_history_page_async(location_id, limit, cursor, _split_fields(fields))
+        return {"location_id": location_id, "history": page["items"], "next_cursor": page["next_cursor"]}
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch history: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,251 @@
+import os
+import math
+import time
+import asyncio
+import logging
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from services.executor_service import BackendTimeoutError, TokenBucket, run_blocking
+from services.metrics_service import log_event, registry, stage
+
+# Priority classes, highest first: waiting interactive requests are always
+# admitted before waiting batch work
+PRIORITIES = ('interactive', 'batch')
+
+# Fragments of Earth Engine errors that mean we've hit a quota or rate limit
+QUOTA_ERROR_MARKERS = ('too many concurrent', 'too many requests', 'quota', 'rate limit')
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar('admission_priority', default='interactive')
+
+admission_wait_seconds = registry.histogram(
+    'soilsense_admission_wait_seconds',
+    'Time Earth Engine requests waited for admission',
+    ('priority',)
+)
+admission_decisions = registry.counter(
+    'soilsense_admission_decisions_total',
+    'Earth Engine admission decisions by outcome',
+    ('priority', 'outcome')
+)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of queued; retry after retry_after seconds"""
+
+    def __init__(self, priority: str, reason: str, retry_after: float):
+        self.priority = priority
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"Earth Engine is at capacity ({reason}); retry in {self.retry_after}s")
+
+
+@contextmanager
+def admission_priority(priority: str) -> Iterator[None]:
+    """Admit Earth Engine requests made inside the block in the given priority class"""
+    if priority not in PRIORITIES:
+        raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def is_quota_error(error: BaseException) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in QUOTA_ERROR_MARKERS)
+
+
+class AdmissionController:
+    """Rate-limits requests to a backend with a priority queue and load shedding
+
+    A token bucket sets the sustained request rate and burst. Requests that
+    can't be admitted at once wait in a bounded queue per priority class;
+    interactive waiters go first, batch waiters when no interactive one is
+    waiting. A request is shed with AdmissionRejected, rather than queued,
+    when its class's queue is full or its estimated wait exceeds the class's
+    max wait, so interactive latency stays bounded under load instead of
+    growing with the backlog. Waiters that run out their max wait are shed
+    too.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        max_queued: Dict[str, int],
+        max_wait: Dict[str, float],
+        quota_backoff: float = 5.0
+    ):
+        self.bucket = TokenBucket(rate, capacity=burst)
+        self.max_queued = max_queued
+        self.max_wait = max_wait
+        self.quota_backoff = quota_backoff
+
+        self._queues: Dict[str, deque] = {priority: deque() for priority in PRIORITIES}
+        self._pump_task: Optional[asyncio.Task] = None
+        self._stats = {
+            priority: {'admitted': 0, 'queued': 0, 'shed': 0, 'timed_out': 0, 'wait_seconds': 0.0}
+            for priority in PRIORITIES
+        }
+        self._quota_errors = 0
+
+    async def admit(self, cost: float = 1) -> None:
+        """Wait for admission in the current priority class
+
+        Raises:
+            AdmissionRejected: If the request is shed
+        """
+        priority = _priority.get()
+        # A request costlier than the burst could never be admitted
+        cost = min(cost, self.bucket.capacity)
+        start = time.monotonic()
+
+        # Admit straight away when nobody with the same or higher priority is waiting
+        if not self._waiting_ahead(priority) and self.bucket.try_acquire(cost) == 0:
+            self._admitted(priority, 0.0)
+            return
+
+        estimate = self.estimated_wait(priority, cost)
+        if len(self._queues[priority]) >= self.max_queued[priority]:
+            self._shed(priority, 'queue_full', estimate)
+        if estimate > self.max_wait[priority]:
+            self._shed(priority, 'overloaded', estimate)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, cost)
+        self._queues[priority].append(entry)
+        self._stats[priority]['queued'] += 1
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+
+        try:
+            with stage('ee_admission_wait'):
+                await asyncio.wait_for(future, timeout=self.max_wait[priority])
+        except asyncio.TimeoutError:
+            self._stats[priority]['timed_out'] += 1
+            self._shed(priority, 'wait_timeout', self.estimated_wait(priority, cost))
+        finally:
+            # Timed out or the request was cancelled: give up the place in line
+            if future.cancelled() and entry in self._queues[priority]:
+                self._queues[priority].remove(entry)
+        self._admitted(priority, time.monotonic() - start)
+
+    def estimated_wait(self, priority: str, cost: float = 1) -> float:
+        """Seconds until a new request of this priority would be admitted"""
+        ahead = sum(c for p in PRIORITIES[:PRIORITIES.index(priority) + 1] for _, c in self._queues[p])
+        return max(0.0, ahead + cost - self.bucket.available()) / self.bucket.rate
+
+    def backoff(self, error: BaseException) -> None:
+        """Pause admissions after the backend reports a quota error"""
+        self._quota_errors += 1
+        self.bucket.drain(self.quota_backoff)
+        log_event('admission_quota_backoff', level=logging.WARNING, seconds=self.quota_backoff, error=str(error))
+
+    async def _pump(self) -> None:
+        """Grant tokens to waiters, highest priority first, as the bucket refills"""
+        while True:
+            entry, queue = self._next_waiter()
+            if entry is None:
+                return
+            future, cost = entry
+            wait = self.bucket.try_acquire(cost)
+            if wait > 0:
+                # Re-pick after sleeping: a higher priority waiter may have arrived
+                await asyncio.sleep(wait)
+                continue
+            queue.popleft()
+            if not future.done():
+                future.set_result(None)
+
+    def _next_waiter(self):
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            # Drop waiters that timed out or whose request was cancelled
+            while queue and queue[0][0].done():
+                queue.popleft()
+            if queue:
+                return queue[0], queue
+        return None, None
+
+    def _waiting_ahead(self, priority: str) -> bool:
+        return any(self._queues[p] for p in PRIORITIES[:PRIORITIES.index(priority) + 1])
+
+    def _admitted(self, priority: str, waited: float) -> None:
+        self._stats[priority]['admitted'] += 1
+        self._stats[priority]['wait_seconds'] += waited
+        admission_wait_seconds.observe(waited, priority=priority)
+        admission_decisions.inc(priority=priority, outcome='admitted')
+
+    def _shed(self, priority: str, reason: str, retry_after: float) -> None:
+        self._stats[priority]['shed'] += 1
+        admission_decisions.inc(priority=priority, outcome=reason)
+        raise AdmissionRejected(priority, reason, retry_after)
+
+    def stats(self) -> Dict:
+        return {
+            'rate_limit': self.bucket.stats(),
+            'quota_errors': self._quota_errors,
+            'classes': {
+                priority: {
+                    **{k: round(v, 3) if isinstance(v, float) else v for k, v in self._stats[priority].items()},
+                    'depth': len(self._queues[priority]),
+                    'max_queued': self.max_queued[priority],
+                    'max_wait': self.max_wait[priority],
+                    'estimated_wait': round(self.estimated_wait(priority), 3)
+                }
+                for priority in PRIORITIES
+            }
+        }
+
+
+def admission_from_env() -> Optional[AdmissionController]:
+    """Build the Earth Engine admission controller, or None when EE_ADMISSION_ENABLED is off"""
+    if os.getenv('EE_ADMISSION_ENABLED', 'true').lower() not in ('1', 'true', 'yes'):
+        return None
+    return AdmissionController(
+        rate=float(os.getenv('EE_REQUESTS_PER_SECOND', 40)),
+        burst=float(os.getenv('EE_REQUEST_BURST', 40)),
+        max_queued={
+            'interactive': int(os.getenv('EE_QUEUE_INTERACTIVE', 100)),
+            'batch': int(os.getenv('EE_QUEUE_BATCH', 1000))
+        },
+        max_wait={
+            'interactive': float(os.getenv('EE_MAX_WAIT_INTERACTIVE_SECONDS', 10)),
+            'batch': float(os.getenv('EE_MAX_WAIT_BATCH_SECONDS', 300))
+        },
+        quota_backoff=float(os.getenv('EE_QUOTA_BACKOFF_SECONDS', 5))
+    )
+
+
+ee_admission = admission_from_env()
+
+
+async def run_earth_engine(fn: Callable, *args, cost: float = 1, timeout: Optional[float] = None) -> Any:
+    """run_blocking on the Earth Engine executor, admitted by ee_admission first
+
+    A quota error from the backend pauses admissions for everyone and is
+    raised as AdmissionRejected, so callers answer 429 rather than 500.
+
+    Args:
+        fn: Blocking callable that talks to the imagery backend
+        cost: Backend requests fn makes, in tokens; 0 skips admission
+        timeout: Passed to run_blocking
+    """
+    if ee_admission is None:
+        return await run_blocking('earth_engine', fn, *args, timeout=timeout)
+    if cost > 0:
+        # Free calls (e.g. served from the cache) don't queue for a token
+        await ee_admission.admit(cost)
+    try:
+        return await run_blocking('earth_engine', fn, *args, timeout=timeout)
+    except BackendTimeoutError:
+        raise
+    except Exception as e:
+        if not is_quota_error(e):
+            raise
+        ee_admission.backoff(e)
+        raise AdmissionRejected(_priority.get(), 'quota', ee_admission.quota_backoff) from e
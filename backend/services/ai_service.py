@@ -1,15 +1,64 @@
 import os
-from typing import Dict
-from anthropic import Anthropic
+import random
+import asyncio
+import threading
+from itertools import chain
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from anthropic import Anthropic, AsyncAnthropic, APIConnectionError, InternalServerError, RateLimitError
+
+from services.cache_service import ResultCache, ai_cache, make_key
+from services.executor_service import run_blocking
+from services.metrics_service import stage
+
+MODEL = "claude-3-5-sonnet-20241022"
+
+# Prompt inputs are rounded to these steps before building the prompt, so
+# fields in the same condition class share one prompt and one cached response
+SCORE_STEP = float(os.getenv('AI_CACHE_SCORE_STEP', 2.5))
+INDICATOR_STEP = float(os.getenv('AI_CACHE_INDICATOR_STEP', 5))
+
+# Bulk generation: concurrent requests, retries on 429/5xx/connection errors
+# (exponential backoff with jitter, capped), and message batch polling interval
+BULK_CONCURRENCY = int(os.getenv('AI_BULK_CONCURRENCY', 8))
+RETRY_ATTEMPTS = int(os.getenv('AI_RETRY_ATTEMPTS', 5))
+RETRY_BASE_SECONDS = float(os.getenv('AI_RETRY_BASE_SECONDS', 1.0))
+RETRY_MAX_SECONDS = float(os.getenv('AI_RETRY_MAX_SECONDS', 60.0))
+BATCH_POLL_SECONDS = float(os.getenv('AI_BATCH_POLL_SECONDS', 30.0))
+
+# A streamed response holds an AI worker until its last chunk, which can run
+# well past AI_TIMEOUT_SECONDS for a single completion, so it has its own limit
+STREAM_TIMEOUT_SECONDS = float(os.getenv('AI_STREAM_TIMEOUT_SECONDS', 300))
+
+_RETRYABLE = (RateLimitError, InternalServerError, APIConnectionError)
 
 class AIRecommendationService:
     """Service for generating AI-powered restoration recommendations using Claude"""
     
-    def __init__(self):
-        api_key = os.getenv('ANTHROPIC_API_KEY')
-        if not api_key:
-            raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
-        self.client = Anthropic(api_key=api_key)
+    def __init__(
+        self,
+        client: Optional[Anthropic] = None,
+        cache: Optional[ResultCache] = None,
+        async_client: Optional[AsyncAnthropic] = None
+    ):
+        if client is None:
+            api_key = os.getenv('ANTHROPIC_API_KEY')
+            if not api_key:
+                raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
+            client = Anthropic(api_key=api_key)
+        self.client = client
+        self.cache = cache if cache is not None else ai_cache
+        self._async_client = async_client
+    
+    @property
+    def async_client(self) -> AsyncAnthropic:
+        """Pooled async client for bulk generation, created on first use
+        
+        SDK retries are disabled because _complete_async applies its own
+        backoff, which honours retry-after across the whole bulk run.
+        """
+        if self._async_client is None:
+            self._async_client = AsyncAnthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), max_retries=0)
+        return self._async_client
     
     def generate_recommendations(self, analysis_data: Dict) -> Dict:
         """Generate personalized restoration recommendations
@@ -20,11 +69,287 @@ class AIRecommendationService:
         Returns:
             Dict with recommendations, interventions, and timeline
         """
-        prompt = self._build_prompt(analysis_data)
+        prompt_inputs = self._quantize(analysis_data)
+        prompt = self._build_prompt(prompt_inputs)
+        
+        try:
+            # Identical fingerprints share one cached response, and concurrent
+            # misses on the same fingerprint wait for a single upstream call
+            response_text = self.cache.get_or_compute(
+                self._fingerprint(prompt_inputs),
+                lambda: self._complete(prompt)
+            )
+            return self._parse_recommendations(response_text, analysis_data)
+            
+        except Exception as e:
+            return {
+                'error': f'Failed to generate recommendations: {str(e)}',
+                'fallback_recommendations': self._get_fallback_recommendations(analysis_data)
+            }
+    
+    async def generate_recommendations_async(self, analysis_data: Dict) -> Dict:
+        """Non-blocking generate_recommendations, run on the bounded AI executor"""
+        return await run_blocking('ai', self.generate_recommendations, analysis_data)
+    
+    def stream_recommendations(self, analysis_data: Dict, cancelled: Optional[threading.Event] = None) -> Iterator[Dict]:
+        """Generate recommendations as a sequence of events, forwarding text as Claude writes it
+        
+        Args:
+            analysis_data: Dict containing degradation analysis results
+            cancelled: Stop streaming (and close the upstream request) once set
+        
+        Yields:
+            {'type': 'envelope', ...} with severity, primary_focus, generated_at and confidence,
+            then {'type': 'delta', 'text': ...} per text chunk, then {'type': 'done', 'cached': bool}.
+            If Claude fails part way, a {'type': 'fallback', ...} event replaces 'done'.
+        """
+        envelope = self._parse_recommendations('', analysis_data)
+        del envelope['recommendations']
+        yield {'type': 'envelope', **envelope}
+        
+        prompt_inputs = self._quantize(analysis_data)
+        fingerprint = self._fingerprint(prompt_inputs)
+        
+        cached = self.cache.get(fingerprint)
+        if cached is not None:
+            yield {'type': 'delta', 'text': cached}
+            yield {'type': 'done', 'cached': True}
+            return
+        
+        chunks = []
+        try:
+            with stage('anthropic_stream'):
+                with self.client.messages.stream(
+                    model=MODEL,
+                    max_tokens=2000,
+                    temperature=0.7,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": self._build_prompt(prompt_inputs)
+                        }
+                    ]
+                ) as stream:
+                    texts = iter(stream.text_stream)
+                    with stage('anthropic_first_token'):
+                        first = next(texts, None)
+                    for text in chain([first] if first is not None else [], texts):
+                        if cancelled is not None and cancelled.is_set():
+                            return
+                        chunks.append(text)
+                        yield {'type': 'delta', 'text': text}
+        except Exception as e:
+            yield {
+                'type': 'fallback',
+                'error': f'Failed to generate recommendations: {str(e)}',
+                'fallback_recommendations': self._get_fallback_recommendations(analysis_data)
+            }
+            return
+        
+        # Only complete responses are cached, so a broken stream is retried next time
+        self.cache.set(fingerprint, ''.join(chunks))
+        yield {'type': 'done', 'cached': False}
+    
+    async def stream_recommendations_async(self, analysis_data: Dict) -> AsyncIterator[Dict]:
+        """Async iterator over stream_recommendations, produced on the bounded AI executor
+        
+        The stream is limited by AI_STREAM_TIMEOUT_SECONDS rather than the
+        executor's per-call timeout; past it, a fallback event ends the stream.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+        
+        def produce():
+            for event in self.stream_recommendations(analysis_data, cancelled):
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+        
+        producer = asyncio.ensure_future(run_blocking('ai', produce, timeout=STREAM_TIMEOUT_SECONDS))
+        getter = None
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, producer}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield getter.result()
+                    continue
+                
+                # The producer has finished; events it queued are already on
+                # the loop ahead of its completion, so drain them first
+                getter.cancel()
+                while not queue.empty():
+                    yield queue.get_nowait()
+                error = producer.exception()
+                if error is not None:
+                    yield {
+                        'type': 'fallback',
+                        'error': f'Failed to generate recommendations: {str(error)}',
+                        'fallback_recommendations': self._get_fallback_recommendations(analysis_data)
+                    }
+                return
+        finally:
+            # Client went away or we're done: stop the worker at its next chunk
+            cancelled.set()
+            if getter is not None and not getter.done():
+                getter.cancel()
+            # Stop waiting on the worker; the thread itself exits at its next chunk
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+    
+    async def generate_recommendations_bulk(
+        self,
+        analyses: List[Dict],
+        mode: str = 'interactive',
+        concurrency: Optional[int] = None,
+        poll_seconds: Optional[float] = None
+    ) -> AsyncIterator[Dict]:
+        """Generate recommendations for many analyses, yielding each result as it completes
+        
+        Analyses that quantize to the same prompt share one upstream request,
+        and prompts already in the cache are answered without one.
+        
+        Args:
+            analyses: List of analysis dicts, as for generate_recommendations
+            mode: 'interactive' sends concurrent requests through the async client;
+                'batch' submits one message batch and streams its results once it ends
+            concurrency: Max requests in flight in interactive mode (default AI_BULK_CONCURRENCY)
+            poll_seconds: Batch status polling interval (default AI_BATCH_POLL_SECONDS)
+        
+        Yields:
+            The generate_recommendations result for each analysis, plus its 'index'
+        """
+        if mode not in ('interactive', 'batch'):
+            raise ValueError(f"Unknown bulk mode: {mode}")
+        
+        groups: Dict[str, List[int]] = {}
+        prompts: Dict[str, str] = {}
+        for i, data in enumerate(analyses):
+            prompt_inputs = self._quantize(data)
+            fingerprint = self._fingerprint(prompt_inputs)
+            if fingerprint not in groups:
+                groups[fingerprint] = []
+                prompts[fingerprint] = self._build_prompt(prompt_inputs)
+            groups[fingerprint].append(i)
+        
+        pending = {}
+        for fingerprint, prompt in prompts.items():
+            cached = self.cache.get(fingerprint)
+            if cached is None:
+                pending[fingerprint] = prompt
+                continue
+            for i in groups[fingerprint]:
+                yield self._bulk_result(i, analyses[i], cached, None)
         
+        if mode == 'batch':
+            completions = self._complete_batch(pending, poll_seconds if poll_seconds is not None else BATCH_POLL_SECONDS)
+        else:
+            completions = self._complete_concurrently(pending, concurrency or BULK_CONCURRENCY)
+        
+        async for fingerprint, response_text, error in completions:
+            if error is None:
+                self.cache.set(fingerprint, response_text)
+            for i in groups[fingerprint]:
+                yield self._bulk_result(i, analyses[i], response_text, error)
+    
+    def _bulk_result(self, index: int, data: Dict, response_text: Optional[str], error: Optional[Exception]) -> Dict:
+        if error is not None:
+            return {
+                'index': index,
+                'error': f'Failed to generate recommendations: {str(error)}',
+                'fallback_recommendations': self._get_fallback_recommendations(data)
+            }
+        return {'index': index, **self._parse_recommendations(response_text, data)}
+    
+    async def _complete_concurrently(
+        self, prompts: Dict[str, str], concurrency: int
+    ) -> AsyncIterator[Tuple[str, Optional[str], Optional[Exception]]]:
+        """Complete prompts with at most concurrency requests in flight, in completion order"""
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def complete(fingerprint: str, prompt: str):
+            async with semaphore:
+                try:
+                    return fingerprint, await self._complete_async(prompt), None
+                except Exception as e:
+                    return fingerprint, None, e
+        
+        tasks = [asyncio.ensure_future(complete(fingerprint, prompt)) for fingerprint, prompt in prompts.items()]
         try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def _complete_async(self, prompt: str) -> str:
+        """Send the prompt through the async client, backing off on rate limits and overload"""
+        attempt = 0
+        while True:
+            try:
+                with stage('anthropic_messages'):
+                    message = await self.async_client.messages.create(
+                        model=MODEL,
+                        max_tokens=2000,
+                        temperature=0.7,
+                        messages=[
+                            {
+                                "role": "user",
+                                "content": prompt
+                            }
+                        ]
+                    )
+                return _message_text(message)
+            except _RETRYABLE as e:
+                if attempt >= RETRY_ATTEMPTS:
+                    raise
+                await asyncio.sleep(_retry_delay(e, attempt))
+                attempt += 1
+    
+    async def _complete_batch(
+        self, prompts: Dict[str, str], poll_seconds: float
+    ) -> AsyncIterator[Tuple[str, Optional[str], Optional[Exception]]]:
+        """Submit prompts as one message batch, wait for it to end and stream its results"""
+        if not prompts:
+            return
+        
+        # Fingerprints are 64 hex chars, which is exactly what custom_id allows
+        batch = await self.async_client.messages.batches.create(
+            requests=[
+                {
+                    'custom_id': fingerprint,
+                    'params': {
+                        'model': MODEL,
+                        'max_tokens': 2000,
+                        'temperature': 0.7,
+                        'messages': [{'role': 'user', 'content': prompt}]
+                    }
+                }
+                for fingerprint, prompt in prompts.items()
+            ]
+        )
+        while batch.processing_status != 'ended':
+            await asyncio.sleep(poll_seconds)
+            batch = await self.async_client.messages.batches.retrieve(batch.id)
+        
+        seen = set()
+        async for entry in await self.async_client.messages.batches.results(batch.id):
+            if entry.custom_id not in prompts:
+                continue
+            seen.add(entry.custom_id)
+            if entry.result.type == 'succeeded':
+                yield entry.custom_id, _message_text(entry.result.message), None
+            else:
+                # errored, canceled or expired
+                yield entry.custom_id, None, RuntimeError(f"Batch request {entry.result.type}")
+        
+        for fingerprint in prompts.keys() - seen:
+            yield fingerprint, None, RuntimeError("Batch request missing from results")
+    
+    def _complete(self, prompt: str) -> str:
+        """Send the prompt to Claude and return the response text"""
+        with stage('anthropic_messages'):
             message = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
+                model=MODEL,
                 max_tokens=2000,
                 temperature=0.7,
                 messages=[
@@ -34,23 +359,23 @@ class AIRecommendationService:
                     }
                 ]
             )
-            
-            # Extract text from response
-            response_text = ""
-            if message.content and len(message.content) > 0:
-                content_block = message.content[0]
-                if hasattr(content_block, 'text'):
-                    response_text = content_block.text  # type: ignore
-                else:
-                    response_text = str(content_block)
-            
-            return self._parse_recommendations(response_text, analysis_data)
-            
-        except Exception as e:
-            return {
-                'error': f'Failed to generate recommendations: {str(e)}',
-                'fallback_recommendations': self._get_fallback_recommendations(analysis_data)
+        return _message_text(message)
+    
+    def _quantize(self, data: Dict) -> Dict:
+        """Reduce analysis data to the prompt inputs, rounded to the cache steps"""
+        indicators = data.get('indicators', {}) or {}
+        return {
+            'severity': data.get('severity', 'Unknown'),
+            'degradation_score': _round_to(data.get('degradation_score', 0), SCORE_STEP),
+            'primary_factors': list(data.get('primary_factors', []) or []),
+            'indicators': {
+                name: _round_to(indicators.get(name, 0), INDICATOR_STEP)
+                for name in ('vegetation_health', 'moisture_level', 'soil_exposure', 'erosion_risk')
             }
+        }
+    
+    def _fingerprint(self, prompt_inputs: Dict) -> str:
+        return make_key('recommendation', MODEL, prompt_inputs)
     
     def _build_prompt(self, data: Dict) -> str:
         """Build the prompt for Claude"""
@@ -130,3 +455,34 @@ Format your response as clear, numbered recommendations with practical details."
             'factors_addressed': factors,
             'note': 'Generic recommendations provided. Connect API for personalized analysis.'
         }
+
+def _message_text(message) -> str:
+    """Extract the text of the first content block of a Messages API response"""
+    response_text = ""
+    if message.content and len(message.content) > 0:
+        content_block = message.content[0]
+        if hasattr(content_block, 'text'):
+            response_text = content_block.text  # type: ignore
+        else:
+            response_text = str(content_block)
+    return response_text
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Seconds to wait before retrying: the server's retry-after if given, else jittered exponential backoff"""
+    response = getattr(error, 'response', None)
+    if response is not None:
+        try:
+            return min(float(response.headers.get('retry-after')), RETRY_MAX_SECONDS)
+        except (TypeError, ValueError):
+            pass
+    return min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+def _round_to(value, step: float) -> float:
+    """Round value to the nearest multiple of step"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    if step <= 0:
+        return value
+    return round(round(value / step) * step, 2)
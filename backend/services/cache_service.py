@@ -0,0 +1,332 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+_MISSING = object()
+
+
+def polygon_hash(polygon: List[List[float]], precision: int = 6) -> str:
+    """Hash a polygon independently of ring start point, winding and closure
+
+    Args:
+        polygon: List of [lon, lat] coordinates (or a single-ring list of rings)
+        precision: Decimal places kept when rounding coordinates
+
+    Returns:
+        Hex SHA-256 digest of the normalized ring
+    """
+    ring = polygon[0] if polygon and isinstance(polygon[0][0], (list, tuple)) else polygon
+    points = [(round(float(p[0]), precision), round(float(p[1]), precision)) for p in ring]
+
+    # Drop the closing vertex so open and closed rings hash the same
+    if len(points) > 1 and points[0] == points[-1]:
+        points = points[:-1]
+
+    if points:
+        # Canonical winding: counter-clockwise (positive shoelace area)
+        area = sum(
+            points[i][0] * points[(i + 1) % len(points)][1] - points[(i + 1) % len(points)][0] * points[i][1]
+            for i in range(len(points))
+        )
+        if area < 0:
+            points.reverse()
+
+        # Canonical start: the lexicographically smallest vertex
+        start = points.index(min(points))
+        points = points[start:] + points[:start]
+
+    return hashlib.sha256(json.dumps(points, separators=(',', ':')).encode()).hexdigest()
+
+
+def make_key(*parts: Any) -> str:
+    """Build a stable cache key from JSON-serializable parts"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ResultCache:
+    """Two-tier (memory LRU + disk) TTL cache with single-flight miss coalescing"""
+
+    def __init__(
+        self,
+        name: str,
+        ttl_seconds: float = 3600,
+        max_entries: int = 1024,
+        cache_dir: Optional[str] = None,
+        max_disk_bytes: int = 256 * 1024 * 1024
+    ):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.cache_dir = os.path.join(cache_dir, name) if cache_dir else None
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Dict] = {}
+        self._disk_bytes: Optional[int] = None
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'evictions': 0,
+            'disk_evictions': 0,
+            'errors': 0
+        }
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Look up a key in memory, then on disk"""
+        value = self._get(key)
+        return default if value is _MISSING else value
+
+    def contains(self, key: str) -> bool:
+        """Whether key has a live entry, without counting a hit or miss
+
+        A disk entry is promoted to memory, so the get that usually follows
+        is a memory hit.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[1] > now:
+                return True
+        value, expires_at = self._disk_get(key, now)
+        if value is _MISSING:
+            return False
+        self._memory_set(key, value, expires_at)
+        return True
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Store a value in both tiers"""
+        expires_at = time.time() + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        self._memory_set(key, value, expires_at)
+        self._disk_set(key, value, expires_at)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl_seconds: Optional[float] = None) -> Any:
+        """Return the cached value for key, computing it at most once across threads
+
+        Concurrent callers that miss on the same key wait for the first
+        caller's result instead of issuing their own upstream request.
+        """
+        value = self._get(key)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = {'event': threading.Event(), 'value': None, 'error': None}
+                self._inflight[key] = flight
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            flight['event'].wait()
+            if flight['error'] is not None:
+                raise flight['error']
+            return flight['value']
+
+        try:
+            value = compute()
+            self.set(key, value, ttl_seconds)
+            flight['value'] = value
+            return value
+        except Exception as e:
+            flight['error'] = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight['event'].set()
+
+    def invalidate(self, key: str) -> None:
+        """Remove a key from both tiers"""
+        with self._lock:
+            self._memory.pop(key, None)
+        path = self._disk_path(key)
+        if path and os.path.exists(path):
+            try:
+                size = os.path.getsize(path)
+                os.unlink(path)
+                with self._lock:
+                    if self._disk_bytes is not None:
+                        self._disk_bytes -= size
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+        if self.cache_dir:
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith('.json'):
+                    try:
+                        os.unlink(entry.path)
+                    except OSError:
+                        pass
+            with self._lock:
+                self._disk_bytes = 0
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current tier sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+            stats['disk_bytes'] = self._disk_bytes
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        stats['name'] = self.name
+        return stats
+
+    def _get(self, key: str) -> Any:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return value
+                del self._memory[key]
+
+        value, expires_at = self._disk_get(key, now)
+        if value is not _MISSING:
+            self._memory_set(key, value, expires_at)
+            with self._lock:
+                self._stats['disk_hits'] += 1
+            return value
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return _MISSING
+
+    def _memory_set(self, key: str, value: Any, expires_at: float) -> None:
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _disk_path(self, key: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def _disk_get(self, key: str, now: float) -> tuple:
+        path = self._disk_path(key)
+        if not path or not os.path.exists(path):
+            return _MISSING, 0
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+            if entry.get('expires_at', 0) <= now:
+                self.invalidate(key)
+                return _MISSING, 0
+            # Touch the file so size-bounded eviction is least-recently-used
+            os.utime(path, None)
+            return entry.get('value'), entry['expires_at']
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self._stats['errors'] += 1
+            return _MISSING, 0
+
+    def _disk_set(self, key: str, value: Any, expires_at: float) -> None:
+        path = self._disk_path(key)
+        if not path:
+            return
+        try:
+            payload = json.dumps({'key': key, 'expires_at': expires_at, 'value': value})
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+
+            # Write atomically so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+
+            with self._lock:
+                if self._disk_bytes is None:
+                    self._disk_bytes = self._scan_disk_bytes()
+                else:
+                    self._disk_bytes += len(payload) - previous
+                over_budget = self._disk_bytes > self.max_disk_bytes
+            if over_budget:
+                self._evict_disk()
+        except (OSError, TypeError, ValueError):
+            with self._lock:
+                self._stats['errors'] += 1
+
+    def _scan_disk_bytes(self) -> int:
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.json'):
+                try:
+                    total += entry.stat().st_size
+                except OSError:
+                    pass
+        return total
+
+    def _evict_disk(self) -> None:
+        """Delete expired entries, then least-recently-used ones, until under budget"""
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            except OSError:
+                pass
+
+        total = sum(size for _, size, _ in entries)
+        # Target 90% of the budget so we don't evict on every write
+        target = int(self.max_disk_bytes * 0.9)
+        for mtime, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+                with self._lock:
+                    self._stats['disk_evictions'] += 1
+            except OSError:
+                pass
+
+        with self._lock:
+            self._disk_bytes = total
+
+
+def _cache_from_env(name: str, default_ttl: float, persist: bool = True) -> ResultCache:
+    prefix = name.upper()
+    cache_dir = os.getenv('RESULT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'soilsense-cache'))
+    if os.getenv(f'{prefix}_CACHE_PERSIST', 'true' if persist else 'false').lower() not in ('1', 'true', 'yes'):
+        cache_dir = 'none'
+    return ResultCache(
+        name=name,
+        ttl_seconds=float(os.getenv(f'{prefix}_CACHE_TTL', default_ttl)),
+        max_entries=int(os.getenv(f'{prefix}_CACHE_MAX_ENTRIES', 1024)),
+        cache_dir=cache_dir if cache_dir.lower() != 'none' else None,
+        max_disk_bytes=int(os.getenv(f'{prefix}_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    )
+
+
+# Earth Engine results for a fixed polygon and date window are effectively immutable,
+# so a long TTL is safe; it only bounds staleness for windows that end "today".
+ee_cache = _cache_from_env('ee', default_ttl=6 * 3600)
+
+# Claude recommendations keyed on quantized prompt inputs. Disk persistence is
+# opt-in (AI_CACHE_PERSIST=true) since responses may be tuned over time.
+ai_cache = _cache_from_env('ai', default_ttl=7 * 24 * 3600, persist=False)
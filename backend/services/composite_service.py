@@ -0,0 +1,86 @@
+import os
+import numpy as np
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+# How scenes are grouped before reduction: 'scene' keeps one point per
+# Sentinel-2 scene, the others composite every scene in a period into one
+COMPOSITE_PERIODS = ('scene', 'day', 'week', 'month')
+
+# How a period's scenes are combined: per-pixel median, or the pixel from the
+# greenest scene (max NDVI, which also skips most residual cloud)
+COMPOSITE_REDUCERS = ('median', 'max_ndvi')
+
+DEFAULT_COMPOSITE = os.getenv('TIME_SERIES_COMPOSITE', 'scene')
+DEFAULT_COMPOSITE_REDUCER = os.getenv('TIME_SERIES_COMPOSITE_REDUCER', 'median')
+
+
+def parse_composite(period: Optional[str], reducer: Optional[str] = None) -> Tuple[str, str]:
+    """Validate a compositing mode, filling in the defaults
+
+    Raises:
+        ValueError: If the period or reducer is unknown
+    """
+    period = (period or DEFAULT_COMPOSITE).lower()
+    reducer = (reducer or DEFAULT_COMPOSITE_REDUCER).lower()
+    if period not in COMPOSITE_PERIODS:
+        raise ValueError(f"composite must be one of {', '.join(COMPOSITE_PERIODS)}")
+    if reducer not in COMPOSITE_REDUCERS:
+        raise ValueError(f"reducer must be one of {', '.join(COMPOSITE_REDUCERS)}")
+    return period, reducer
+
+
+def period_start(date: str, period: str, start_date: str) -> str:
+    """First day of the period containing date
+
+    Weeks are counted from start_date so the first period is a full week;
+    months are calendar months.
+    """
+    if period in ('scene', 'day'):
+        return date[:10]
+    if period == 'month':
+        return date[:7] + '-01'
+    origin = datetime.strptime(start_date, '%Y-%m-%d')
+    days = (datetime.strptime(date[:10], '%Y-%m-%d') - origin).days
+    return (origin + timedelta(days=days // 7 * 7)).strftime('%Y-%m-%d')
+
+
+def composite_features(features: List[Dict], period: str, reducer: str, start_date: str) -> List[Dict]:
+    """Composite an already reduced per-scene series into one feature per period
+
+    Used where scenes can't be composited before reduction (local rasters,
+    the observation store); the median or maximum of the scene means stands
+    in for the mean of the per-pixel composite.
+
+    Args:
+        features: Per-scene features with 'date' and 'ndvi' properties
+        period: One of COMPOSITE_PERIODS
+        reducer: One of COMPOSITE_REDUCERS
+        start_date: Start of the series, the origin of weekly periods
+
+    Returns:
+        One feature per period with scenes, dated at the period start and
+        carrying the number of scenes composited
+    """
+    if period == 'scene':
+        return features
+
+    groups: Dict[str, List[float]] = {}
+    extra: Dict[str, Dict] = {}
+    for feature in features:
+        properties = feature.get('properties', {})
+        if properties.get('ndvi') is None or not properties.get('date'):
+            continue
+        key = period_start(properties['date'], period, start_date)
+        groups.setdefault(key, []).append(properties['ndvi'])
+        extra.setdefault(key, {k: v for k, v in properties.items() if k not in ('date', 'ndvi', 'scenes')})
+
+    combine = np.median if reducer == 'median' else np.max
+    return [
+        {
+            'type': 'Feature',
+            'geometry': None,
+            'properties': dict(extra[key], date=key, ndvi=float(combine(values)), scenes=len(values))
+        }
+        for key, values in sorted(groups.items())
+    ]
@@ -1,19 +1,75 @@
 import os
+import re
+import json
+import base64
 from supabase import create_client, Client  # type: ignore
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 
+from services.executor_service import run_blocking
+from services.location_service import LocationIndex, location_index_from_env
+from services.metrics_service import stage
+
+# Rows per request when paging through a table (postgrest caps responses at 1000 by default)
+PAGE_SIZE = 1000
+
+# Columns callers may project; any other history field is read from the result JSONB
+HISTORY_COLUMNS = ('id', 'location_id', 'created_at', 'result')
+LOCATION_COLUMNS = ('id', 'name', 'geom')
+_FIELD_NAME = re.compile(r'^[a-z_][a-z0-9_]*$')
+
+
+def encode_cursor(position: Dict) -> str:
+    """Opaque page cursor for a keyset position"""
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Dict:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(position, dict):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return position
+
+
 class DatabaseService:
     """Service for interacting with Supabase database"""
     
-    def __init__(self):
-        url = os.getenv('SUPABASE_URL')
-        key = os.getenv('SUPABASE_KEY')
+    def __init__(self, client: Optional[Client] = None, locations: Optional[LocationIndex] = None):
+        if client is None:
+            url = os.getenv('SUPABASE_URL')
+            key = os.getenv('SUPABASE_KEY')
+            
+            if not url or not key:
+                raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
+            
+            client = create_client(url, key)
         
-        if not url or not key:
-            raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
+        self.client: Client = client
+        self.locations = locations if locations is not None else location_index_from_env()
+    
+    def warm_location_index(self) -> int:
+        """Load every location into the in-process index
         
-        self.client: Client = create_client(url, key)
+        Returns:
+            Number of distinct locations indexed
+        """
+        rows: List[Dict] = []
+        with stage('db_warm_locations'):
+            while True:
+                result = (self.client.table('locations')
+                         .select('id,name,geom')
+                         .order('id')
+                         .range(len(rows), len(rows) + PAGE_SIZE - 1)
+                         .execute())
+                page = getattr(result, 'data', None) or []
+                rows.extend(page)
+                if len(page) < PAGE_SIZE:
+                    break
+        return self.locations.load(rows)
     
     def save_analysis(self, location_data: Dict, analysis_result: Dict) -> Dict:
         """Save analysis result to database
@@ -26,15 +82,16 @@ class DatabaseService:
             Dict with saved record ID
         """
         try:
-            # Insert or get location
-            location = self._upsert_location(location_data)
-            
-            # Save analysis result
-            result = self.client.table('analysis_results').insert({
-                'location_id': location['id'],
-                'result': analysis_result,
-                'created_at': datetime.now().isoformat()
-            }).execute()
+            with stage('db_save_analysis'):
+                # Insert or get location
+                location = self._upsert_location(location_data)
+                
+                # Save analysis result
+                result = self.client.table('analysis_results').insert({
+                    'location_id': location['id'],
+                    'result': analysis_result,
+                    'created_at': datetime.now().isoformat()
+                }).execute()
             
             result_id = None
             if hasattr(result, 'data') and result.data and len(result.data) > 0:  # type: ignore
@@ -51,45 +108,156 @@ class DatabaseService:
                 'error': str(e)
             }
     
-    def get_location_history(self, location_id: int, limit: int = 10) -> List[Dict]:
-        """Get analysis history for a location
+    async def save_analysis_async(self, location_data: Dict, analysis_result: Dict) -> Dict:
+        """Non-blocking save_analysis, run on the bounded database executor"""
+        return await run_blocking('database', self.save_analysis, location_data, analysis_result)
+    
+    def save_analyses(self, entries: List[Dict]) -> int:
+        """Save many analysis results with one multi-row insert per table
+        
+        Args:
+            entries: Dicts with 'location' (as for save_analysis), 'result'
+                and 'created_at' (ISO timestamp)
+        
+        Returns:
+            Number of analysis rows written
+        
+        Raises:
+            Any client error, so callers can retry or journal the batch
+        """
+        if not entries:
+            return 0
+        
+        with stage('db_save_analyses'):
+            location_ids = self._resolve_locations([entry['location'] for entry in entries])
+            
+            rows = []
+            for entry in entries:
+                name = entry['location'].get('name', 'Unnamed Location')
+                if name not in location_ids:
+                    raise RuntimeError(f"Could not resolve location '{name}'")
+                rows.append({
+                    'location_id': location_ids[name],
+                    'result': entry['result'],
+                    'created_at': entry['created_at']
+                })
+            
+            self.client.table('analysis_results').insert(rows).execute()
+        
+        return len(rows)
+    
+    def get_location_history_page(
+        self,
+        location_id: int,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None
+    ) -> Dict:
+        """Get one page of a location's analysis history, newest first
+        
+        Pages are keyset-paginated on (created_at, id), so each page is an
+        index range scan however deep the caller pages.
         
         Args:
             location_id: ID of the location
             limit: Maximum number of records to return
+            cursor: next_cursor from the previous page
+            fields: Columns to return; names outside HISTORY_COLUMNS are read
+                from the result JSONB (e.g. degradation_score, severity, date).
+                Defaults to every column.
         
         Returns:
-            List of analysis results
+            Dict with 'items' and 'next_cursor' (None on the last page)
+        
+        Raises:
+            ValueError: For a malformed cursor or field name
         """
-        try:
-            result = (self.client.table('analysis_results')
-                     .select('*')
-                     .eq('location_id', location_id)
+        query = (self.client.table('analysis_results')
+                .select(self._projection(fields, HISTORY_COLUMNS, ('id', 'created_at'), json_column='result'))
+                .eq('location_id', location_id))
+        
+        if cursor:
+            position = decode_cursor(cursor)
+            if 'created_at' not in position or 'id' not in position:
+                raise ValueError(f"Invalid cursor: {cursor}")
+            created_at = json.dumps(str(position['created_at']))
+            query = query.or_(
+                f"created_at.lt.{created_at},and(created_at.eq.{created_at},id.lt.{int(position['id'])})"
+            )
+        
+        with stage('db_history_page'):
+            result = (query
                      .order('created_at', desc=True)
-                     .limit(limit)
+                     .order('id', desc=True)
+                     .limit(limit + 1)
                      .execute())
-            
-            if hasattr(result, 'data') and result.data:  # type: ignore
-                return result.data  # type: ignore
-            return []
-            
-        except Exception as e:
-            return []
+        
+        rows = getattr(result, 'data', None) or []
+        items = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = encode_cursor({'created_at': last['created_at'], 'id': last['id']})
+        return {'items': items, 'next_cursor': next_cursor}
+    
+    async def get_location_history_page_async(
+        self,
+        location_id: int,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None
+    ) -> Dict:
+        """Non-blocking get_location_history_page, run on the bounded database executor"""
+        return await run_blocking('database', self.get_location_history_page, location_id, limit, cursor, fields)
+    
+    def _projection(
+        self,
+        fields: Optional[List[str]],
+        columns: tuple,
+        required: tuple,
+        json_column: Optional[str] = None
+    ) -> str:
+        """Build a postgrest select list, always including the keyset columns"""
+        if not fields:
+            return '*'
+        
+        selected = []
+        for field in dict.fromkeys(list(required) + list(fields)):
+            if not _FIELD_NAME.match(field):
+                raise ValueError(f"Invalid field name: {field}")
+            if field in columns:
+                selected.append(field)
+            elif json_column:
+                selected.append(f'{field}:{json_column}->{field}')
+            else:
+                raise ValueError(f"Unknown field: {field}")
+        return ','.join(selected)
     
     def _upsert_location(self, location_data: Dict) -> Dict:
-        """Insert or update location"""
+        """Find the location matching location_data, creating it if there is none
+        
+        The in-process index answers repeat locations without a round trip;
+        the database is only consulted for locations this process hasn't seen.
+        """
+        location_id = self.locations.resolve(location_data)
+        if location_id is not None:
+            return {'id': location_id}
+        
         name = location_data.get('name', 'Unnamed Location')
         lon = location_data.get('longitude', 0)
         lat = location_data.get('latitude', 0)
         
-        # Check if location exists
+        # Another process may have created it since the index was warmed
         existing = (self.client.table('locations')
-                   .select('*')
+                   .select('id,name,geom')
                    .eq('name', name)
+                   .limit(1)
                    .execute())
         
         if hasattr(existing, 'data') and existing.data and len(existing.data) > 0:  # type: ignore
-            return existing.data[0]  # type: ignore
+            row = existing.data[0]  # type: ignore
+            self.locations.remember(location_data, row['id'])
+            return row
         
         # Create new location
         result = self.client.table('locations').insert({
@@ -98,15 +266,90 @@ class DatabaseService:
         }).execute()
         
         if hasattr(result, 'data') and result.data and len(result.data) > 0:  # type: ignore
-            return result.data[0]  # type: ignore
+            row = result.data[0]  # type: ignore
+            self.locations.remember(location_data, row['id'])
+            return row
         return {}
     
-    def get_all_locations(self) -> List[Dict]:
-        """Get all monitored locations"""
-        try:
-            result = self.client.table('locations').select('*').execute()
-            if hasattr(result, 'data') and result.data:  # type: ignore
-                return result.data  # type: ignore
-            return []
-        except Exception as e:
-            return []
+    def _resolve_locations(self, locations: List[Dict]) -> Dict[str, Any]:
+        """Map location names to ids, creating the missing locations in one insert"""
+        by_name: Dict[str, Dict] = {}
+        for location_data in locations:
+            by_name.setdefault(location_data.get('name', 'Unnamed Location'), location_data)
+        
+        ids: Dict[str, Any] = {}
+        for name, location_data in by_name.items():
+            location_id = self.locations.resolve(location_data)
+            if location_id is not None:
+                ids[name] = location_id
+        
+        unresolved = [name for name in by_name if name not in ids]
+        if unresolved:
+            existing = (self.client.table('locations')
+                       .select('id,name')
+                       .in_('name', unresolved)
+                       .execute())
+            for row in getattr(existing, 'data', None) or []:
+                if row.get('name') in by_name and row['name'] not in ids:
+                    ids[row['name']] = row['id']
+                    self.locations.remember(by_name[row['name']], row['id'])
+        
+        missing = [name for name in by_name if name not in ids]
+        if missing:
+            # New locations in the same batch that share a geometry become one row
+            representative: Dict[str, str] = {}
+            for name in missing:
+                representative[name] = next(
+                    (other for other in dict.fromkeys(representative.values())
+                     if self.locations.same_geometry(by_name[name], by_name[other])),
+                    name
+                )
+            created = self.client.table('locations').insert([
+                {
+                    'name': name,
+                    'geom': f"POINT({by_name[name].get('longitude', 0)} {by_name[name].get('latitude', 0)})"
+                }
+                for name in dict.fromkeys(representative.values())
+            ]).execute()
+            for row in getattr(created, 'data', None) or []:
+                ids[row['name']] = row['id']
+                self.locations.remember(by_name[row['name']], row['id'])
+            for name, other in representative.items():
+                if other in ids and name not in ids:
+                    ids[name] = ids[other]
+                    self.locations.remember(by_name[name], ids[other])
+        
+        return ids
+    
+    def get_locations_page(self, limit: int = PAGE_SIZE, cursor: Optional[str] = None, fields: Optional[List[str]] = None) -> Dict:
+        """Get one page of monitored locations in id order
+        
+        Args:
+            limit: Maximum number of locations to return
+            cursor: next_cursor from the previous page
+            fields: Subset of LOCATION_COLUMNS to return (default all)
+        
+        Returns:
+            Dict with 'items' and 'next_cursor' (None on the last page)
+        
+        Raises:
+            ValueError: For a malformed cursor or unknown field
+        """
+        query = self.client.table('locations').select(self._projection(fields, LOCATION_COLUMNS, ('id',)))
+        if cursor:
+            position = decode_cursor(cursor)
+            if 'id' not in position:
+                raise ValueError(f"Invalid cursor: {cursor}")
+            query = query.gt('id', int(position['id']))
+        
+        with stage('db_locations_page'):
+            result = query.order('id').limit(limit + 1).execute()
+        
+        rows = getattr(result, 'data', None) or []
+        items = rows[:limit]
+        next_cursor = encode_cursor({'id': items[-1]['id']}) if len(rows) > limit else None
+        return {'items': items, 'next_cursor': next_cursor}
+    
+    async def get_locations_page_async(self, limit: int = PAGE_SIZE, cursor: Optional[str] = None, fields: Optional[List[str]] = None) -> Dict:
+        """Non-blocking get_locations_page, run on the bounded database executor"""
+        return await run_blocking('database', self.get_locations_page, limit, cursor, fields)
@@ -1,8 +1,54 @@
-from typing import Dict, List
+import numpy as np
+from typing import Any, Dict, List
+
+# Column aliases accepted by calculate_scores, mapped to indicator names
+_COLUMN_ALIASES = {
+    'ndvi': ('ndvi',),
+    'ndmi': ('ndmi',),
+    'bare_soil_index': ('bare_soil_index', 'bsi'),
+    'erosion_risk': ('erosion_risk', 'erosion')
+}
+
+_DEFAULTS = {
+    'ndvi': 0.5,
+    'ndmi': 0.3,
+    'bare_soil_index': 0.2,
+    'erosion_risk': 0.3
+}
+
+# Scaled values this close to .5 may round differently under np.round and round()
+_TIE_TOLERANCE = 1e-6
+
+
+def _round(values: np.ndarray, digits: int) -> np.ndarray:
+    """np.round that agrees with Python's round() on every value
+
+    np.round multiplies by 10**digits before rounding half to even, which can
+    turn a value just off a tie into an exact one (48.545 -> 4854.5 -> 48.54
+    where round() gives 48.55). Values that land near a tie are re-rounded
+    with round() itself; everywhere else the two already agree.
+    """
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, digits)
+    scaled = values * 10.0 ** digits
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < _TIE_TOLERANCE
+    if near_tie.any():
+        rounded[near_tie] = [round(float(v), digits) for v in values[near_tie]]
+    return rounded
+
 
 class DegradationAnalyzer:
     """Analyzes soil degradation from multiple indicators"""
     
+    SEVERITY_THRESHOLDS = [25, 50, 75]
+    SEVERITY_LABELS = ['Healthy', 'At Risk', 'Degraded', 'Severely Degraded']
+    FACTOR_LABELS = [
+        'Low vegetation cover',
+        'Soil moisture deficit',
+        'High bare soil exposure',
+        'Erosion risk'
+    ]
+    
     def calculate_score(self, indicators: Dict) -> Dict:
         """Calculate composite degradation score
         
@@ -56,6 +102,92 @@ class DegradationAnalyzer:
             }
         }
     
+    def calculate_scores(self, data: Any) -> Any:
+        """Score many indicator rows in one vectorized pass
+        
+        Produces the same values as calling calculate_score row by row: the
+        signals and weighted sum use the same float operations in the same
+        order, severity is classified on the unrounded score, rounding matches
+        round() including at ties, and factor ties keep calculate_score's
+        ordering.
+        
+        Args:
+            data: pandas DataFrame or mapping of column name to array-like with
+                ndvi, ndmi, bare_soil_index (or bsi) and erosion_risk (or erosion).
+                Missing columns fall back to the same defaults as calculate_score.
+        
+        Returns:
+            Columns degradation_score, severity, primary_factor_1,
+            primary_factor_2 (None when no factor passes the threshold),
+            vegetation_health, moisture_level, soil_exposure and erosion_risk,
+            as a DataFrame if a DataFrame was given, otherwise a dict of arrays
+        """
+        columns = self._resolve_columns(data)
+        ndvi = columns['ndvi']
+        ndmi = columns['ndmi']
+        bsi = columns['bare_soil_index']
+        erosion_risk = columns['erosion_risk']
+        
+        # Convert to degradation signals (0 = healthy, 1 = degraded)
+        ndvi_signal = np.maximum(0, (0.6 - ndvi) / 0.6)
+        ndmi_signal = np.maximum(0, (0.4 - ndmi) / 0.4)
+        bsi_signal = np.minimum(1, bsi * 2)
+        erosion_signal = erosion_risk
+        
+        composite_score = (
+            ndvi_signal * 0.30 +
+            ndmi_signal * 0.25 +
+            bsi_signal * 0.25 +
+            erosion_signal * 0.20
+        ) * 100
+        
+        severity_index = np.digitize(composite_score, self.SEVERITY_THRESHOLDS)
+        severity = np.array(self.SEVERITY_LABELS, dtype=object)[severity_index]
+        
+        # Stable argsort on negated signals matches sorted(..., reverse=True)
+        signals = np.stack([ndvi_signal, ndmi_signal, bsi_signal, erosion_signal], axis=1)
+        order = np.argsort(-signals, axis=1, kind='stable')[:, :2]
+        top = np.take_along_axis(signals, order, axis=1)
+        labels = np.array(self.FACTOR_LABELS + [None], dtype=object)
+        factors = labels[np.where(top > 0.3, order, len(self.FACTOR_LABELS))]
+        
+        result = {
+            'degradation_score': _round(composite_score, 2),
+            'severity': severity,
+            'primary_factor_1': factors[:, 0],
+            'primary_factor_2': factors[:, 1],
+            'vegetation_health': _round((1 - ndvi_signal) * 100, 1),
+            'moisture_level': _round((1 - ndmi_signal) * 100, 1),
+            'soil_exposure': _round(bsi_signal * 100, 1),
+            'erosion_risk': _round(erosion_signal * 100, 1)
+        }
+        
+        if hasattr(data, 'columns') and hasattr(data, 'index'):
+            import pandas as pd
+            return pd.DataFrame(result, index=data.index)
+        return result
+    
+    def _resolve_columns(self, data: Any) -> Dict[str, np.ndarray]:
+        """Pull indicator columns out of a DataFrame or mapping as float arrays"""
+        available = list(data.columns) if hasattr(data, 'columns') else list(data.keys())
+        resolved = {}
+        length = None
+        for name, aliases in _COLUMN_ALIASES.items():
+            column = next((alias for alias in aliases if alias in available), None)
+            if column is not None:
+                resolved[name] = np.asarray(data[column], dtype=np.float64)
+                length = len(resolved[name]) if length is None else length
+                if len(resolved[name]) != length:
+                    raise ValueError(f"Column '{column}' has {len(resolved[name])} rows, expected {length}")
+        
+        if length is None:
+            raise ValueError("At least one of ndvi, ndmi, bare_soil_index/bsi, erosion_risk/erosion is required")
+        
+        for name, default in _DEFAULTS.items():
+            if name not in resolved:
+                resolved[name] = np.full(length, default, dtype=np.float64)
+        return resolved
+    
     def _classify_severity(self, score: float) -> str:
         if score < 25:
             return 'Healthy'
@@ -1,8 +1,31 @@
 import ee  # type: ignore
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
+
+from services.cache_service import ResultCache, ee_cache, polygon_hash, make_key
+from services.geometry_service import prepare_aoi, merge_weighted
+from services.metrics_service import stage
+
+# Maximum scene cloud cover accepted for index computation
+CLOUD_THRESHOLD = 20
+
+# Polygons reduced per reduceRegions request in batch analysis
+BATCH_CHUNK_SIZE = int(os.getenv('EE_BATCH_CHUNK_SIZE', 100))
+
+# Upper bound on pixels per reduceRegion; the adaptive scale normally keeps
+# requests far below it
+MAX_PIXELS = int(1e9)
+
+# Tiles of one large area reduced concurrently
+TILE_CONCURRENCY = int(os.getenv('EE_TILE_CONCURRENCY', 4))
+_tile_pool = ThreadPoolExecutor(max_workers=TILE_CONCURRENCY, thread_name_prefix='ee-tile')
+
+# Area plans of recent polygons: admission control counts a query's tiles
+# before it runs, and the query would otherwise plan the same polygon again
+_aoi_plans = ResultCache('aoi_plans', ttl_seconds=3600, max_entries=256)
 
 # Initialize Earth Engine (requires authentication)
 # Run: earthengine authenticate
@@ -65,6 +88,8 @@ def initialize_earth_engine() -> bool:
 def calculate_ndvi_time_series(polygon: List[List[float]], start_date: str, end_date: str) -> List[Dict]:
     """Calculate NDVI time series for a given polygon using Sentinel-2
     
+    Results are cached on the normalized polygon, date window and cloud threshold.
+    
     Args:
         polygon: List of [lon, lat] coordinates
         start_date: Start date in YYYY-MM-DD format
@@ -73,39 +98,95 @@ def calculate_ndvi_time_series(polygon: List[List[float]], start_date: str, end_
     Returns:
         List of dicts with date and ndvi values
     """
-    aoi = ee.Geometry.Polygon(polygon)  # type: ignore
+    return ee_cache.get_or_compute(
+        _time_series_key(polygon, start_date, end_date),
+        lambda: _compute_ndvi_time_series(polygon, start_date, end_date)
+    )
+
+def calculate_composite_time_series(polygon: List[List[float]], start_date: str, end_date: str,
+                                    period: str, reducer: str) -> List[Dict]:
+    """NDVI time series with the scenes of each period composited before reduction
     
-    # Use the updated Sentinel-2 Harmonized collection
-    collection = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')  # type: ignore
-                  .filterBounds(aoi)  # type: ignore
-                  .filterDate(start_date, end_date)  # type: ignore
-                  .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20)))  # type: ignore
+    Overlapping tiles and repeat passes collapse into one image per day, week
+    or month, so the number of reductions and features follows the number of
+    periods rather than the number of scenes.
     
-    def compute_ndvi(image):
-        ndvi = image.normalizedDifference(['B8', 'B4']).rename('NDVI')
-        return image.addBands(ndvi)
+    Args:
+        polygon: List of [lon, lat] coordinates
+        start_date: Start date in YYYY-MM-DD format
+        end_date: End date in YYYY-MM-DD format
+        period: 'day', 'week' (counted from start_date) or 'month'; 'scene'
+            is the uncomposited series
+        reducer: 'median' or 'max_ndvi'
     
-    ndvi_collection = collection.map(compute_ndvi)
+    Returns:
+        List of dicts with date (period start), ndvi and scenes (scenes
+        composited), one per period that has imagery
+    """
+    if period == 'scene':
+        return calculate_ndvi_time_series(polygon, start_date, end_date)
+    return ee_cache.get_or_compute(
+        _time_series_key(polygon, start_date, end_date, (period, reducer)),
+        lambda: _compute_ndvi_time_series(polygon, start_date, end_date, (period, reducer))
+    )
+
+def _compute_ndvi_time_series(polygon: List[List[float]], start_date: str, end_date: str,
+                              composite: Optional[Tuple[str, str]] = None) -> List[Dict]:
+    with stage('polygon_parse'):
+        plan = _prepare_aoi(polygon)
+    if len(plan['tiles']) > 1:
+        return _tiled_ndvi_time_series(plan, start_date, end_date, composite)
     
-    def extract_ndvi(image):
-        stats = image.select('NDVI').reduceRegion(  # type: ignore
-            reducer=ee.Reducer.mean(),  # type: ignore
-            geometry=aoi,
-            scale=10,
-            maxPixels=int(1e9)
+    aoi = ee.Geometry.Polygon(plan['rings'])  # type: ignore
+    ndvi_time_series = _ndvi_time_series_collection(aoi, start_date, end_date, plan['scale'], composite=composite)
+    with stage('ee_getinfo_time_series'):
+        result = ndvi_time_series.getInfo()
+    return result.get('features', []) if result else []
+
+def _tiled_ndvi_time_series(plan: Dict, start_date: str, end_date: str,
+                            composite: Optional[Tuple[str, str]] = None) -> List[Dict]:
+    """Per-tile NDVI series fetched in parallel, merged per date by pixel count"""
+    def tile_series(tile):
+        collection = _ndvi_time_series_collection(
+            ee.Geometry.Polygon(tile),  # type: ignore
+            start_date,
+            end_date,
+            plan['scale'],
+            with_count=True,
+            composite=composite
         )
-        return ee.Feature(None, {  # type: ignore
-            'date': image.date().format('YYYY-MM-dd'),  # type: ignore
-            'ndvi': stats.get('NDVI')  # type: ignore
-        })
+        return (collection.getInfo() or {}).get('features', [])
     
-    ndvi_time_series = ndvi_collection.map(extract_ndvi)
-    result = ndvi_time_series.getInfo()
-    return result.get('features', []) if result else []
+    with stage('ee_getinfo_time_series'):
+        tiles = list(_tile_pool.map(tile_series, plan['tiles']))
+    
+    by_date: Dict[str, List] = {}
+    scenes: Dict[str, int] = {}
+    for features in tiles:
+        for feature in features:
+            properties = feature.get('properties', {})
+            by_date.setdefault(properties.get('date'), []).append(
+                ({'ndvi': properties.get('ndvi')}, {'ndvi': properties.get('ndvi_count')})
+            )
+            if 'scenes' in properties:
+                # Tiles share scenes, so the busiest tile is the best count
+                scenes[properties['date']] = max(scenes.get(properties['date'], 0), properties['scenes'])
+    features = []
+    for date, parts in sorted(by_date.items()):
+        ndvi = merge_weighted(parts).get('ndvi')
+        if ndvi is not None:  # Every tile masked (e.g. cloud) on this date
+            properties = {'date': date, 'ndvi': ndvi, 'scale': plan['scale']}
+            if date in scenes:
+                properties['scenes'] = scenes[date]
+            features.append({'type': 'Feature', 'geometry': None, 'properties': properties})
+    return features
 
 def calculate_degradation_indicators(polygon: List[List[float]], date: str) -> Dict:
     """Calculate multiple soil health indicators for a given date
     
+    Results are cached on the normalized polygon, the resolved 30-day window
+    and the cloud threshold.
+    
     Args:
         polygon: List of [lon, lat] coordinates
         date: Date in YYYY-MM-DD format
@@ -113,28 +194,433 @@ def calculate_degradation_indicators(polygon: List[List[float]], date: str) -> D
     Returns:
         Dictionary with NDVI, NDMI, and BSI values
     """
-    aoi = ee.Geometry.Polygon(polygon)  # type: ignore
-    date_obj = datetime.strptime(date, '%Y-%m-%d')
+    window_start, window_end = _indicator_window(date)
+    # Hand each caller its own copy; handlers add keys to the returned dict
+    return dict(ee_cache.get_or_compute(
+        _indicators_key(polygon, window_start, window_end),
+        lambda: _compute_degradation_indicators(polygon, window_start, window_end)
+    ))
+
+def _compute_degradation_indicators(polygon: List[List[float]], window_start: str, window_end: str) -> Dict:
+    with stage('polygon_parse'):
+        plan = _prepare_aoi(polygon)
+    return _reduce_indicators(plan, window_start, window_end)
+
+def _reduce_indicators(plan: Dict, window_start: str, window_end: str) -> Dict:
+    """Mean NDVI/NDMI/BSI over a prepared area, tiled when it is large"""
+    aoi = ee.Geometry.Polygon(plan['rings'])  # type: ignore
+    tiled = len(plan['tiles']) > 1
+    scenes = _sentinel_collection(aoi, window_start, window_end)
+    if tiled:
+        # One scene rarely covers a tiled area; mosaic with the clearest on top
+        image = scenes.sort('CLOUDY_PIXEL_PERCENTAGE', False).map(_index_image).mosaic()  # type: ignore
+        with stage('ee_getinfo_image'):
+            has_imagery = scenes.size().getInfo() > 0  # type: ignore
+    else:
+        image = scenes.sort('CLOUDY_PIXEL_PERCENTAGE').first()  # type: ignore
+        # Check if we have valid imagery
+        with stage('ee_getinfo_image'):
+            has_imagery = image.getInfo() is not None  # type: ignore
     
-    # Use the updated Sentinel-2 Harmonized collection
-    image = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')  # type: ignore
-             .filterBounds(aoi)  # type: ignore
-             .filterDate(date_obj - timedelta(days=30), date_obj)  # type: ignore
-             .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20))  # type: ignore
-             .sort('CLOUDY_PIXEL_PERCENTAGE')  # type: ignore
-             .first())  # type: ignore
-    
-    # Check if we have valid imagery
-    image_info = image.getInfo()  # type: ignore
-    if image_info is None:
+    if not has_imagery:
         print(f"WARNING: No satellite imagery available for this area and date range")
+        return dict(FALLBACK_INDICATORS, scale_m=plan['scale'])
+    
+    if tiled:
+        indicators = _parse_index_stats(_reduce_tiles(image, plan))
+        indicators['tiles'] = len(plan['tiles'])
+    else:
+        stats = _index_image(image).reduceRegion(  # type: ignore
+            reducer=ee.Reducer.mean(),  # type: ignore
+            geometry=aoi,
+            scale=plan['scale'],
+            maxPixels=MAX_PIXELS
+        )
+        with stage('ee_getinfo_stats'):
+            indicators = _parse_index_stats(stats.getInfo())  # type: ignore
+    indicators['scale_m'] = plan['scale']
+    return indicators
+
+def _reduce_tiles(image, plan: Dict) -> Dict:
+    """Reduce image over each tile in parallel and merge the band means by pixel count"""
+    reducer = ee.Reducer.mean().combine(ee.Reducer.count(), sharedInputs=True)  # type: ignore
+    
+    def reduce_tile(tile):
+        stats = image.reduceRegion(  # type: ignore
+            reducer=reducer,
+            geometry=ee.Geometry.Polygon(tile),  # type: ignore
+            scale=plan['scale'],
+            maxPixels=MAX_PIXELS
+        )
+        result = stats.getInfo() or {}
+        means = {key[:-len('_mean')]: value for key, value in result.items() if key.endswith('_mean')}
+        counts = {key[:-len('_count')]: value for key, value in result.items() if key.endswith('_count')}
+        return means, counts
+    
+    with stage('ee_getinfo_tiles'):
+        return merge_weighted(list(_tile_pool.map(reduce_tile, plan['tiles'])))
+
+def calculate_prediction_inputs(polygon: List[List[float]], start_date: str, end_date: str) -> Dict:
+    """Fetch NDVI history and current indicators in a single Earth Engine round trip
+    
+    Builds the time series, picks the least cloudy image from the 30 days
+    before end_date and reduces NDVI/NDMI/BSI over the polygon, all inside one
+    ee.Dictionary evaluated by a single getInfo. The individual time-series and
+    indicator cache entries are served when both are warm, and primed otherwise.
+    
+    Args:
+        polygon: List of [lon, lat] coordinates
+        start_date: Start of the history window in YYYY-MM-DD format
+        end_date: End of the history window in YYYY-MM-DD format
+    
+    Returns:
+        Dict with 'time_series' (list of features) and 'indicators' (NDVI, NDMI, BSI)
+    """
+    window_start, window_end = _indicator_window(end_date)
+    ts_key = _time_series_key(polygon, start_date, end_date)
+    indicators_key = _indicators_key(polygon, window_start, window_end)
+    
+    time_series = ee_cache.get(ts_key)
+    indicators = ee_cache.get(indicators_key)
+    if time_series is None or indicators is None:
+        fused_key = make_key('prediction_inputs', polygon_hash(polygon), start_date, end_date, CLOUD_THRESHOLD)
+        fused = ee_cache.get_or_compute(
+            fused_key,
+            lambda: _compute_prediction_inputs(polygon, start_date, end_date, window_start, window_end)
+        )
+        time_series, indicators = fused['time_series'], fused['indicators']
+        ee_cache.set(ts_key, time_series)
+        ee_cache.set(indicators_key, indicators)
+    
+    return {
+        'time_series': time_series,
+        'indicators': dict(indicators)
+    }
+
+def _compute_prediction_inputs(polygon: List[List[float]], start_date: str, end_date: str,
+                               window_start: str, window_end: str) -> Dict:
+    with stage('polygon_parse'):
+        plan = _prepare_aoi(polygon)
+    if len(plan['tiles']) > 1:
+        # Tiled areas need one request per tile anyway; no single plan to fuse
         return {
-            'ndvi': 0.5,
-            'ndmi': 0.3,
-            'bare_soil_index': 0.2
+            'time_series': _tiled_ndvi_time_series(plan, start_date, end_date),
+            'indicators': _reduce_indicators(plan, window_start, window_end)
         }
+    aoi = ee.Geometry.Polygon(plan['rings'])  # type: ignore
+    
+    # limit(1) + map instead of first() keeps the "no imagery" case a plain
+    # empty collection, so the whole plan evaluates without a null check hop
+    def reduce_indices(image):
+        stats = _index_image(image).reduceRegion(  # type: ignore
+            reducer=ee.Reducer.mean(),  # type: ignore
+            geometry=aoi,
+            scale=plan['scale'],
+            maxPixels=MAX_PIXELS
+        )
+        return ee.Feature(None, stats)  # type: ignore
+    
+    recent = (_sentinel_collection(aoi, window_start, window_end)
+              .sort('CLOUDY_PIXEL_PERCENTAGE')  # type: ignore
+              .limit(1)  # type: ignore
+              .map(reduce_indices))  # type: ignore
+    
+    fused = ee.Dictionary({  # type: ignore
+        'time_series': _ndvi_time_series_collection(aoi, start_date, end_date, plan['scale']),
+        'indicators': recent
+    })
+    with stage('ee_getinfo_prediction'):
+        result = fused.getInfo()  # type: ignore
+    
+    result = result or {}
+    time_series = (result.get('time_series') or {}).get('features', [])
+    recent_features = (result.get('indicators') or {}).get('features', [])
+    if not recent_features:
+        print(f"WARNING: No satellite imagery available for this area and date range")
+        indicators = dict(FALLBACK_INDICATORS)
+    else:
+        indicators = _parse_index_stats(recent_features[0].get('properties'))
+    indicators['scale_m'] = plan['scale']
+    
+    return {
+        'time_series': time_series,
+        'indicators': indicators
+    }
+
+def calculate_degradation_indicators_batch(polygons: Dict[str, List[List[float]]], date: str) -> Dict[str, Dict]:
+    """Calculate soil health indicators for many polygons with reduceRegions
     
-    # Calculate indices
+    Polygons are grouped by reduction scale into chunks of BATCH_CHUNK_SIZE
+    and each chunk is reduced as one FeatureCollection in a single request.
+    Chunks reduce a cloud-sorted mosaic rather than the single least cloudy
+    scene calculate_degradation_indicators uses, so their results are cached
+    under their own key; areas large enough to tile go through the single
+    polygon path and share its cache. Cached polygons are served without
+    touching Earth Engine.
+    
+    Args:
+        polygons: Mapping of name to list of [lon, lat] coordinates
+        date: Date in YYYY-MM-DD format
+    
+    Returns:
+        Mapping of name to indicator dict, or to {'error': message} on failure
+    """
+    window_start, window_end = _indicator_window(date)
+    results, tiled, chunks = _plan_batch(polygons, window_start, window_end)
+    
+    # Areas big enough to tile are reduced on their own
+    for name, (plan, key) in tiled.items():
+        try:
+            results[name] = _reduce_indicators(plan, window_start, window_end)
+            ee_cache.set(key, results[name])
+        except Exception as e:
+            results[name] = {'error': str(e)}
+    
+    for chunk in chunks:
+        try:
+            chunk_results = _compute_degradation_indicators_batch(
+                {name: plan for name, (plan, _) in chunk.items()},
+                window_start,
+                window_end
+            )
+        except Exception as e:
+            for name in chunk:
+                results[name] = {'error': str(e)}
+            continue
+        
+        for name, (_, key) in chunk.items():
+            indicators = chunk_results.get(name) or {'error': 'No result returned for polygon'}
+            if 'error' not in indicators:
+                ee_cache.set(key, indicators)
+            results[name] = indicators
+    
+    return results
+
+def _plan_batch(polygons: Dict[str, List[List[float]]], window_start: str, window_end: str,
+                peek: bool = False) -> tuple:
+    """Split a batch into finished results, tiled areas and reduceRegions chunks
+    
+    With peek, cached polygons are only checked for, not read, and left out
+    of results.
+    
+    Returns:
+        (results, tiled, chunks): results holds cached and invalid polygons;
+        tiled and each chunk map name to (plan, cache key). Chunks hold one
+        scale each, so every polygon is reduced at the scale its area calls for.
+    """
+    results: Dict[str, Dict] = {}
+    tiled: Dict[str, tuple] = {}
+    by_scale: Dict[float, Dict[str, tuple]] = {}
+    
+    for name, polygon in polygons.items():
+        try:
+            with stage('polygon_parse'):
+                plan = _prepare_aoi(polygon)
+        except (TypeError, ValueError, IndexError) as e:
+            results[name] = {'error': f'Invalid polygon: {str(e)}'}
+            continue
+        if len(plan['tiles']) > 1:
+            key = _indicators_key(polygon, window_start, window_end)
+        else:
+            key = _batch_indicators_key(polygon, window_start, window_end, plan['scale'])
+        if peek:
+            if ee_cache.contains(key):
+                continue
+        else:
+            cached = ee_cache.get(key)
+            if cached is not None:
+                results[name] = dict(cached)
+                continue
+        if len(plan['tiles']) > 1:
+            tiled[name] = (plan, key)
+        else:
+            by_scale.setdefault(plan['scale'], {})[name] = (plan, key)
+    
+    chunks = []
+    for entries in by_scale.values():
+        names = list(entries)
+        for i in range(0, len(names), BATCH_CHUNK_SIZE):
+            chunks.append({name: entries[name] for name in names[i:i + BATCH_CHUNK_SIZE]})
+    return results, tiled, chunks
+
+def request_count(query: str, polygon: List[List[float]], *args) -> int:
+    """Earth Engine requests a query will make, for admission control
+    
+    A cached result makes none. Otherwise every getInfo counts: one per tile
+    of a tiled area (one for an untiled area), plus the imagery check the
+    indicators make first; prediction inputs fetch both on tiled areas.
+    
+    Args:
+        query: 'calculate_ndvi_time_series', 'calculate_composite_time_series',
+            'calculate_degradation_indicators' or 'calculate_prediction_inputs'
+        polygon: List of [lon, lat] coordinates
+        *args: The query's remaining arguments
+    """
+    if query == 'calculate_degradation_indicators':
+        keys = [_indicators_key(polygon, *_indicator_window(args[0]))]
+    elif query == 'calculate_prediction_inputs':
+        keys = [_time_series_key(polygon, args[0], args[1]), _indicators_key(polygon, *_indicator_window(args[1]))]
+    elif query == 'calculate_composite_time_series' and args[2] != 'scene':
+        keys = [_time_series_key(polygon, args[0], args[1], (args[2], args[3]))]
+    else:
+        keys = [_time_series_key(polygon, args[0], args[1])]
+    if all(ee_cache.contains(key) for key in keys):
+        return 0
+    
+    try:
+        tiles = len(_prepare_aoi(polygon)['tiles'])
+    except (TypeError, ValueError, IndexError):
+        # Fails before reaching Earth Engine; the query reports the error
+        return 0
+    if query == 'calculate_degradation_indicators':
+        return tiles + 1
+    if query == 'calculate_prediction_inputs':
+        return 1 if tiles == 1 else 2 * tiles + 1
+    return tiles
+
+def batch_request_count(polygons: Dict[str, List[List[float]]], date: str) -> int:
+    """Earth Engine requests calculate_degradation_indicators_batch will make"""
+    _, tiled, chunks = _plan_batch(polygons, *_indicator_window(date), peek=True)
+    return len(chunks) + sum(len(plan['tiles']) + 1 for plan, _ in tiled.values())
+
+def _compute_degradation_indicators_batch(plans: Dict[str, Dict],
+                                          window_start: str, window_end: str) -> Dict[str, Dict]:
+    with stage('polygon_parse'):
+        regions = ee.FeatureCollection([  # type: ignore
+            ee.Feature(ee.Geometry.Polygon(plan['rings']), {'name': name})  # type: ignore
+            for name, plan in plans.items()
+        ])
+    # Callers chunk by scale, so every plan in the chunk shares one
+    scale = max(plan['scale'] for plan in plans.values())
+    
+    # Mosaic with the least cloudy scene on top, so each polygon sees the
+    # clearest available pixels. Index bands are computed per scene first;
+    # an empty window then yields a band-less image and no stats, rather
+    # than failing the whole chunk on a missing band.
+    mosaic = (_sentinel_collection(regions.geometry(), window_start, window_end)
+              .sort('CLOUDY_PIXEL_PERCENTAGE', False)  # type: ignore
+              .map(_index_image)  # type: ignore
+              .mosaic())  # type: ignore
+    
+    reduced = mosaic.reduceRegions(  # type: ignore
+        collection=regions,
+        reducer=ee.Reducer.mean(),  # type: ignore
+        scale=scale
+    )
+    # Drop geometries from the payload; only the stats are needed
+    with stage('ee_getinfo_batch'):
+        info = reduced.select(['name', 'nd', 'nd_1', 'constant'], None, False).getInfo()  # type: ignore
+    
+    results = {}
+    for feature in (info or {}).get('features', []):
+        properties = feature.get('properties', {})
+        name = properties.get('name')
+        if properties.get('nd') is None:
+            results[name] = {'error': 'No satellite imagery available for this polygon and date range'}
+        else:
+            results[name] = dict(_parse_index_stats(properties), scale_m=scale)
+    return results
+
+# Returned when no usable imagery covers the area
+FALLBACK_INDICATORS = {
+    'ndvi': 0.5,
+    'ndmi': 0.3,
+    'bare_soil_index': 0.2
+}
+
+def _prepare_aoi(polygon: List[List[float]]) -> Dict:
+    """prepare_aoi, memoized on the exact coordinates (polygon_hash rounds and drops holes)"""
+    return _aoi_plans.get_or_compute(make_key('aoi', polygon), lambda: prepare_aoi(polygon))
+
+def _time_series_key(polygon: List[List[float]], start_date: str, end_date: str,
+                     composite: Optional[Tuple[str, str]] = None) -> str:
+    if composite is None:
+        return make_key('ndvi_time_series', polygon_hash(polygon), start_date, end_date, CLOUD_THRESHOLD)
+    return make_key('ndvi_time_series', polygon_hash(polygon), start_date, end_date, CLOUD_THRESHOLD, *composite)
+
+def _indicators_key(polygon: List[List[float]], window_start: str, window_end: str) -> str:
+    return make_key('degradation_indicators', polygon_hash(polygon), window_start, window_end, CLOUD_THRESHOLD)
+
+def _batch_indicators_key(polygon: List[List[float]], window_start: str, window_end: str, scale: float) -> str:
+    return make_key('degradation_indicators_batch', polygon_hash(polygon), window_start, window_end, CLOUD_THRESHOLD, scale)
+
+def _indicator_window(date: str) -> tuple:
+    """Resolve the 30-day look-back window ending at date"""
+    date_obj = datetime.strptime(date, '%Y-%m-%d')
+    start = date_obj - timedelta(days=30)
+    return start.strftime('%Y-%m-%d'), date_obj.strftime('%Y-%m-%d')
+
+def _sentinel_collection(aoi, start_date: str, end_date: str):
+    """Sentinel-2 scenes over aoi in the date window, below the cloud threshold"""
+    with stage('ee_filter'):
+        # Use the updated Sentinel-2 Harmonized collection
+        return (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')  # type: ignore
+                .filterBounds(aoi)  # type: ignore
+                .filterDate(start_date, end_date)  # type: ignore
+                .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', CLOUD_THRESHOLD)))  # type: ignore
+
+def _ndvi_time_series_collection(aoi, start_date: str, end_date: str, scale: float, with_count: bool = False,
+                                 composite: Optional[Tuple[str, str]] = None):
+    """Server-side FeatureCollection of per-scene mean NDVI over aoi
+    
+    with_count adds each scene's pixel count as ndvi_count, for merging tiles.
+    composite (period, reducer) tags scenes with their period and reduces one
+    composite per distinct period instead, so periods without imagery cost
+    nothing.
+    """
+    def compute_ndvi(image):
+        ndvi = image.normalizedDifference(['B8', 'B4']).rename('NDVI')
+        return image.addBands(ndvi)
+    
+    ndvi_collection = _sentinel_collection(aoi, start_date, end_date).map(compute_ndvi)
+    reducer = ee.Reducer.mean()  # type: ignore
+    if with_count:
+        reducer = reducer.combine(ee.Reducer.count(), sharedInputs=True)  # type: ignore
+    
+    def extract_ndvi(image, date, extra=None):
+        stats = image.select('NDVI').reduceRegion(  # type: ignore
+            reducer=reducer,
+            geometry=aoi,
+            scale=scale,
+            maxPixels=MAX_PIXELS
+        )
+        properties = dict(extra or {}, date=date, scale=scale)
+        if with_count:
+            properties['ndvi'] = stats.get('NDVI_mean')  # type: ignore
+            properties['ndvi_count'] = stats.get('NDVI_count')  # type: ignore
+        else:
+            properties['ndvi'] = stats.get('NDVI')  # type: ignore
+        return ee.Feature(None, properties)  # type: ignore
+    
+    if composite is None or composite[0] == 'scene':
+        return ndvi_collection.map(lambda image: extract_ndvi(image, image.date().format('YYYY-MM-dd')))
+    
+    period, method = composite
+    keyed = ndvi_collection.map(lambda image: image.set('period', _period_key(image.date(), period, start_date)))
+    
+    def composite_period(key):
+        scenes = keyed.filter(ee.Filter.eq('period', key))  # type: ignore
+        if method == 'max_ndvi':
+            image = scenes.qualityMosaic('NDVI')
+        else:
+            image = scenes.select('NDVI').median()
+        return extract_ndvi(image, key, {'scenes': scenes.size()})
+    
+    periods = ee.List(keyed.aggregate_array('period')).distinct().sort()  # type: ignore
+    return ee.FeatureCollection(periods.map(composite_period))  # type: ignore
+
+def _period_key(date, period: str, start_date: str):
+    """Server-side composite_service.period_start: YYYY-MM-dd start of the period holding date"""
+    if period == 'day':
+        return date.format('YYYY-MM-dd')
+    if period == 'month':
+        return date.format('YYYY-MM-01')
+    origin = ee.Date(start_date)  # type: ignore
+    weeks = date.difference(origin, 'day').divide(7).floor()
+    return origin.advance(weeks.multiply(7), 'day').format('YYYY-MM-dd')
+
+def _index_image(image):
+    """Stack NDVI (nd), NDMI (nd_1) and BSI (constant) bands for one scene"""
     ndvi = image.normalizedDifference(['B8', 'B4'])
     ndmi = image.normalizedDifference(['B8', 'B11'])
     bsi = image.expression(
@@ -146,23 +632,14 @@ def calculate_degradation_indicators(polygon: List[List[float]], date: str) -> D
             'SWIR': image.select('B11')
         }
     )
-    
-    stats = ee.Image.cat([ndvi, ndmi, bsi]).reduceRegion(  # type: ignore
-        reducer=ee.Reducer.mean(),  # type: ignore
-        geometry=aoi,
-        scale=10,
-        maxPixels=int(1e9)
-    )
-    
-    result = stats.getInfo()  # type: ignore
+    return ee.Image.cat([ndvi, ndmi, bsi])  # type: ignore
+
+def _parse_index_stats(result: Dict) -> Dict:
+    """Map reduceRegion output band names onto indicator names"""
     if result:
         return {
             'ndvi': result.get('nd', 0.5),
             'ndmi': result.get('nd_1', 0.3),
             'bare_soil_index': result.get('constant', 0.2)
         }
-    return {
-        'ndvi': 0.5,
-        'ndmi': 0.3,
-        'bare_soil_index': 0.2
-    }
+    return dict(FALLBACK_INDICATORS)
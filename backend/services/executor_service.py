@@ -0,0 +1,187 @@
+import os
+import time
+import asyncio
+import threading
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Default limits per backend; override with <BACKEND>_MAX_CONCURRENCY / <BACKEND>_TIMEOUT_SECONDS
+BACKEND_DEFAULTS = {
+    'earth_engine': {'max_concurrency': 8, 'timeout': 120.0},
+    'database': {'max_concurrency': 16, 'timeout': 15.0},
+    'ai': {'max_concurrency': 4, 'timeout': 90.0}
+}
+
+_ENV_PREFIXES = {
+    'earth_engine': 'EE',
+    'database': 'DB',
+    'ai': 'AI'
+}
+
+# Multiplier on backend timeouts for the current context; background jobs
+# raise it because no client connection is waiting on them
+_timeout_factor: contextvars.ContextVar[float] = contextvars.ContextVar('timeout_factor', default=1.0)
+
+
+class BackendTimeoutError(Exception):
+    """Raised when a blocking backend call exceeds its timeout"""
+
+    def __init__(self, backend: str, timeout: float):
+        self.backend = backend
+        self.timeout = timeout
+        super().__init__(f"{backend} call timed out after {timeout:.0f}s")
+
+
+class BackendExecutor:
+    """Bounded thread pool that runs blocking client calls off the event loop"""
+
+    def __init__(self, name: str, max_concurrency: int, timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f'{name}-io')
+        self._in_flight = 0
+        self._completed = 0
+        self._timeouts = 0
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on this backend's pool and await the result
+
+        Args:
+            fn: Blocking callable
+            timeout: Seconds to wait before raising BackendTimeoutError
+                (defaults to the backend's configured timeout)
+
+        Returns:
+            Whatever fn returns
+        """
+        loop = asyncio.get_running_loop()
+        limit = (timeout if timeout is not None else self.timeout) * _timeout_factor.get()
+        self._in_flight += 1
+        try:
+            # Run inside a copy of the caller's context so per-request state
+            # (e.g. stage timings) follows the call onto the worker thread
+            context = contextvars.copy_context()
+            future = loop.run_in_executor(self._pool, functools.partial(context.run, fn, *args, **kwargs))
+            return await asyncio.wait_for(future, timeout=limit)
+        except asyncio.TimeoutError:
+            # The worker thread keeps running until the client call returns;
+            # the caller is released and the slot frees itself afterwards.
+            self._timeouts += 1
+            raise BackendTimeoutError(self.name, limit)
+        finally:
+            self._in_flight -= 1
+            self._completed += 1
+
+    def stats(self) -> Dict:
+        return {
+            'max_concurrency': self.max_concurrency,
+            'timeout': self.timeout,
+            'in_flight': self._in_flight,
+            'completed': self._completed,
+            'timeouts': self._timeouts
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class TokenBucket:
+    """Rate limiter: rate tokens per second, with up to capacity banked for bursts"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._waiters: Optional[asyncio.Lock] = None
+        self._granted = 0
+        self._waited_seconds = 0.0
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Take tokens if available
+
+        Returns:
+            0 if the tokens were taken, otherwise seconds until they will be
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                self._granted += 1
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def available(self) -> float:
+        """Tokens that could be taken now (negative while a drain is being paid off)"""
+        with self._lock:
+            return min(self.capacity, self._tokens + (time.monotonic() - self._updated) * self.rate)
+
+    def drain(self, seconds: float = 0.0) -> None:
+        """Empty the bucket and hold off grants for another seconds, e.g. after the upstream rate limits us"""
+        with self._lock:
+            self._tokens = -seconds * self.rate
+            self._updated = time.monotonic()
+
+    async def acquire(self, tokens: float = 1) -> None:
+        """Wait until tokens are available, first come first served"""
+        if self._waiters is None:
+            self._waiters = asyncio.Lock()
+        start = time.monotonic()
+        async with self._waiters:
+            while True:
+                wait = self.try_acquire(tokens)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+        self._waited_seconds += time.monotonic() - start
+
+    def stats(self) -> Dict:
+        tokens = self.available()
+        with self._lock:
+            return {
+                'rate': self.rate,
+                'capacity': self.capacity,
+                'tokens': round(tokens, 2),
+                'granted': self._granted,
+                'waited_seconds': round(self._waited_seconds, 3)
+            }
+
+
+@contextmanager
+def extended_timeouts(factor: float) -> Iterator[None]:
+    """Multiply backend timeouts by factor for calls made inside the block"""
+    token = _timeout_factor.set(factor)
+    try:
+        yield
+    finally:
+        _timeout_factor.reset(token)
+
+
+def _executor_from_env(name: str) -> BackendExecutor:
+    defaults = BACKEND_DEFAULTS[name]
+    prefix = _ENV_PREFIXES[name]
+    return BackendExecutor(
+        name=name,
+        max_concurrency=int(os.getenv(f'{prefix}_MAX_CONCURRENCY', defaults['max_concurrency'])),
+        timeout=float(os.getenv(f'{prefix}_TIMEOUT_SECONDS', defaults['timeout']))
+    )
+
+
+executors: Dict[str, BackendExecutor] = {name: _executor_from_env(name) for name in BACKEND_DEFAULTS}
+
+
+async def run_blocking(backend: str, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """Offload a blocking call to the named backend's bounded executor"""
+    return await executors[backend].run(fn, *args, timeout=timeout, **kwargs)
+
+
+def shutdown_executors() -> None:
+    for executor in executors.values():
+        executor.shutdown()
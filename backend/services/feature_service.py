@@ -0,0 +1,210 @@
+import numpy as np
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Windows (days before the latest observation) for the recent-mean features
+SHORT_WINDOW_DAYS = 30
+LONG_WINDOW_DAYS = 90
+
+# An NDVI fall larger than this between consecutive observations counts as a drop
+DROP_THRESHOLD = 0.1
+
+# Indicator keys read from the current-conditions dict, and their defaults
+CURRENT_INDICATORS = {
+    'current_ndvi': ('ndvi', 0.5),
+    'moisture': ('ndmi', 0.3),
+    'bare_soil': ('bare_soil_index', 0.2),
+    'erosion_risk': ('erosion_risk', 0.3)
+}
+
+
+def parse_time_series(features: Sequence[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """Parse an NDVI time series payload into sorted date and value arrays
+
+    Accepts Earth Engine features (values under 'properties') as well as
+    flat {'date', 'ndvi'} records. Observations without a value (e.g. fully
+    cloud-masked scenes) are dropped.
+
+    Returns:
+        (dates as datetime64[D], ndvi as float64), oldest first
+    """
+    dates: List = []
+    values: List[float] = []
+    for feature in features or ():
+        properties = feature.get('properties', feature) if isinstance(feature, dict) else {}
+        value = properties.get('ndvi')
+        when = properties.get('date', properties.get('system:time_start'))
+        if value is None or when is None:
+            continue
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            continue
+        if not np.isfinite(value):
+            continue
+        if isinstance(when, (int, float)):
+            # Epoch milliseconds, as Earth Engine reports system:time_start
+            when = np.datetime64(int(when), 'ms').astype('datetime64[D]')
+        dates.append(np.datetime64(str(when)[:10], 'D') if not isinstance(when, np.datetime64) else when)
+        values.append(value)
+
+    if not dates:
+        return np.array([], dtype='datetime64[D]'), np.array([], dtype=float)
+    dates_array = np.array(dates, dtype='datetime64[D]')
+    order = np.argsort(dates_array, kind='stable')
+    return dates_array[order], np.array(values, dtype=float)[order]
+
+
+def stack_series(series: Sequence[Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Left-align per-location series into NaN-padded 2-D arrays
+
+    Returns:
+        (days since epoch as float, ndvi), each shaped (locations, max observations)
+    """
+    width = max((len(values) for _, values in series), default=0)
+    days = np.full((len(series), width), np.nan)
+    values = np.full((len(series), width), np.nan)
+    for i, (series_dates, series_values) in enumerate(series):
+        count = len(series_values)
+        days[i, :count] = series_dates.astype('int64')
+        values[i, :count] = series_values
+    return days, values
+
+
+def time_series_features(days: np.ndarray, values: np.ndarray, as_of: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """Vectorized NDVI history features for many locations at once
+
+    Args:
+        days: (locations, observations) days since epoch, NaN-padded on the right
+        values: NDVI aligned with days, NaN-padded on the right
+        as_of: Reference day per location for days_since_last (default today)
+
+    Returns:
+        Dict of feature name -> (locations,) array. Features that need more
+        history than a location has are NaN, except trend, volatilities and
+        drop counts which are 0 for one or no observations.
+    """
+    days = np.atleast_2d(np.asarray(days, dtype=float))
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=1)
+    has_data = count > 0
+    rows = np.arange(values.shape[0])
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Latest observation (series are left-aligned, so it's at count - 1)
+        last_index = np.maximum(count - 1, 0)
+        last_value = np.where(has_data, values[rows, last_index] if values.size else np.nan, np.nan)
+        last_day = np.where(has_data, days[rows, last_index] if days.size else np.nan, np.nan)
+
+        mean = _masked_mean(values, valid)
+        volatility = np.sqrt(_masked_mean((values - mean[:, None]) ** 2, valid))
+
+        # Least-squares slope per observation (matches the original polyfit
+        # over the observation index) and per 30 days of calendar time
+        index = np.broadcast_to(np.arange(values.shape[1], dtype=float), values.shape)
+        trend = _masked_slope(index, values, valid)
+        trend_30d = _masked_slope(days, values, valid) * 30
+
+        # Recent means relative to the latest observation
+        age = last_day[:, None] - days
+        short_mean = _masked_mean(values, valid & (age <= SHORT_WINDOW_DAYS))
+        long_mean = _masked_mean(values, valid & (age <= LONG_WINDOW_DAYS))
+
+        # Seasonal anomaly: latest value vs the same calendar month in earlier years
+        day_values = np.where(valid, days, 0).astype('int64').astype('datetime64[D]')
+        months = day_values.astype('datetime64[M]').astype('int64')
+        years = day_values.astype('datetime64[Y]').astype('int64')
+        last_month = np.where(has_data, months[rows, last_index] if months.size else 0, -1)
+        last_year = np.where(has_data, years[rows, last_index] if years.size else 0, -1)
+        same_month = valid & (months % 12 == (last_month % 12)[:, None]) & (years < last_year[:, None])
+        seasonal_anomaly = last_value - _masked_mean(values, same_month)
+
+        # Falls between consecutive observations
+        steps = np.diff(values, axis=1)
+        drops = np.nan_to_num(steps, nan=0.0) < -DROP_THRESHOLD
+        drop_count = drops.sum(axis=1)
+        largest_drop = np.where(count > 1, -np.min(np.where(np.isnan(steps), np.inf, steps), axis=1, initial=np.inf), 0.0)
+
+        # Monthly shock of a random walk with the 30-day trend as drift: each
+        # change less its drift, scaled to 30 days by the square root of its gap
+        gaps = np.maximum(np.diff(days, axis=1), 1.0) / 30
+        residuals = (steps - trend_30d[:, None] * gaps) / np.sqrt(gaps)
+        monthly_volatility = np.sqrt(_masked_mean(residuals ** 2, ~np.isnan(residuals)))
+
+        if as_of is None:
+            as_of = np.full(values.shape[0], float(np.datetime64(date.today(), 'D').astype('int64')))
+        days_since_last = np.asarray(as_of, dtype=float) - last_day
+
+    return {
+        'last_ndvi': last_value,
+        'ndvi_mean': mean,
+        'ndvi_trend': np.where(count > 1, trend, 0.0),
+        'ndvi_trend_30d': np.where(count > 1, trend_30d, 0.0),
+        'ndvi_volatility': np.where(count > 0, volatility, 0.0),
+        'ndvi_monthly_volatility': np.where(count > 1, monthly_volatility, 0.0),
+        'ndvi_mean_30d': short_mean,
+        'ndvi_mean_90d': long_mean,
+        'ndvi_momentum': short_mean - long_mean,
+        'ndvi_seasonal_anomaly': seasonal_anomaly,
+        'ndvi_drop_count': drop_count.astype(float),
+        'ndvi_largest_drop': np.maximum(largest_drop, 0.0),
+        'observation_count': count.astype(float),
+        'days_since_last': days_since_last
+    }
+
+
+def extract_features_batch(histories: Sequence[Sequence[Dict]], currents: Sequence[Dict], as_of: Optional[date] = None) -> Dict[str, np.ndarray]:
+    """Prediction features for many locations, as columns
+
+    Args:
+        histories: NDVI time series payload per location
+        currents: Current indicator dict per location
+        as_of: Reference date for days_since_last (default today)
+
+    Returns:
+        Dict of feature name -> (locations,) array
+    """
+    days, values = stack_series([parse_time_series(history) for history in histories])
+    reference = np.datetime64(as_of or date.today(), 'D').astype('int64')
+    features = time_series_features(days, values, np.full(len(histories), float(reference)))
+
+    for name, (key, default) in CURRENT_INDICATORS.items():
+        features[name] = np.array([_number(current.get(key), default) for current in currents], dtype=float)
+
+    # Kept under its original name: models trained before this engine used
+    # the number of observations here
+    features['time_since_last'] = features['observation_count']
+    return features
+
+
+def feature_rows(features: Dict[str, np.ndarray]) -> List[Dict[str, float]]:
+    """Transpose feature columns into one dict per location"""
+    names = list(features)
+    columns = [features[name].tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def _masked_mean(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    count = mask.sum(axis=1)
+    total = np.where(mask, values, 0.0).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+
+def _masked_slope(x: np.ndarray, y: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    x_mean = _masked_mean(x, mask)
+    y_mean = _masked_mean(y, mask)
+    dx = np.where(mask, x - x_mean[:, None], 0.0)
+    dy = np.where(mask, y - y_mean[:, None], 0.0)
+    variance = (dx * dx).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(variance > 0, (dx * dy).sum(axis=1) / np.where(variance > 0, variance, 1.0), 0.0)
+
+
+def _number(value, default: float) -> float:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return default
+    return value if np.isfinite(value) else default
@@ -0,0 +1,127 @@
+import numpy as np
+import os
+from typing import Dict, Optional, Sequence, Tuple
+
+# Simulated trajectories per location; bands are stable to ~0.5 points at 10k
+FORECAST_PATHS = int(os.getenv('FORECAST_PATHS', '10000'))
+
+# Longest forecast horizon accepted, in months
+MAX_HORIZON = 60
+
+# Percentiles reported for each horizon
+PERCENTILES = (10, 50, 90)
+
+# Degradation score points per unit of vegetation signal (DegradationAnalyzer's
+# vegetation weight of 0.30, on a 0-100 scale)
+VEGETATION_WEIGHT = 30.0
+
+# Upper bound on locations x paths x months simulated at once, to cap memory
+MAX_CELLS_PER_CHUNK = 4_000_000
+
+
+def _parse_months(value: str) -> Tuple[int, ...]:
+    try:
+        horizons = sorted({int(h) for h in value.split(',') if h.strip()})
+    except ValueError:
+        horizons = []
+    if not horizons or horizons[0] < 1 or horizons[-1] > MAX_HORIZON:
+        raise ValueError(f"horizons must be comma separated months between 1 and {MAX_HORIZON}")
+    return tuple(horizons)
+
+
+def _horizons_from_env() -> Tuple[int, ...]:
+    value = os.getenv('FORECAST_HORIZONS', '1,2,3,4,5,6')
+    try:
+        return _parse_months(value)
+    except ValueError as e:
+        raise ValueError(f"FORECAST_HORIZONS={value!r}: {e}") from None
+
+
+# Forecast horizons in months (comma separated)
+FORECAST_HORIZONS = _horizons_from_env()
+
+
+def parse_horizons(value: Optional[str]) -> Tuple[int, ...]:
+    """Parse a comma separated list of forecast months, e.g. '1,3,6,12'
+
+    Raises:
+        ValueError: If a horizon isn't a whole number of months between 1 and MAX_HORIZON
+    """
+    if not value:
+        return FORECAST_HORIZONS
+    return _parse_months(value)
+
+
+def monte_carlo_forecast(
+    start_scores: np.ndarray,
+    risk_scores: np.ndarray,
+    ndvi: np.ndarray,
+    ndvi_trend: np.ndarray,
+    ndvi_monthly_volatility: np.ndarray,
+    horizons: Sequence[int] = FORECAST_HORIZONS,
+    paths: int = FORECAST_PATHS,
+    seed: Optional[int] = None
+) -> Dict[str, np.ndarray]:
+    """Simulate degradation score trajectories for many locations at once
+
+    NDVI follows a random walk with the fitted monthly trend as drift and a
+    normal monthly shock whose standard deviation is measured from the
+    history's own month-to-month changes (ndvi_monthly_volatility), so the
+    spread grows with the square root of the horizon. The standard deviation
+    of the NDVI level (ndvi_volatility) is not a shock size: it includes the
+    trend and the seasonal cycle, and compounding it every month would widen
+    the bands several-fold. Each path's score moves with the vegetation
+    component of the degradation score, on top of the linear pressure
+    implied by the risk score (the drift the linear forecast uses).
+
+    Args:
+        start_scores: Current degradation score per location
+        risk_scores: Risk score (0-100) per location
+        ndvi: Current NDVI per location
+        ndvi_trend: NDVI change per 30 days per location
+        ndvi_monthly_volatility: Standard deviation of detrended NDVI change
+            per 30 days per location
+        horizons: Months ahead to report
+        paths: Trajectories simulated per location
+        seed: Random seed, for reproducible bands
+
+    Returns:
+        Dict with 'p10', 'p50', 'p90' and 'p_degraded' (share of paths at or
+        above 50), each shaped (locations, len(horizons))
+    """
+    start_scores, risk_scores, ndvi, ndvi_trend, ndvi_monthly_volatility = (
+        np.nan_to_num(np.asarray(a, dtype=float))
+        for a in (start_scores, risk_scores, ndvi, ndvi_trend, ndvi_monthly_volatility)
+    )
+    horizons = np.asarray(horizons, dtype=int)
+    months = int(horizons.max())
+    count = len(start_scores)
+    rng = np.random.default_rng(seed)
+
+    results = {f'p{p}': np.empty((count, len(horizons))) for p in PERCENTILES}
+    results['p_degraded'] = np.empty((count, len(horizons)))
+
+    chunk = max(1, MAX_CELLS_PER_CHUNK // (paths * months))
+    for lo in range(0, count, chunk):
+        part = slice(lo, min(lo + chunk, count))
+
+        # (locations, paths, months) NDVI walk, float32 to halve memory traffic
+        shocks = rng.standard_normal((part.stop - part.start, paths, months), dtype=np.float32)
+        shocks *= ndvi_monthly_volatility[part, None, None].astype(np.float32)
+        shocks += ndvi_trend[part, None, None].astype(np.float32)
+        walk = np.cumsum(shocks, axis=2)[:, :, horizons - 1]
+        projected_ndvi = np.clip(ndvi[part, None, None] + walk, -1, 1)
+
+        # Vegetation signal as in DegradationAnalyzer: 0 at NDVI >= 0.6, 1 at 0
+        signal_now = np.maximum(0, (0.6 - ndvi[part]) / 0.6)
+        signal = np.maximum(0, (0.6 - projected_ndvi) / 0.6)
+        linear = start_scores[part, None] + (risk_scores[part] / 100 * 10)[:, None] * horizons
+        scores = linear[:, None, :] + VEGETATION_WEIGHT * (signal - signal_now[:, None, None])
+        np.clip(scores, 0, 100, out=scores)
+
+        bands = np.percentile(scores, PERCENTILES, axis=1)
+        for p, band in zip(PERCENTILES, bands):
+            results[f'p{p}'][part] = band
+        results['p_degraded'][part] = (scores >= 50).mean(axis=1)
+
+    return results
@@ -0,0 +1,242 @@
+import os
+import math
+import numpy as np
+from typing import Dict, List, Tuple
+
+# Target number of pixels per reduction; the scale is coarsened until the
+# area of interest fits, so large polygons cost about as much as small ones
+PIXEL_BUDGET = float(os.getenv('EE_PIXEL_BUDGET', 10_000_000))
+
+# Sentinel-2's native resolution is the finest useful scale; scales are
+# rounded up to a multiple of SCALE_STEP and capped at MAX_SCALE
+MIN_SCALE = 10
+SCALE_STEP = 10
+MAX_SCALE = float(os.getenv('EE_MAX_SCALE', 1000))
+
+# Areas above this are split into tiles of at most this size, reduced in
+# parallel and merged; MAX_TILES bounds the number of requests
+TILE_AREA_KM2 = float(os.getenv('EE_TILE_AREA_KM2', 2500))
+MAX_TILES = int(os.getenv('EE_MAX_TILES', 64))
+
+# Polygons with more vertices than this are rejected before simplification
+MAX_VERTICES = 50_000
+
+EARTH_RADIUS_M = 6_371_008.8
+
+
+class InvalidPolygonError(ValueError):
+    """Raised when a polygon can't be analyzed (too few points, out of range, self-intersecting)"""
+
+
+def prepare_aoi(polygon: List) -> Dict:
+    """Validate and simplify a polygon and plan how to reduce it
+
+    Args:
+        polygon: A ring of [lon, lat] points, or a list of rings (outer ring
+            first, then holes) as accepted by ee.Geometry.Polygon
+
+    Returns:
+        Dict with:
+            rings: The cleaned, simplified rings, closed
+            area_km2: Area of the polygon (holes excluded)
+            scale: Reduction scale in metres
+            tiles: List of ring lists, one per tile (a single entry when
+                the area isn't tiled)
+            vertices: (vertices in, vertices after simplification)
+
+    Raises:
+        InvalidPolygonError: If the polygon is malformed
+    """
+    rings = _clean_rings(polygon)
+    vertices_in = sum(len(ring) for ring in rings)
+
+    lon0, lat0 = float(rings[0][:, 0].mean()), float(rings[0][:, 1].mean())
+    projected = [_project(ring, lon0, lat0) for ring in rings]
+    area_m2 = abs(_shoelace(projected[0])) - sum(abs(_shoelace(ring)) for ring in projected[1:])
+    if area_m2 <= 0:
+        raise InvalidPolygonError("Polygon has no area")
+
+    scale = scale_for_area(area_m2)
+
+    # Detail finer than half a pixel can't change the reduction
+    keep = [_simplify(ring, scale / 2) for ring in projected]
+    rings = [ring[mask] for ring, mask in zip(rings, keep)]
+    if len(rings[0]) < 4:
+        raise InvalidPolygonError("Polygon collapses to a line")
+    if _self_intersects(projected[0][keep[0]]):
+        raise InvalidPolygonError("Polygon edges cross each other")
+
+    return {
+        'rings': [ring.tolist() for ring in rings],
+        'area_km2': area_m2 / 1e6,
+        'scale': scale,
+        'tiles': _tile(rings, area_m2),
+        'vertices': (vertices_in, sum(len(ring) for ring in rings))
+    }
+
+
+def scale_for_area(area_m2: float, budget: float = PIXEL_BUDGET) -> float:
+    """Finest scale (metres) at which area_m2 fits in budget pixels"""
+    scale = math.sqrt(area_m2 / budget)
+    scale = math.ceil(scale / SCALE_STEP) * SCALE_STEP
+    return float(min(MAX_SCALE, max(MIN_SCALE, scale)))
+
+
+def merge_weighted(parts: List[Tuple[Dict, Dict]]) -> Dict:
+    """Combine per-tile means into one mean per key, weighted by pixel count
+
+    Args:
+        parts: (means, counts) per tile, each keyed by band name
+
+    Returns:
+        Band name -> mean over all tiles; bands with no pixels are omitted
+    """
+    totals: Dict[str, float] = {}
+    weights: Dict[str, float] = {}
+    for means, counts in parts:
+        for key, value in (means or {}).items():
+            count = (counts or {}).get(key) or 0
+            if value is None or count <= 0:
+                continue
+            totals[key] = totals.get(key, 0.0) + value * count
+            weights[key] = weights.get(key, 0.0) + count
+    return {key: totals[key] / weights[key] for key in totals}
+
+
+def _clean_rings(polygon: List) -> List[np.ndarray]:
+    if not polygon:
+        raise InvalidPolygonError("Polygon is empty")
+    nested = isinstance(polygon[0], (list, tuple)) and polygon[0] and isinstance(polygon[0][0], (list, tuple))
+    rings = []
+    for ring in (polygon if nested else [polygon]):
+        try:
+            points = np.array([[float(p[0]), float(p[1])] for p in ring], dtype=float)
+        except (TypeError, ValueError, IndexError):
+            raise InvalidPolygonError("Polygon points must be [lon, lat] pairs")
+        if len(points) > MAX_VERTICES:
+            raise InvalidPolygonError(f"Polygon has more than {MAX_VERTICES} vertices")
+        if not np.isfinite(points).all() or (np.abs(points[:, 0]) > 180).any() or (np.abs(points[:, 1]) > 90).any():
+            raise InvalidPolygonError("Polygon coordinates must be longitude -180..180, latitude -90..90")
+
+        # Drop repeated consecutive points, then close the ring
+        if len(points):
+            points = points[np.r_[True, (np.diff(points, axis=0) != 0).any(axis=1)]]
+        if len(points) > 1 and (points[0] == points[-1]).all():
+            points = points[:-1]
+        if len(np.unique(points, axis=0)) < 3:
+            raise InvalidPolygonError("Polygon needs at least three distinct points")
+        rings.append(np.vstack([points, points[:1]]))
+    return rings
+
+
+def _project(ring: np.ndarray, lon0: float, lat0: float) -> np.ndarray:
+    """Local equirectangular projection to metres around (lon0, lat0)"""
+    x = np.radians(ring[:, 0] - lon0) * EARTH_RADIUS_M * math.cos(math.radians(lat0))
+    y = np.radians(ring[:, 1] - lat0) * EARTH_RADIUS_M
+    return np.column_stack([x, y])
+
+
+def _shoelace(ring: np.ndarray) -> float:
+    x, y = ring[:, 0], ring[:, 1]
+    return float(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1])) / 2
+
+
+def _simplify(ring: np.ndarray, tolerance: float) -> np.ndarray:
+    """Douglas-Peucker on a closed ring; returns a mask of the points kept"""
+    keep = np.zeros(len(ring), dtype=bool)
+    # Split at the point farthest from the first so the closed ring has two open halves
+    far = int(np.argmax(((ring - ring[0]) ** 2).sum(axis=1)))
+    keep[[0, far, len(ring) - 1]] = True
+    stack = [(0, far), (far, len(ring) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = ring[end] - ring[start]
+        length = math.hypot(*segment)
+        offsets = ring[start + 1:end] - ring[start]
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(offsets[:, 0] * segment[1] - offsets[:, 1] * segment[0]) / length
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+def _self_intersects(ring: np.ndarray) -> bool:
+    """Whether any two non-adjacent edges of a closed ring cross"""
+    a, b = ring[:-1], ring[1:]
+    n = len(a)
+    if n < 4:
+        return False
+
+    def orientation(p, q, r):
+        return np.sign((q[..., 0] - p[..., 0]) * (r[..., 1] - p[..., 1]) - (q[..., 1] - p[..., 1]) * (r[..., 0] - p[..., 0]))
+
+    # Row by row keeps memory linear in the number of edges
+    for i in range(n - 2):
+        j = np.arange(i + 2, n if i > 0 else n - 1)
+        if not len(j):
+            continue
+        o1 = orientation(a[i], b[i], a[j])
+        o2 = orientation(a[i], b[i], b[j])
+        o3 = orientation(a[j], b[j], a[i])
+        o4 = orientation(a[j], b[j], b[i])
+        if ((o1 * o2 < 0) & (o3 * o4 < 0)).any():
+            return True
+    return False
+
+
+def _tile(rings: List[np.ndarray], area_m2: float) -> List[List[List[List[float]]]]:
+    """Split the polygon on a lon/lat grid into tiles of about TILE_AREA_KM2"""
+    whole = [[ring.tolist() for ring in rings]]
+    target = min(MAX_TILES, math.ceil(area_m2 / 1e6 / TILE_AREA_KM2))
+    if target <= 1:
+        return whole
+
+    min_lon, min_lat = rings[0].min(axis=0)
+    max_lon, max_lat = rings[0].max(axis=0)
+    # Square-ish tiles on the ground: split the longer side more often
+    width = (max_lon - min_lon) * math.cos(math.radians((min_lat + max_lat) / 2))
+    height = max_lat - min_lat
+    # Never more than target tiles in all, however thin the polygon
+    columns = min(target, max(1, round(math.sqrt(target * width / max(height, 1e-12)))))
+    rows = max(1, target // columns)
+
+    tiles = []
+    lon_edges = np.linspace(min_lon, max_lon, columns + 1)
+    lat_edges = np.linspace(min_lat, max_lat, rows + 1)
+    for x0, x1 in zip(lon_edges[:-1], lon_edges[1:]):
+        for y0, y1 in zip(lat_edges[:-1], lat_edges[1:]):
+            clipped = [_clip_ring(ring, x0, y0, x1, y1) for ring in rings]
+            if clipped[0] is None:
+                continue
+            tiles.append([ring.tolist() for ring in clipped if ring is not None])
+    return tiles or whole
+
+
+def _clip_ring(ring: np.ndarray, x0: float, y0: float, x1: float, y1: float):
+    """Sutherland-Hodgman clip of a closed ring to a rectangle; None if nothing is left"""
+    points = ring[:-1]
+    for axis, bound, inside_above in ((0, x0, True), (0, x1, False), (1, y0, True), (1, y1, False)):
+        if not len(points):
+            return None
+        inside = points[:, axis] >= bound if inside_above else points[:, axis] <= bound
+        previous = np.roll(points, 1, axis=0)
+        previous_inside = np.roll(inside, 1)
+        output = []
+        for point, prev, is_in, prev_in in zip(points, previous, inside, previous_inside):
+            if is_in != prev_in:
+                t = (bound - prev[axis]) / (point[axis] - prev[axis])
+                output.append(prev + t * (point - prev))
+            if is_in:
+                output.append(point)
+        points = np.array(output).reshape(-1, 2)
+    if len(points) < 3 or abs(_shoelace(np.vstack([points, points[:1]]))) == 0:
+        return None
+    return np.vstack([points, points[:1]])
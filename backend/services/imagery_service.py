@@ -0,0 +1,459 @@
+import os
+import abc
+import json
+import threading
+import numpy as np
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from services.admission_service import run_earth_engine
+from services.composite_service import composite_features
+from services.executor_service import executors, run_blocking
+from services.metrics_service import stage
+
+# Returned when no usable imagery covers the area (matches the Earth Engine path)
+FALLBACK_INDICATORS = {
+    'ndvi': 0.5,
+    'ndmi': 0.3,
+    'bare_soil_index': 0.2
+}
+
+
+class ImageryBackend(abc.ABC):
+    """Interface for computing vegetation indices over a polygon
+
+    Subclasses implement the two primitive queries; the fused prediction and
+    batch queries fall back to composing them. Blocking work runs on the
+    'earth_engine' executor whichever backend is active.
+    """
+
+    name = 'base'
+
+    # Whether queries go through Earth Engine admission control
+    rate_limited = True
+
+    def __init__(self):
+        # Result of the first initialize(); None until it has run
+        self._initialized: Optional[bool] = None
+        self._init_lock = threading.Lock()
+
+    def initialize(self) -> bool:
+        return True
+
+    def ensure_initialized(self) -> bool:
+        """Run initialize() once; concurrent callers wait for the first call"""
+        if self._initialized is None:
+            with self._init_lock:
+                if self._initialized is None:
+                    self._initialized = self.initialize()
+        return self._initialized
+
+    @abc.abstractmethod
+    def calculate_ndvi_time_series(self, polygon: List[List[float]], start_date: str, end_date: str) -> List[Dict]:
+        ...
+
+    @abc.abstractmethod
+    def calculate_degradation_indicators(self, polygon: List[List[float]], date: str) -> Dict:
+        ...
+
+    def calculate_composite_time_series(self, polygon: List[List[float]], start_date: str, end_date: str,
+                                        period: str, reducer: str) -> List[Dict]:
+        return composite_features(self.calculate_ndvi_time_series(polygon, start_date, end_date), period, reducer, start_date)
+
+    def calculate_prediction_inputs(self, polygon: List[List[float]], start_date: str, end_date: str) -> Dict:
+        return {
+            'time_series': self.calculate_ndvi_time_series(polygon, start_date, end_date),
+            'indicators': self.calculate_degradation_indicators(polygon, end_date)
+        }
+
+    def calculate_degradation_indicators_batch(self, polygons: Dict[str, List[List[float]]], date: str) -> Dict[str, Dict]:
+        results = {}
+        for name, polygon in polygons.items():
+            try:
+                results[name] = self.calculate_degradation_indicators(polygon, date)
+            except Exception as e:
+                results[name] = {'error': str(e)}
+        return results
+
+    def requests(self, query: str, polygon: List[List[float]], *args) -> int:
+        """Backend requests a query makes, for admission control
+
+        Args:
+            query: Name of the query method, e.g. 'calculate_degradation_indicators'
+            polygon, *args: The query's arguments
+        """
+        # The fused query falls back to two primitive ones
+        return 2 if query == 'calculate_prediction_inputs' else 1
+
+    def batch_requests(self, polygons: Dict[str, List[List[float]]], date: str) -> int:
+        """Backend requests a batch makes, for admission control"""
+        return sum(self.requests('calculate_degradation_indicators', polygon, date) for polygon in polygons.values())
+
+    def batch_timeout(self, requests: int) -> float:
+        """Timeout for a batch that makes the given number of backend requests"""
+        return executors['earth_engine'].timeout
+
+    async def ensure_initialized_async(self) -> bool:
+        return await self._run(self.ensure_initialized)
+
+    async def _run(self, fn, *args, cost: float = 1, timeout: Optional[float] = None):
+        # Queries to a rate-limited backend go through admission control:
+        # queued by priority class and shed with AdmissionRejected when full
+        if self.rate_limited:
+            return await run_earth_engine(fn, *args, cost=cost, timeout=timeout)
+        return await run_blocking('earth_engine', fn, *args, timeout=timeout)
+
+    async def _count_requests(self, count, *args) -> int:
+        return count(*args)
+
+    async def _query(self, query: str, *args):
+        cost = await self._count_requests(self.requests, query, *args)
+        return await self._run(getattr(self, query), *args, cost=cost)
+
+    async def calculate_ndvi_time_series_async(self, polygon: List[List[float]], start_date: str, end_date: str) -> List[Dict]:
+        return await self._query('calculate_ndvi_time_series', polygon, start_date, end_date)
+
+    async def calculate_composite_time_series_async(self, polygon: List[List[float]], start_date: str, end_date: str,
+                                                    period: str, reducer: str) -> List[Dict]:
+        return await self._query('calculate_composite_time_series', polygon, start_date, end_date, period, reducer)
+
+    async def calculate_degradation_indicators_async(self, polygon: List[List[float]], date: str) -> Dict:
+        return await self._query('calculate_degradation_indicators', polygon, date)
+
+    async def calculate_prediction_inputs_async(self, polygon: List[List[float]], start_date: str, end_date: str) -> Dict:
+        return await self._query('calculate_prediction_inputs', polygon, start_date, end_date)
+
+    async def calculate_degradation_indicators_batch_async(self, polygons: Dict[str, List[List[float]]], date: str) -> Dict[str, Dict]:
+        requests = await self._count_requests(self.batch_requests, polygons, date)
+        return await self._run(
+            self.calculate_degradation_indicators_batch,
+            polygons,
+            date,
+            cost=requests,
+            timeout=self.batch_timeout(requests)
+        )
+
+
+class EarthEngineBackend(ImageryBackend):
+    """Sentinel-2 indices computed by Google Earth Engine"""
+
+    name = 'earthengine'
+
+    @property
+    def _ee(self):
+        # Deferred: the ee package is slow to import, so it's loaded and
+        # initialized by the startup warm-up or the first query, whichever
+        # comes first, rather than when the backend is created
+        self.ensure_initialized()
+        from services import earth_engine_service
+        return earth_engine_service
+
+    def initialize(self) -> bool:
+        from services import earth_engine_service
+        return earth_engine_service.initialize_earth_engine()
+
+    def calculate_ndvi_time_series(self, polygon: List[List[float]], start_date: str, end_date: str) -> List[Dict]:
+        return self._ee.calculate_ndvi_time_series(polygon, start_date, end_date)
+
+    def calculate_composite_time_series(self, polygon: List[List[float]], start_date: str, end_date: str,
+                                        period: str, reducer: str) -> List[Dict]:
+        # Composited server-side before reduction, one reduceRegion per period
+        return self._ee.calculate_composite_time_series(polygon, start_date, end_date, period, reducer)
+
+    def calculate_degradation_indicators(self, polygon: List[List[float]], date: str) -> Dict:
+        return self._ee.calculate_degradation_indicators(polygon, date)
+
+    def calculate_prediction_inputs(self, polygon: List[List[float]], start_date: str, end_date: str) -> Dict:
+        return self._ee.calculate_prediction_inputs(polygon, start_date, end_date)
+
+    def calculate_degradation_indicators_batch(self, polygons: Dict[str, List[List[float]]], date: str) -> Dict[str, Dict]:
+        return self._ee.calculate_degradation_indicators_batch(polygons, date)
+
+    async def _count_requests(self, count, *args) -> int:
+        # Counting plans the tiles and checks the result cache, which may read
+        # disk, so it runs off the event loop, after the (admitted) initialization
+        # that loads earth_engine_service
+        if self._initialized is None:
+            await self.ensure_initialized_async()
+        return await run_blocking('earth_engine', count, *args)
+
+    def requests(self, query: str, polygon: List[List[float]], *args) -> int:
+        return self._ee.request_count(query, polygon, *args)
+
+    def batch_requests(self, polygons: Dict[str, List[List[float]]], date: str) -> int:
+        return self._ee.batch_request_count(polygons, date)
+
+    def batch_timeout(self, requests: int) -> float:
+        # Requests run back to back, so allow one backend timeout for each
+        return executors['earth_engine'].timeout * max(1, requests)
+
+
+class LocalRasterBackend(ImageryBackend):
+    """Sentinel-2 indices computed with NumPy from a local archive of band stacks
+
+    Each scene is a band stack plus a JSON sidecar with the same stem:
+
+        <root>/<scene_id>.npy   array of shape (bands, rows, cols)
+        <root>/<scene_id>.tif   GeoTIFF alternative (requires rasterio)
+        <root>/<scene_id>.json  {"date": "YYYY-MM-DD",
+                                 "bands": ["B2", "B4", "B8", "B11"],
+                                 "transform": [x0, dx, 0, y0, 0, dy],
+                                 "cloudy_pixel_percentage": 3.2,
+                                 "nodata": 0}
+
+    transform is a GDAL-style affine in EPSG:4326 (x = x0 + col * dx,
+    y = y0 + row * dy); GeoTIFFs may omit it and the band names if they carry
+    their own. .npy stacks are memory-mapped so only the polygon's window is
+    read from disk.
+    """
+
+    name = 'local'
+    # Reads local files, so the Earth Engine quota doesn't apply
+    rate_limited = False
+    REQUIRED_BANDS = ('B2', 'B4', 'B8', 'B11')
+
+    def __init__(self, root: str, cloud_threshold: float = 20):
+        super().__init__()
+        self.root = root
+        self.cloud_threshold = cloud_threshold
+        self._scenes: List[Dict] = []
+        self._root_mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def initialize(self) -> bool:
+        if not os.path.isdir(self.root):
+            print(f"✗ Local imagery directory not found: {self.root}")
+            return False
+        print(f"✓ Local imagery backend indexed {len(self._scene_index())} scenes from {self.root}")
+        return True
+
+    def calculate_ndvi_time_series(self, polygon: List[List[float]], start_date: str, end_date: str) -> List[Dict]:
+        ring = _outer_ring(polygon)
+        features = []
+        for scene in self._find_scenes(ring, start_date, end_date):
+            stats = self._reduce(scene, ring, ('ndvi',))
+            if not stats or stats.get('ndvi') is None:
+                # Every pixel nodata or non-finite: no observation, as on the tiled Earth Engine path
+                continue
+            features.append({
+                'type': 'Feature',
+                'geometry': None,
+                'id': scene['id'],
+                'properties': {
+                    'date': scene['date'],
+                    'ndvi': stats['ndvi']
+                }
+            })
+        return features
+
+    def calculate_degradation_indicators(self, polygon: List[List[float]], date: str) -> Dict:
+        ring = _outer_ring(polygon)
+        date_obj = datetime.strptime(date, '%Y-%m-%d')
+        window_start = (date_obj - timedelta(days=30)).strftime('%Y-%m-%d')
+
+        scenes = sorted(
+            self._find_scenes(ring, window_start, date),
+            key=lambda scene: scene['cloudy_pixel_percentage']
+        )
+        if not scenes:
+            print(f"WARNING: No local imagery available for this area and date range")
+            return dict(FALLBACK_INDICATORS)
+
+        stats = self._reduce(scenes[0], ring, ('ndvi', 'ndmi', 'bare_soil_index'))
+        # An index is None when every pixel under the polygon is nodata or non-finite
+        return {
+            key: stats[key] if stats and stats.get(key) is not None else default
+            for key, default in FALLBACK_INDICATORS.items()
+        }
+
+    def _scene_index(self) -> List[Dict]:
+        """Scene metadata, rescanned whenever the archive directory changes"""
+        mtime = os.stat(self.root).st_mtime
+        with self._lock:
+            if mtime != self._root_mtime:
+                self._scenes = self._scan()
+                self._root_mtime = mtime
+            return self._scenes
+
+    def _scan(self) -> List[Dict]:
+        scenes = []
+        for entry in sorted(os.scandir(self.root), key=lambda e: e.name):
+            if not entry.name.endswith('.json'):
+                continue
+            stem = entry.path[:-len('.json')]
+            data_path = next((stem + ext for ext in ('.npy', '.tif', '.tiff') if os.path.exists(stem + ext)), None)
+            if data_path is None:
+                continue
+            try:
+                with open(entry.path, 'r') as f:
+                    meta = json.load(f)
+                scenes.append(self._load_scene(os.path.basename(stem), data_path, meta))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"WARNING: Skipping local scene {entry.name}: {e}")
+        scenes.sort(key=lambda scene: scene['date'])
+        return scenes
+
+    def _load_scene(self, scene_id: str, data_path: str, meta: Dict) -> Dict:
+        if data_path.endswith('.npy'):
+            data = np.load(data_path, mmap_mode='r')
+            transform = meta['transform']
+            bands = meta['bands']
+        else:
+            try:
+                import rasterio  # type: ignore
+            except ImportError:
+                raise ValueError("rasterio is required to read GeoTIFF scenes")
+            with rasterio.open(data_path) as dataset:
+                t = dataset.transform
+                transform = meta.get('transform') or [t.c, t.a, t.b, t.f, t.d, t.e]
+                bands = meta.get('bands') or list(dataset.descriptions)
+                shape = (dataset.count, dataset.height, dataset.width)
+            data = None
+
+        x0, dx, _, y0, _, dy = [float(v) for v in transform]
+        rows, cols = (data.shape[1], data.shape[2]) if data is not None else shape[1:]
+        xs = (x0, x0 + cols * dx)
+        ys = (y0, y0 + rows * dy)
+
+        missing = [band for band in self.REQUIRED_BANDS if band not in bands]
+        if missing:
+            raise KeyError(f"missing bands {missing}")
+
+        return {
+            'id': scene_id,
+            'path': data_path,
+            'data': data,
+            'date': meta['date'],
+            'bands': {band: i for i, band in enumerate(bands)},
+            'transform': (x0, dx, y0, dy),
+            'shape': (rows, cols),
+            'bounds': (min(xs), min(ys), max(xs), max(ys)),
+            'cloudy_pixel_percentage': float(meta.get('cloudy_pixel_percentage', 0)),
+            'nodata': meta.get('nodata')
+        }
+
+    def _find_scenes(self, ring: np.ndarray, start_date: str, end_date: str) -> List[Dict]:
+        """Scenes in [start_date, end_date) under the cloud threshold that overlap the ring"""
+        min_x, min_y = ring.min(axis=0)
+        max_x, max_y = ring.max(axis=0)
+        return [
+            scene for scene in self._scene_index()
+            if start_date <= scene['date'] < end_date
+            and scene['cloudy_pixel_percentage'] < self.cloud_threshold
+            and scene['bounds'][0] <= max_x and scene['bounds'][2] >= min_x
+            and scene['bounds'][1] <= max_y and scene['bounds'][3] >= min_y
+        ]
+
+    def _reduce(self, scene: Dict, ring: np.ndarray, indices: tuple) -> Optional[Dict]:
+        """Mean of each requested index over the pixels whose centers fall in the ring"""
+        with stage('local_reduce'):
+            return self._reduce_window(scene, ring, indices)
+
+    def _reduce_window(self, scene: Dict, ring: np.ndarray, indices: tuple) -> Optional[Dict]:
+        window = _pixel_window(scene, ring)
+        if window is None:
+            return None
+        r0, r1, c0, c1 = window
+
+        mask = _rasterize(ring, scene['transform'], window)
+        if not mask.any():
+            return None
+
+        needed = {'B4', 'B8'}
+        if 'ndmi' in indices or 'bare_soil_index' in indices:
+            needed |= {'B11'}
+        if 'bare_soil_index' in indices:
+            needed |= {'B2'}
+        bands = self._read_bands(scene, sorted(needed), window)
+
+        valid = mask.copy()
+        if scene['nodata'] is not None:
+            for values in bands.values():
+                valid &= values != scene['nodata']
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            red, nir = bands['B4'], bands['B8']
+            computed = {'ndvi': (nir - red) / (nir + red)}
+            if 'ndmi' in indices:
+                swir = bands['B11']
+                computed['ndmi'] = (nir - swir) / (nir + swir)
+            if 'bare_soil_index' in indices:
+                swir, blue = bands['B11'], bands['B2']
+                computed['bare_soil_index'] = ((red + swir) - (nir + blue)) / ((red + swir) + (nir + blue))
+
+        stats = {}
+        for name in indices:
+            values = computed[name][valid]
+            values = values[np.isfinite(values)]
+            stats[name] = float(values.mean()) if values.size else None
+        return stats
+
+    def _read_bands(self, scene: Dict, names: List[str], window: tuple) -> Dict[str, np.ndarray]:
+        r0, r1, c0, c1 = window
+        if scene['data'] is not None:
+            return {
+                name: np.asarray(scene['data'][scene['bands'][name], r0:r1, c0:c1], dtype=np.float64)
+                for name in names
+            }
+
+        import rasterio  # type: ignore
+        from rasterio.windows import Window  # type: ignore
+        with rasterio.open(scene['path']) as dataset:
+            return {
+                name: dataset.read(scene['bands'][name] + 1, window=Window(c0, r0, c1 - c0, r1 - r0)).astype(np.float64)
+                for name in names
+            }
+
+
+def _outer_ring(polygon: List) -> np.ndarray:
+    ring = polygon[0] if polygon and isinstance(polygon[0][0], (list, tuple)) else polygon
+    return np.asarray(ring, dtype=np.float64)[:, :2]
+
+
+def _pixel_window(scene: Dict, ring: np.ndarray) -> Optional[tuple]:
+    """Row/column window of the scene covering the ring's bounding box"""
+    x0, dx, y0, dy = scene['transform']
+    rows, cols = scene['shape']
+    col_edges = sorted(((ring[:, 0].min() - x0) / dx, (ring[:, 0].max() - x0) / dx))
+    row_edges = sorted(((ring[:, 1].min() - y0) / dy, (ring[:, 1].max() - y0) / dy))
+    c0 = max(0, int(np.floor(col_edges[0])))
+    c1 = min(cols, int(np.ceil(col_edges[1])) + 1)
+    r0 = max(0, int(np.floor(row_edges[0])))
+    r1 = min(rows, int(np.ceil(row_edges[1])) + 1)
+    if c0 >= c1 or r0 >= r1:
+        return None
+    return r0, r1, c0, c1
+
+
+def _rasterize(ring: np.ndarray, transform: tuple, window: tuple) -> np.ndarray:
+    """Even-odd point-in-polygon test for every pixel center in the window"""
+    x0, dx, y0, dy = transform
+    r0, r1, c0, c1 = window
+    xs = x0 + (np.arange(c0, c1) + 0.5) * dx
+    ys = y0 + (np.arange(r0, r1) + 0.5) * dy
+    px, py = np.meshgrid(xs, ys)
+
+    inside = np.zeros(px.shape, dtype=bool)
+    ax, ay = ring[:, 0], ring[:, 1]
+    bx, by = np.roll(ax, -1), np.roll(ay, -1)
+    # Loop over edges (few), vectorized over pixels (many)
+    for x1, y1, x2, y2 in zip(ax, ay, bx, by):
+        if y1 == y2:
+            continue
+        crosses = (y1 > py) != (y2 > py)
+        x_cross = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= crosses & (px < x_cross)
+    return inside
+
+
+def create_imagery_backend(name: Optional[str] = None) -> ImageryBackend:
+    """Build the imagery backend selected by IMAGERY_BACKEND (earthengine or local)"""
+    name = (name or os.getenv('IMAGERY_BACKEND', 'earthengine')).lower()
+    if name == 'local':
+        return LocalRasterBackend(
+            root=os.getenv('LOCAL_IMAGERY_DIR', 'imagery'),
+            cloud_threshold=float(os.getenv('LOCAL_IMAGERY_CLOUD_THRESHOLD', 20))
+        )
+    if name in ('earthengine', 'ee'):
+        return EarthEngineBackend()
+    raise ValueError(f"Unknown IMAGERY_BACKEND: {name}")
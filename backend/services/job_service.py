@@ -0,0 +1,400 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+import threading
+from contextlib import suppress
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from services.cache_service import make_key
+from services.executor_service import extended_timeouts, run_blocking
+from services.metrics_service import begin_request, end_request, log_event
+
+# Job states; the last three are terminal
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = 'queued', 'running', 'completed', 'failed', 'cancelled'
+TERMINAL = (COMPLETED, FAILED, CANCELLED)
+
+# Seconds between sweeps for expired jobs
+SWEEP_INTERVAL_SECONDS = 60.0
+
+
+class JobQueueFullError(Exception):
+    """Raised when max_queued jobs are already waiting for a worker"""
+
+
+class JobFailure(Exception):
+    """A handler failure with the HTTP status the synchronous endpoint would have returned"""
+
+    def __init__(self, status_code: int, detail: Any):
+        self.status_code = status_code
+        self.detail = detail
+        super().__init__(str(detail))
+
+
+class _ProgressStages(list):
+    """Stage timing list that reports each completed stage as job progress
+
+    Stages are appended from executor threads as well as the event loop, so
+    progress is handed back to the loop thread-safely.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, on_stage: Callable[[str, float], None]):
+        super().__init__()
+        self._loop = loop
+        self._on_stage = on_stage
+
+    def append(self, item) -> None:
+        super().append(item)
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._on_stage(*item)
+        else:
+            self._loop.call_soon_threadsafe(self._on_stage, *item)
+
+
+class JobManager:
+    """Runs long requests as background jobs on a bounded worker pool
+
+    submit() returns at once with a job id; workers run handlers registered
+    per job type, and clients poll get() or follow events(). Jobs and their
+    results are kept in SQLite until they expire, so results outlive the
+    request and the process, and jobs interrupted by a restart are run again.
+    Submitting a request identical to a live or completed job (same type,
+    parameters and day) returns that job instead of starting new work.
+
+    Handlers run with backend timeouts multiplied by timeout_factor, since
+    no load balancer sits between a job and its backend calls.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        workers: int = 4,
+        max_queued: int = 1000,
+        ttl: float = 86400,
+        timeout_factor: float = 5.0
+    ):
+        self.path = path
+        self.workers = workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.timeout_factor = timeout_factor
+
+        self._handlers: Dict[str, Callable[[Dict], Awaitable[Any]]] = {}
+        self._active: Dict[str, Dict] = {}
+        self._by_key: Dict[str, str] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._stats = {'submitted': 0, 'deduplicated': 0, 'completed': 0, 'failed': 0, 'cancelled': 0, 'resumed': 0}
+
+    def register(self, job_type: str, handler: Callable[[Dict], Awaitable[Any]]) -> None:
+        """Run jobs of job_type with handler(params), which returns the result"""
+        self._handlers[job_type] = handler
+
+    async def start(self) -> None:
+        """Start the workers and re-queue jobs a previous process left unfinished"""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        for job in await run_blocking('database', self._load_unfinished):
+            if job['type'] not in self._handlers:
+                continue
+            job.update(status=QUEUED, started_at=None)
+            self._track(job)
+            self._queue.put_nowait(job['id'])
+            self._stats['resumed'] += 1
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweep()))
+
+    async def stop(self) -> None:
+        """Stop the workers; unfinished jobs stay queued in the store for the next start"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+
+    async def submit(self, job_type: str, params: Dict) -> Dict:
+        """Queue a job, or return the live or completed job for the same request
+
+        Returns:
+            The job (see get) plus 'deduplicated'
+
+        Raises:
+            KeyError: If no handler is registered for job_type
+            JobQueueFullError: If max_queued jobs are already waiting
+        """
+        if job_type not in self._handlers:
+            raise KeyError(job_type)
+        key = make_key('job', job_type, params, datetime.now().strftime('%Y-%m-%d'))
+
+        completed = None
+        if key not in self._by_key:
+            completed = await run_blocking('database', self._find_completed, key)
+        # Checked again after the lookup: an identical submit may have queued meanwhile
+        existing = self._active.get(self._by_key.get(key, '')) or completed
+        if existing is not None:
+            self._stats['deduplicated'] += 1
+            return dict(self._public(existing), deduplicated=True)
+
+        if self._queue.qsize() >= self.max_queued:
+            raise JobQueueFullError(f"{self._queue.qsize()} jobs already queued")
+
+        now = time.time()
+        job = {
+            'id': uuid.uuid4().hex,
+            'key': key,
+            'type': job_type,
+            'params': params,
+            'status': QUEUED,
+            'progress': {'stages_completed': 0, 'last_stage': None},
+            'created_at': now,
+            'started_at': None,
+            'finished_at': None,
+            'expires_at': now + self.ttl,
+            'result': None,
+            'error': None
+        }
+        self._track(job)
+        await run_blocking('database', self._save, _snapshot(job))
+        self._queue.put_nowait(job['id'])
+        self._stats['submitted'] += 1
+        log_event('job_submitted', job_id=job['id'], job_type=job_type)
+        return dict(self._public(job), deduplicated=False)
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        """The job's status, progress and, once finished, result or error; None if unknown or expired"""
+        job = self._active.get(job_id)
+        if job is None:
+            job = await run_blocking('database', self._load, job_id)
+        return self._public(job) if job is not None else None
+
+    async def cancel(self, job_id: str) -> Optional[Dict]:
+        """Cancel a queued or running job; finished jobs are returned unchanged"""
+        job = self._active.get(job_id)
+        if job is None:
+            return await self.get(job_id)
+        task = self._running.get(job_id)
+        if task is not None:
+            # The worker records the cancellation when the task unwinds
+            task.cancel()
+            await asyncio.wait([task])
+        if job['status'] not in TERMINAL:
+            # Queued, or cancelled before the task got to run
+            await self._finish(job, CANCELLED)
+        return self._public(job)
+
+    async def events(self, job_id: str) -> AsyncIterator[Dict]:
+        """Yield the job's current state, then every change until it finishes"""
+        job = self._active.get(job_id)
+        if job is None:
+            job = await run_blocking('database', self._load, job_id)
+            if job is not None:
+                yield {'type': job['status'], 'job': self._public(job)}
+            return
+
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, []).append(queue)
+        try:
+            event = {'type': job['status'], 'job': self._public(job)}
+            yield event
+            while event['type'] not in TERMINAL:
+                event = await queue.get()
+                yield event
+        finally:
+            self._subscribers[job_id].remove(queue)
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+
+    async def _worker(self) -> None:
+        while True:
+            job = self._active.get(await self._queue.get())
+            if job is None or job['status'] != QUEUED:
+                continue  # Cancelled while queued
+            task = asyncio.create_task(self._execute(job))
+            self._running[job['id']] = task
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.done():
+                    raise  # The worker itself is stopping
+            finally:
+                self._running.pop(job['id'], None)
+
+    async def _execute(self, job: Dict) -> None:
+        token = begin_request(_ProgressStages(self._loop, lambda name, seconds: self._on_stage(job, name, seconds)))
+        try:
+            job.update(status=RUNNING, started_at=time.time())
+            self._notify(job, RUNNING)
+            await run_blocking('database', self._save, _snapshot(job))
+            with extended_timeouts(self.timeout_factor):
+                result = await self._handlers[job['type']](job['params'])
+        except asyncio.CancelledError:
+            await self._finish(job, CANCELLED)
+            return
+        except JobFailure as e:
+            await self._finish(job, FAILED, error={'status_code': e.status_code, 'detail': e.detail})
+        except Exception as e:
+            log_event('job_failed', level=logging.WARNING, job_id=job['id'], job_type=job['type'], error=str(e))
+            await self._finish(job, FAILED, error={'status_code': 500, 'detail': str(e)})
+        else:
+            await self._finish(job, COMPLETED, result=result)
+        finally:
+            end_request(token)
+
+    def _on_stage(self, job: Dict, name: str, seconds: float) -> None:
+        progress = job['progress']
+        progress['stages_completed'] += 1
+        progress['last_stage'] = name
+        progress['elapsed_seconds'] = round(time.time() - job['started_at'], 3)
+        self._notify(job, 'progress')
+
+    async def _finish(self, job: Dict, status: str, result: Any = None, error: Optional[Dict] = None) -> None:
+        now = time.time()
+        job.update(status=status, result=result, error=error, finished_at=now, expires_at=now + self.ttl)
+        self._stats[status] += 1
+        # Only completed jobs are reused, so resubmitting a failed request runs it again
+        await run_blocking('database', self._save, _snapshot(job))
+        self._notify(job, status)
+        self._active.pop(job['id'], None)
+        self._by_key.pop(job['key'], None)
+        log_event('job_finished', job_id=job['id'], job_type=job['type'], status=status,
+                  seconds=round(now - (job['started_at'] or job['created_at']), 3))
+
+    def _track(self, job: Dict) -> None:
+        self._active[job['id']] = job
+        self._by_key[job['key']] = job['id']
+
+    def _notify(self, job: Dict, event_type: str) -> None:
+        event = {'type': event_type, 'job': self._public(job)}
+        for queue in self._subscribers.get(job['id'], []):
+            queue.put_nowait(event)
+
+    def _public(self, job: Dict) -> Dict:
+        return {
+            'job_id': job['id'],
+            'type': job['type'],
+            'status': job['status'],
+            'progress': dict(job['progress']),
+            'created_at': _iso(job['created_at']),
+            'started_at': _iso(job['started_at']),
+            'finished_at': _iso(job['finished_at']),
+            'expires_at': _iso(job['expires_at']),
+            'result': job['result'],
+            'error': job['error']
+        }
+
+    async def _sweep(self) -> None:
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL_SECONDS)
+            try:
+                removed = await run_blocking('database', self._delete_expired)
+                if removed:
+                    log_event('jobs_expired', count=removed)
+            except Exception as e:
+                log_event('job_sweep_failed', level=logging.WARNING, error=str(e))
+
+    def stats(self) -> Dict:
+        statuses = [job['status'] for job in self._active.values()]
+        return {
+            **self._stats,
+            'queued': statuses.count(QUEUED),
+            'running': statuses.count(RUNNING),
+            'subscribers': sum(len(queues) for queues in self._subscribers.values()),
+            'workers': self.workers,
+            'max_queued': self.max_queued,
+            'ttl': self.ttl
+        }
+
+    # SQLite persistence; these block, so callers run them on the database executor
+
+    def _db(self) -> sqlite3.Connection:
+        """Open the database and create the table on first use"""
+        with self._lock:
+            if self._conn is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                with conn:
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS jobs (
+                            id TEXT PRIMARY KEY,
+                            key TEXT,
+                            type TEXT NOT NULL,
+                            status TEXT NOT NULL,
+                            payload TEXT NOT NULL,
+                            expires_at REAL NOT NULL
+                        )
+                    """)
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_key ON jobs (key, status)")
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_expires ON jobs (expires_at)")
+                self._conn = conn
+            return self._conn
+
+    def _save(self, job: Dict) -> None:
+        with self._lock, self._db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, key, type, status, payload, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job['id'], job['key'], job['type'], job['status'], json.dumps(job, default=str), job['expires_at'])
+            )
+
+    def _load(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT payload FROM jobs WHERE id = ? AND expires_at > ?", (job_id, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _find_completed(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT payload FROM jobs WHERE key = ? AND status = ? AND expires_at > ? ORDER BY expires_at DESC LIMIT 1",
+                (key, COMPLETED, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _load_unfinished(self) -> List[Dict]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT payload FROM jobs WHERE status IN (?, ?) AND expires_at > ?", (QUEUED, RUNNING, time.time())
+            ).fetchall()
+        return sorted((json.loads(row[0]) for row in rows), key=lambda job: job['created_at'])
+
+    def _delete_expired(self) -> int:
+        with self._lock, self._db() as conn:
+            return conn.execute("DELETE FROM jobs WHERE expires_at <= ?", (time.time(),)).rowcount
+
+
+def _snapshot(job: Dict) -> Dict:
+    # Progress keeps changing on the event loop while the copy is serialized off it
+    return dict(job, progress=dict(job['progress']))
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+def job_manager_from_env() -> Optional[JobManager]:
+    """Build the job manager, or None when JOBS_ENABLED is off"""
+    if os.getenv('JOBS_ENABLED', 'true').lower() not in ('1', 'true', 'yes'):
+        return None
+    return JobManager(
+        path=os.getenv('JOB_STORE_PATH', 'soilsense_jobs.db'),
+        workers=int(os.getenv('JOB_WORKERS', 4)),
+        max_queued=int(os.getenv('JOB_MAX_QUEUED', 1000)),
+        ttl=float(os.getenv('JOB_TTL_SECONDS', 86400)),
+        timeout_factor=float(os.getenv('JOB_TIMEOUT_FACTOR', 5))
+    )
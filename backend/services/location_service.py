@@ -0,0 +1,357 @@
+import os
+import math
+import heapq
+import struct
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def parse_point(geom: Any) -> Optional[Tuple[float, float]]:
+    """Read (lon, lat) from a PostGIS point as returned by postgrest
+
+    Accepts hex (E)WKB, which is how geography columns come back over the
+    REST API, as well as WKT ('POINT(lon lat)', optionally 'SRID=4326;'
+    prefixed) and GeoJSON point dicts.
+    """
+    if geom is None:
+        return None
+    if isinstance(geom, dict):
+        coords = geom.get('coordinates') or []
+        return (float(coords[0]), float(coords[1])) if len(coords) >= 2 else None
+    if not isinstance(geom, str):
+        return None
+
+    text = geom.strip()
+    if text.upper().startswith('SRID='):
+        text = text.split(';', 1)[-1]
+    if text.upper().startswith('POINT'):
+        inner = text[text.find('(') + 1:text.rfind(')')].split()
+        try:
+            return float(inner[0]), float(inner[1])
+        except (IndexError, ValueError):
+            return None
+
+    try:
+        data = bytes.fromhex(text)
+    except ValueError:
+        return None
+    if len(data) < 21:
+        return None
+    endian = '<' if data[0] == 1 else '>'
+    (geom_type,) = struct.unpack(endian + 'I', data[1:5])
+    offset = 5
+    if geom_type & 0x20000000:
+        offset += 4  # SRID
+    # EWKB keeps Z/M/SRID in the high bits; ISO WKB encodes Z/M as 1001/2001/3001
+    if (geom_type & 0x0FFFFFFF) % 1000 != 1:
+        return None
+    if len(data) < offset + 16:
+        return None
+    return struct.unpack(endian + 'dd', data[offset:offset + 16])
+
+
+def haversine_km(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class LocationIndex:
+    """In-process map from location names, snapped centroids and polygon hashes to location ids
+
+    Resolution prefers geometry over names: a polygon hash match, then a
+    stored centroid within snap_degrees, then an exact name. Locations that
+    already exist as duplicates (same snapped centroid) are merged onto the
+    lowest id when the index is loaded.
+
+    Centroids are also bucketed in a uniform grid of grid_degrees cells for
+    bounding-box and nearest-neighbour queries. The grid does not wrap at
+    the antimeridian.
+    """
+
+    def __init__(self, snap_degrees: float = 1e-4, grid_degrees: float = 0.1):
+        self.snap_degrees = snap_degrees
+        self.grid_degrees = grid_degrees
+        self._lock = threading.RLock()
+        self._records: Dict[Any, Dict] = {}
+        self._by_name: Dict[str, Any] = {}
+        self._by_cell: Dict[Tuple[int, int], Any] = {}
+        self._by_polygon: Dict[str, Any] = {}
+        self._aliases: Dict[Any, Any] = {}
+        self._grid: Dict[Tuple[int, int], List[Tuple[float, float, Any]]] = {}
+        self._grid_bounds: Optional[List[int]] = None
+        self.loaded = False
+        self._stats = {'hits': 0, 'misses': 0, 'geometry_matches': 0}
+
+    def load(self, rows: Iterable[Dict]) -> int:
+        """Replace the index contents with rows from the locations table"""
+        with self._lock:
+            self._records.clear()
+            self._by_name.clear()
+            self._by_cell.clear()
+            self._by_polygon.clear()
+            self._aliases.clear()
+            self._grid.clear()
+            self._grid_bounds = None
+            for row in sorted(rows, key=lambda r: (r.get('id') is None, r.get('id'))):
+                self.add(row)
+            self.loaded = True
+            return len(self._records)
+
+    def add(self, row: Dict, polygon_hash: Optional[str] = None) -> Any:
+        """Index a locations row and return the id it resolves to
+
+        A row whose centroid snaps onto an existing location is recorded as
+        an alias of that location rather than as a new one.
+        """
+        location_id = row.get('id')
+        if location_id is None:
+            return None
+        point = parse_point(row.get('geom'))
+        if point is None and 'longitude' in row and 'latitude' in row:
+            point = (float(row['longitude']), float(row['latitude']))
+
+        with self._lock:
+            canonical = self._find_geometry(point, polygon_hash) if point or polygon_hash else None
+            if canonical is not None and canonical != location_id:
+                self._aliases[location_id] = canonical
+                self._by_name.setdefault(row.get('name'), canonical)
+                if polygon_hash:
+                    self._by_polygon.setdefault(polygon_hash, canonical)
+                return canonical
+
+            self._records[location_id] = {
+                'id': location_id,
+                'name': row.get('name'),
+                'longitude': point[0] if point else None,
+                'latitude': point[1] if point else None
+            }
+            if row.get('name') is not None:
+                self._by_name.setdefault(row['name'], location_id)
+            if point is not None:
+                self._by_cell.setdefault(self._cell(*point), location_id)
+                self._grid_insert(location_id, point)
+            if polygon_hash:
+                self._by_polygon.setdefault(polygon_hash, location_id)
+            return location_id
+
+    def resolve(self, location_data: Dict, by_name: bool = True) -> Optional[Any]:
+        """Return the id of an indexed location matching location_data, or None
+
+        Args:
+            location_data: Dict with name, longitude, latitude and optionally polygon_hash
+            by_name: Fall back to matching the name when no geometry matches
+        """
+        point = None
+        if location_data.get('longitude') is not None and location_data.get('latitude') is not None:
+            point = (float(location_data['longitude']), float(location_data['latitude']))
+
+        with self._lock:
+            location_id = self._find_geometry(point, location_data.get('polygon_hash'))
+            if location_id is not None:
+                self._stats['geometry_matches'] += 1
+            elif by_name:
+                location_id = self._by_name.get(location_data.get('name', 'Unnamed Location'))
+            self._stats['hits' if location_id is not None else 'misses'] += 1
+            return location_id
+
+    def remember(self, location_data: Dict, location_id: Any) -> None:
+        """Record that location_data resolved to location_id (e.g. after a database lookup)"""
+        with self._lock:
+            location_id = self._aliases.get(location_id, location_id)
+            if location_id not in self._records:
+                self.add(dict(location_data, id=location_id), location_data.get('polygon_hash'))
+                return
+            if location_data.get('name') is not None:
+                self._by_name.setdefault(location_data['name'], location_id)
+            if location_data.get('polygon_hash'):
+                self._by_polygon.setdefault(location_data['polygon_hash'], location_id)
+
+    def same_geometry(self, a: Dict, b: Dict) -> bool:
+        """Whether two location_data dicts describe the same field"""
+        if a.get('polygon_hash') and a.get('polygon_hash') == b.get('polygon_hash'):
+            return True
+        try:
+            return max(
+                abs(float(a['longitude']) - float(b['longitude'])),
+                abs(float(a['latitude']) - float(b['latitude']))
+            ) <= self.snap_degrees
+        except (KeyError, TypeError, ValueError):
+            return False
+
+    def within(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float, limit: Optional[int] = None) -> List[Dict]:
+        """Locations whose centroid lies inside a bounding box, in id order
+
+        Args:
+            limit: Stop after this many matches (the lowest ids are not
+                guaranteed once truncated; cells are scanned in grid order)
+        """
+        with self._lock:
+            if self._grid_bounds is None:
+                return []
+            gx0, gy0, gx1, gy1 = self._grid_bounds
+            x0, y0 = self._grid_cell(min_lon, min_lat)
+            x1, y1 = self._grid_cell(max_lon, max_lat)
+            x0, y0, x1, y1 = max(x0, gx0), max(y0, gy0), min(x1, gx1), min(y1, gy1)
+
+            # Large boxes touch mostly empty cells; walk occupied cells instead
+            if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self._grid):
+                cells = [cell for cell in self._grid if x0 <= cell[0] <= x1 and y0 <= cell[1] <= y1]
+            else:
+                cells = [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+            ids: List[Any] = []
+            for x, y in cells:
+                entries = self._grid.get((x, y))
+                if not entries:
+                    continue
+                # Interior cells are entirely inside the box: no per-point test
+                if x0 < x < x1 and y0 < y < y1:
+                    ids.extend(entry[2] for entry in entries)
+                else:
+                    ids.extend(
+                        location_id for lon, lat, location_id in entries
+                        if min_lon <= lon <= max_lon and min_lat <= lat <= max_lat
+                    )
+                if limit is not None and len(ids) >= limit:
+                    return [dict(self._records[location_id]) for location_id in ids[:limit]]
+            ids.sort()
+            return [dict(self._records[location_id]) for location_id in ids]
+
+    def nearest(self, lon: float, lat: float, k: int = 1, max_km: Optional[float] = None) -> List[Dict]:
+        """The k locations closest to a point, nearest first, with distance_km
+
+        Searches rings of grid cells outward from the query cell, ranking by
+        a flat-earth distance scaled at the query latitude, and stops once no
+        unvisited cell can hold anything closer than the k-th candidate. The
+        shortlist is then re-ranked by great-circle distance.
+        """
+        with self._lock:
+            if self._grid_bounds is None or k <= 0:
+                return []
+            gx0, gy0, gx1, gy1 = self._grid_bounds
+            cx, cy = self._grid_cell(lon, lat)
+            first_ring = max(gx0 - cx, cx - gx1, gy0 - cy, cy - gy1, 0)
+            max_ring = max(cx - gx0, gx1 - cx, cy - gy0, gy1 - cy, 0)
+
+            # Anything outside ring r is at least r cells away along one axis
+            lon_scale = max(math.cos(math.radians(lat)), 1e-6)
+            ring_degrees = self.grid_degrees * min(lon_scale, 1.0)
+            limit_degrees = max_km / KM_PER_DEGREE if max_km is not None else None
+
+            distances: List[float] = []
+            candidates: List[Tuple[float, float, Any]] = []
+            for ring in range(first_ring, max_ring + 1):
+                for cell in _ring_cells(cx, cy, ring, self._grid_bounds):
+                    for entry in self._grid.get(cell, ()):
+                        dx = (entry[0] - lon) * lon_scale
+                        dy = entry[1] - lat
+                        distances.append(math.sqrt(dx * dx + dy * dy))
+                        candidates.append(entry)
+                bound = ring * ring_degrees
+                if len(distances) >= k and heapq.nsmallest(k, distances)[-1] <= bound:
+                    break
+                if limit_degrees is not None and bound > limit_degrees:
+                    break
+
+            # Flat and great-circle rankings can disagree on near-ties, so
+            # re-rank a slightly larger shortlist exactly
+            shortlist = heapq.nsmallest(2 * k + 4, range(len(candidates)), key=distances.__getitem__)
+            ranked = sorted(
+                (haversine_km(lon, lat, candidates[i][0], candidates[i][1]), candidates[i][2]) for i in shortlist
+            )
+            return [
+                dict(self._records[location_id], distance_km=round(distance, 4))
+                for distance, location_id in ranked[:k]
+                if max_km is None or distance <= max_km
+            ]
+
+    def get(self, location_id: Any) -> Optional[Dict]:
+        with self._lock:
+            record = self._records.get(self._aliases.get(location_id, location_id))
+            return dict(record) if record else None
+
+    def records(self) -> List[Dict]:
+        """Every indexed location (duplicates merged), as copies"""
+        with self._lock:
+            return [dict(record) for record in self._records.values()]
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['locations'] = len(self._records)
+            stats['names'] = len(self._by_name)
+            stats['polygons'] = len(self._by_polygon)
+            stats['merged_duplicates'] = len(self._aliases)
+            stats['loaded'] = self.loaded
+        return stats
+
+    def _cell(self, lon: float, lat: float) -> Tuple[int, int]:
+        return (math.floor(lon / self.snap_degrees), math.floor(lat / self.snap_degrees))
+
+    def _grid_cell(self, lon: float, lat: float) -> Tuple[int, int]:
+        return (math.floor(lon / self.grid_degrees), math.floor(lat / self.grid_degrees))
+
+    def _grid_insert(self, location_id: Any, point: Tuple[float, float]) -> None:
+        cell = self._grid_cell(*point)
+        self._grid.setdefault(cell, []).append((point[0], point[1], location_id))
+        if self._grid_bounds is None:
+            self._grid_bounds = [cell[0], cell[1], cell[0], cell[1]]
+        else:
+            bounds = self._grid_bounds
+            bounds[0], bounds[1] = min(bounds[0], cell[0]), min(bounds[1], cell[1])
+            bounds[2], bounds[3] = max(bounds[2], cell[0]), max(bounds[3], cell[1])
+
+    def _find_geometry(self, point: Optional[Tuple[float, float]], polygon_hash: Optional[str]) -> Optional[Any]:
+        if polygon_hash and polygon_hash in self._by_polygon:
+            return self._by_polygon[polygon_hash]
+        if point is None:
+            return None
+
+        # Look in the neighbouring cells too, so centroids either side of a
+        # cell boundary still match when they are within snap_degrees
+        cx, cy = self._cell(*point)
+        best, best_distance = None, None
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                location_id = self._by_cell.get((cx + dx, cy + dy))
+                if location_id is None:
+                    continue
+                record = self._records[location_id]
+                distance = max(abs(record['longitude'] - point[0]), abs(record['latitude'] - point[1]))
+                if distance <= self.snap_degrees and (best_distance is None or distance < best_distance):
+                    best, best_distance = location_id, distance
+        return best
+
+
+def _ring_cells(cx: int, cy: int, ring: int, bounds: List[int]):
+    """Grid cells at Chebyshev distance ring from (cx, cy), clipped to bounds"""
+    x0, y0, x1, y1 = bounds
+    if ring == 0:
+        if x0 <= cx <= x1 and y0 <= cy <= y1:
+            yield (cx, cy)
+        return
+    for y in (cy - ring, cy + ring):
+        if y0 <= y <= y1:
+            for x in range(max(cx - ring, x0), min(cx + ring, x1) + 1):
+                yield (x, y)
+    for x in (cx - ring, cx + ring):
+        if x0 <= x <= x1:
+            for y in range(max(cy - ring + 1, y0), min(cy + ring - 1, y1) + 1):
+                yield (x, y)
+
+
+def location_index_from_env() -> LocationIndex:
+    # ~11 m at the equator; centroids closer than this are treated as the same field
+    return LocationIndex(
+        snap_degrees=float(os.getenv('LOCATION_SNAP_DEGREES', 1e-4)),
+        grid_degrees=float(os.getenv('LOCATION_GRID_DEGREES', 0.1))
+    )
@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Stage timings for the current request, as (stage, seconds) pairs. The list
+# is shared by reference with executor threads, see executor_service.
+_request_stages: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    'request_stages', default=None
+)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, key)} {value:g}')
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with optional labels"""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [per-bucket counts..., sum, count]
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for i, bound in enumerate(self.buckets):
+                    le = 'le="%g"' % bound
+                    lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, le)} {series[i]}')
+                le = 'le="+Inf"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, le)} {series[-1]}')
+                lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {series[-2]:.6f}')
+                lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {series[-1]}')
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics and gauge collectors and renders Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Callable[[], List[Tuple[str, str, Dict[str, str], float]]]] = []
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], List[Tuple[str, str, Dict[str, str], float]]]) -> None:
+        """Register a callback returning (name, help, labels, value) gauge samples at scrape time"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+
+        gauges: Dict[str, Tuple[str, List[str]]] = {}
+        for collector in self._collectors:
+            try:
+                samples = collector()
+            except Exception:
+                continue
+            for name, help_text, labels, value in samples:
+                if value is None:
+                    continue
+                keys = tuple(sorted(labels))
+                sample = f'{name}{_format_labels(keys, tuple(labels[k] for k in keys))} {float(value):g}'
+                gauges.setdefault(name, (help_text, []))[1].append(sample)
+        for name, (help_text, samples) in gauges.items():
+            lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} gauge'])
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    'soilsense_stage_seconds',
+    'Time spent in each request processing stage',
+    labels=('stage',)
+)
+stage_errors = registry.counter(
+    'soilsense_stage_errors_total',
+    'Stages that raised an exception',
+    labels=('stage',)
+)
+http_request_seconds = registry.histogram(
+    'soilsense_http_request_seconds',
+    'HTTP request latency by route',
+    labels=('method', 'route')
+)
+http_requests = registry.counter(
+    'soilsense_http_requests_total',
+    'HTTP requests by route and status code',
+    labels=('method', 'route', 'status')
+)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as a named stage in the stage histogram and the current request's timings"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        stage_errors.inc(stage=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, stage=name)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages.append((name, elapsed))
+
+
+def begin_request(stages: Optional[List[Tuple[str, float]]] = None) -> contextvars.Token:
+    """Start collecting stage timings for the current request
+
+    stages may be a list subclass that reacts to appends, e.g. to report
+    progress as stages complete.
+    """
+    return _request_stages.set([] if stages is None else stages)
+
+
+def end_request(token: contextvars.Token) -> List[Tuple[str, float]]:
+    """Stop collecting and return the request's stage timings"""
+    stages = _request_stages.get() or []
+    _request_stages.reset(token)
+    return stages
+
+
+def current_stages() -> Dict[str, float]:
+    """Stage timings so far for the current request, in milliseconds, summed per stage"""
+    totals: Dict[str, float] = {}
+    for name, seconds in _request_stages.get() or []:
+        totals[name] = totals.get(name, 0.0) + seconds * 1000
+    return {name: round(ms, 2) for name, ms in totals.items()}
+
+
+def server_timing_header(stages: List[Tuple[str, float]], total_seconds: float) -> str:
+    """Format stage timings as a Server-Timing header value"""
+    totals: Dict[str, float] = {}
+    for name, seconds in stages:
+        totals[name] = totals.get(name, 0.0) + seconds
+    parts = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in totals.items()]
+    parts.append(f'total;dur={total_seconds * 1000:.1f}')
+    return ', '.join(parts)
+
+
+# Structured, sampled request logging. Errors are always logged; routine
+# events are kept with probability LOG_SAMPLE_RATE.
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 0.1))
+
+logger = logging.getLogger('soilsense')
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    logger.propagate = False
+
+
+def log_event(event: str, level: int = logging.INFO, sample: bool = True, **fields) -> None:
+    """Emit one JSON log line, sampled unless level is WARNING or above or sample is False"""
+    if sample and level < logging.WARNING and random.random() >= LOG_SAMPLE_RATE:
+        return
+    record = {'ts': round(time.time(), 3), 'event': event}
+    record.update(fields)
+    logger.log(level, json.dumps(record, default=str))
@@ -0,0 +1,288 @@
+import os
+import json
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import suppress
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from services.cache_service import polygon_hash
+from services.executor_service import TokenBucket, run_blocking
+from services.location_service import LocationIndex
+from services.metrics_service import log_event
+
+# Metres per degree of latitude, for buffering a location's point into a polygon
+METRES_PER_DEGREE = 111_320
+
+# Scores at or above this count as degraded when deciding what to refresh first
+DEGRADED_SCORE = 50
+
+# Seconds between checkpoint writes while a cycle is running
+CHECKPOINT_EVERY_SECONDS = 5.0
+
+
+class FleetMonitor:
+    """Re-analyzes every monitored location in the background
+
+    Each cycle takes the locations from the location index, picks those whose
+    last result is older than max_age (half that for degrading or degraded
+    sites), and analyzes them most-urgent first: never analyzed, then by
+    staleness plus how fast the score is rising. Work runs on concurrency
+    workers that share a token bucket sized to the Earth Engine quota, and
+    results are saved like interactive analyses.
+
+    Per-site state (last run, last result, failures, the polygon to use) is
+    checkpointed to a JSON file, so a restart resumes where the last cycle
+    stopped and can serve fresh results straight away.
+    """
+
+    def __init__(
+        self,
+        locations: LocationIndex,
+        analyze: Callable[[str, List[List[float]], str], Awaitable[Dict]],
+        save: Callable[[Dict, Dict], Awaitable[None]],
+        interval: float = 3600,
+        max_age: float = 86400,
+        concurrency: int = 4,
+        rate_per_minute: float = 60,
+        buffer_metres: float = 250,
+        checkpoint_path: Optional[str] = None
+    ):
+        self.locations = locations
+        self.analyze = analyze
+        self.save = save
+        self.interval = interval
+        self.max_age = max_age
+        self.concurrency = concurrency
+        self.buffer_metres = buffer_metres
+        self.checkpoint_path = checkpoint_path
+        self.bucket = TokenBucket(rate_per_minute / 60, capacity=max(1.0, float(concurrency)))
+
+        self._sites: Dict[str, Dict] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        self._last_checkpoint = 0.0
+        self._cycle: Dict = {}
+        self._stats = {'cycles': 0, 'analyzed': 0, 'failed': 0, 'served_fresh': 0}
+        self._load_checkpoint()
+
+    async def start(self) -> None:
+        """Start the scheduling loop on the running event loop"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the loop and checkpoint whatever finished"""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        self.save_checkpoint()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                log_event('monitor_cycle_failed', level=logging.WARNING, error=str(e))
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> Dict:
+        """Analyze every due location once; returns the cycle summary"""
+        if not self.locations.loaded:
+            return {}
+        now = time.time()
+        due = self.due_locations(now)
+        queue = deque(due)
+        self._running = True
+        self._cycle = {
+            'started_at': datetime.now().isoformat(),
+            'due': len(due),
+            'completed': 0,
+            'failed': 0
+        }
+        start = time.perf_counter()
+
+        async def worker():
+            while queue:
+                location = queue.popleft()
+                await self.bucket.acquire()
+                await self._refresh(location)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(due)))))
+        finally:
+            self._running = False
+            self._cycle['seconds'] = round(time.perf_counter() - start, 3)
+            self._stats['cycles'] += 1
+            await self._checkpoint()
+
+        log_event('monitor_cycle_completed', sample=False, **self._cycle)
+        return dict(self._cycle)
+
+    def due_locations(self, now: float) -> List[Dict]:
+        """Locations due for a refresh, most urgent first"""
+        due = []
+        for location in self.locations.records():
+            if location['longitude'] is None and not self._site(location['id']).get('polygon'):
+                continue
+            urgency = self._urgency(self._site(location['id']), now)
+            if urgency is not None:
+                due.append((urgency, location))
+        due.sort(key=lambda item: item[0], reverse=True)
+        return [location for _, location in due]
+
+    def _urgency(self, site: Dict, now: float) -> Optional[float]:
+        """How overdue a site is, or None if it isn't due yet"""
+        if site.get('failures') and now - site['last_attempt'] < min(self.max_age, self.interval * 2 ** (site['failures'] - 1)):
+            return None  # Back off sites that keep failing
+        last_run = site.get('last_run')
+        if last_run is None:
+            return math.inf
+
+        score = site.get('score') or 0
+        rising = max(0.0, score - site.get('previous_score', score))
+        max_age = self.max_age / 2 if rising > 0 or score >= DEGRADED_SCORE else self.max_age
+        age = now - last_run
+        if age < max_age:
+            return None
+        return age / max_age + rising / 10 + score / 100
+
+    async def _refresh(self, location: Dict) -> None:
+        site = self._site(location['id'])
+        polygon = site.get('polygon') or self.buffer_polygon(location['longitude'], location['latitude'])
+        end_date = datetime.now().strftime('%Y-%m-%d')
+        site['last_attempt'] = time.time()
+        try:
+            analysis = await self.analyze(location['name'], polygon, end_date)
+            await self.save(
+                {'name': location['name'], 'longitude': location['longitude'], 'latitude': location['latitude']},
+                analysis
+            )
+        except Exception as e:
+            site['failures'] = site.get('failures', 0) + 1
+            site['last_error'] = str(e)
+            self._cycle['failed'] += 1
+            self._stats['failed'] += 1
+            log_event('monitor_refresh_failed', level=logging.WARNING, location_id=location['id'], error=str(e))
+        else:
+            if 'score' in site:
+                site['previous_score'] = site['score']
+            site.update(
+                last_run=site['last_attempt'],
+                score=analysis.get('degradation_score'),
+                analysis=analysis,
+                polygon_hash=polygon_hash(polygon),
+                failures=0
+            )
+            site.pop('last_error', None)
+            self._cycle['completed'] += 1
+            self._stats['analyzed'] += 1
+
+        if time.monotonic() - self._last_checkpoint >= CHECKPOINT_EVERY_SECONDS:
+            await self._checkpoint()
+
+    def fresh_result(self, location_id: Any, polygon_digest: str) -> Optional[Dict]:
+        """The latest scheduled result for a location if it is younger than max_age
+
+        Only served when the scheduled run analyzed the same polygon
+        (polygon_digest is cache_service.polygon_hash of the request's
+        polygon); any other polygon at the location gets a live analysis.
+        """
+        site = self._sites.get(str(location_id))
+        if not site or not site.get('analysis') or time.time() - site['last_run'] >= self.max_age:
+            return None
+        if site.get('polygon_hash') != polygon_digest:
+            return None
+        self._stats['served_fresh'] += 1
+        return dict(site['analysis'], precomputed=True, computed_at=datetime.fromtimestamp(site['last_run']).isoformat())
+
+    def remember_polygon(self, location_id: Any, polygon: List[List[float]]) -> None:
+        """Use the polygon a user analyzed for this location instead of a buffered point
+
+        Matching the interactive polygon and date also means scheduled runs
+        warm the Earth Engine cache for the next interactive request. Only
+        the first polygon is kept: later requests can't repoint a site the
+        scheduler already monitors.
+        """
+        self._site(location_id).setdefault('polygon', polygon)
+
+    def buffer_polygon(self, lon: float, lat: float) -> List[List[float]]:
+        """Square of buffer_metres half-width around a point, as a closed ring"""
+        dlat = self.buffer_metres / METRES_PER_DEGREE
+        dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        return [
+            [lon - dlon, lat - dlat],
+            [lon + dlon, lat - dlat],
+            [lon + dlon, lat + dlat],
+            [lon - dlon, lat + dlat],
+            [lon - dlon, lat - dlat]
+        ]
+
+    def _site(self, location_id: Any) -> Dict:
+        # Keyed by string so ids survive the JSON checkpoint unchanged
+        return self._sites.setdefault(str(location_id), {})
+
+    async def _checkpoint(self) -> None:
+        # Copy on the event loop, which is the only writer; serialize off it
+        self._last_checkpoint = time.monotonic()
+        await run_blocking('database', self.save_checkpoint, {key: dict(site) for key, site in self._sites.items()})
+
+    def save_checkpoint(self, sites: Optional[Dict[str, Dict]] = None) -> None:
+        """Write per-site state atomically (temp file + rename)"""
+        self._last_checkpoint = time.monotonic()
+        if not self.checkpoint_path:
+            return
+        payload = json.dumps({'saved_at': time.time(), 'sites': self._sites if sites is None else sites}, default=str)
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _load_checkpoint(self) -> None:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return
+        try:
+            with open(self.checkpoint_path, 'r') as f:
+                self._sites = json.load(f).get('sites', {})
+        except (OSError, ValueError) as e:
+            log_event('monitor_checkpoint_unreadable', level=logging.WARNING, path=self.checkpoint_path, error=str(e))
+
+    def stats(self) -> Dict:
+        now = time.time()
+        analyzed = [site for site in self._sites.values() if site.get('last_run')]
+        return {
+            **self._stats,
+            'running': self._running,
+            'sites': len(self._sites),
+            'fresh': sum(1 for site in analyzed if now - site['last_run'] < self.max_age),
+            'failing': sum(1 for site in self._sites.values() if site.get('failures')),
+            'last_cycle': dict(self._cycle),
+            'interval': self.interval,
+            'max_age': self.max_age,
+            'concurrency': self.concurrency,
+            'rate_limit': self.bucket.stats()
+        }
+
+
+def monitor_from_env(locations: LocationIndex, analyze, save) -> Optional[FleetMonitor]:
+    """Build the fleet monitor, or None when MONITOR_ENABLED is off"""
+    if os.getenv('MONITOR_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+        return None
+    checkpoint_path = os.getenv('MONITOR_CHECKPOINT_PATH', 'soilsense_monitor_checkpoint.json')
+    return FleetMonitor(
+        locations,
+        analyze,
+        save,
+        interval=float(os.getenv('MONITOR_INTERVAL_SECONDS', 3600)),
+        max_age=float(os.getenv('MONITOR_MAX_AGE_SECONDS', 86400)),
+        concurrency=int(os.getenv('MONITOR_CONCURRENCY', 4)),
+        rate_per_minute=float(os.getenv('MONITOR_EE_REQUESTS_PER_MINUTE', 60)),
+        buffer_metres=float(os.getenv('MONITOR_BUFFER_METRES', 250)),
+        checkpoint_path=checkpoint_path if checkpoint_path.lower() != 'none' else None
+    )
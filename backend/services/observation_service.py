@@ -0,0 +1,237 @@
+import os
+import json
+import asyncio
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+from weakref import WeakValueDictionary
+
+from services.cache_service import polygon_hash
+from services.executor_service import run_blocking
+
+# Re-query this many days before the stored coverage end, so scenes that were
+# ingested late by the imagery provider are still picked up
+DEFAULT_LOOKBACK_DAYS = 7
+
+
+class ObservationStore:
+    """Per-location NDVI observation store that only fetches new scenes
+
+    Observations are keyed by (location_id, polygon hash, scene id). For each
+    key the store remembers the contiguous date range already reduced, so a
+    later request only fetches the part of its window outside that range.
+    Each scene's feature properties are kept whole, so stored scenes come
+    back in the same shape as a fresh fetch.
+    """
+
+    def __init__(self, path: str, lookback_days: int = DEFAULT_LOOKBACK_DAYS):
+        self.path = path
+        self.lookback_days = lookback_days
+        self._lock = threading.RLock()
+        # Weak, so a key's lock is dropped once no request holds or awaits it
+        self._key_locks: 'WeakValueDictionary[tuple, asyncio.Lock]' = WeakValueDictionary()
+        self._stats = {
+            'full_fetches': 0,
+            'delta_fetches': 0,
+            'store_hits': 0,
+            'days_requested': 0,
+            'days_fetched': 0
+        }
+        self._conn: Optional[sqlite3.Connection] = None
+
+    async def get_time_series_async(
+        self,
+        location_id: int,
+        polygon: List[List[float]],
+        start_date: str,
+        end_date: str,
+        fetch: Callable[[List[List[float]], str, str], Awaitable[List[Dict]]]
+    ) -> List[Dict]:
+        """Return the NDVI time series for a location, fetching only missing dates
+
+        Store reads and writes run on the database executor. Each missing
+        window is fetched by awaiting fetch, so the fetches go through the
+        same admission control as any other imagery query and a store hit
+        makes no backend request at all.
+
+        Args:
+            location_id: ID from the locations table
+            polygon: List of [lon, lat] coordinates
+            start_date: Start date in YYYY-MM-DD format (inclusive)
+            end_date: End date in YYYY-MM-DD format (exclusive, as in filterDate)
+            fetch: Coroutine function (polygon, start_date, end_date) -> list of
+                features, e.g. an imagery backend's calculate_ndvi_time_series_async
+
+        Returns:
+            List of features with the same shape fetch returns, sorted by date
+        """
+        key = (location_id, polygon_hash(polygon))
+        async with self._key_lock(key):
+            coverage = await run_blocking('database', self._coverage, key)
+            windows = self._missing_windows(coverage, start_date, end_date)
+
+            for window_start, window_end in windows:
+                features = await fetch(polygon, window_start, window_end)
+                await run_blocking('database', self._store, key, features)
+
+            await run_blocking('database', self._record, key, coverage, windows, start_date, end_date)
+            return await run_blocking('database', self._load, key, start_date, end_date)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['fetched_ratio'] = (
+            round(stats['days_fetched'] / stats['days_requested'], 4) if stats['days_requested'] else 0.0
+        )
+        return stats
+
+    def _db(self) -> sqlite3.Connection:
+        """Open the database and create tables on first use"""
+        with self._lock:
+            if self._conn is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                with conn:
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS observations (
+                            location_id INTEGER NOT NULL,
+                            polygon_hash TEXT NOT NULL,
+                            scene_id TEXT NOT NULL,
+                            date TEXT NOT NULL,
+                            ndvi REAL,
+                            properties TEXT,
+                            PRIMARY KEY (location_id, polygon_hash, scene_id)
+                        )
+                    """)
+                    # Stores created before properties were kept get the column added
+                    columns = {row[1] for row in conn.execute("PRAGMA table_info(observations)")}
+                    if 'properties' not in columns:
+                        conn.execute("ALTER TABLE observations ADD COLUMN properties TEXT")
+                    conn.execute("""
+                        CREATE INDEX IF NOT EXISTS idx_observations_date
+                        ON observations (location_id, polygon_hash, date)
+                    """)
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS coverage (
+                            location_id INTEGER NOT NULL,
+                            polygon_hash TEXT NOT NULL,
+                            covered_start TEXT NOT NULL,
+                            covered_end TEXT NOT NULL,
+                            PRIMARY KEY (location_id, polygon_hash)
+                        )
+                    """)
+                self._conn = conn
+            return self._conn
+
+    def _missing_windows(self, coverage: Optional[tuple], start_date: str, end_date: str) -> List[tuple]:
+        if coverage is None:
+            return [(start_date, end_date)]
+
+        covered_start, covered_end = coverage
+        windows = []
+        if start_date < covered_start:
+            windows.append((start_date, covered_start))
+        if end_date > covered_end:
+            delta_start = _shift(covered_end, -self.lookback_days)
+            windows.append((max(delta_start, covered_start), end_date))
+        return windows
+
+    def _key_lock(self, key: tuple) -> asyncio.Lock:
+        # Only touched on the event loop, so no lock needed around the dict
+        lock = self._key_locks.get(key)
+        if lock is None:
+            lock = self._key_locks[key] = asyncio.Lock()
+        return lock
+
+    def _record(self, key: tuple, coverage: Optional[tuple], windows: List[tuple], start_date: str, end_date: str) -> None:
+        """Extend the stored coverage over the fetched windows and count the request"""
+        if windows:
+            covered_start = min(start_date, coverage[0]) if coverage else start_date
+            covered_end = max(end_date, coverage[1]) if coverage else end_date
+            self._set_coverage(key, covered_start, covered_end)
+
+        with self._lock:
+            self._stats['days_requested'] += _days_between(start_date, end_date)
+            self._stats['days_fetched'] += sum(_days_between(s, e) for s, e in windows)
+            if not windows:
+                self._stats['store_hits'] += 1
+            elif coverage is None:
+                self._stats['full_fetches'] += 1
+            else:
+                self._stats['delta_fetches'] += 1
+
+    def _coverage(self, key: tuple) -> Optional[tuple]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT covered_start, covered_end FROM coverage WHERE location_id = ? AND polygon_hash = ?",
+                key
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def _set_coverage(self, key: tuple, covered_start: str, covered_end: str) -> None:
+        with self._lock, self._db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO coverage (location_id, polygon_hash, covered_start, covered_end) "
+                "VALUES (?, ?, ?, ?)",
+                (*key, covered_start, covered_end)
+            )
+
+    def _store(self, key: tuple, features: List[Dict]) -> None:
+        rows = []
+        for feature in features:
+            properties = feature.get('properties', {})
+            date = properties.get('date')
+            if not date:
+                continue
+            rows.append((
+                *key,
+                str(feature.get('id') or date),
+                date,
+                properties.get('ndvi'),
+                json.dumps(properties, default=str)
+            ))
+        if not rows:
+            return
+        with self._lock, self._db() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO observations (location_id, polygon_hash, scene_id, date, ndvi, properties) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def _load(self, key: tuple, start_date: str, end_date: str) -> List[Dict]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT scene_id, date, ndvi, properties FROM observations "
+                "WHERE location_id = ? AND polygon_hash = ? AND date >= ? AND date < ? "
+                "ORDER BY date, scene_id",
+                (*key, start_date, end_date)
+            ).fetchall()
+        return [
+            {
+                'type': 'Feature',
+                'geometry': None,
+                'id': scene_id,
+                # Rows stored before properties were kept only have date and ndvi
+                'properties': json.loads(properties) if properties else {'date': date, 'ndvi': ndvi}
+            }
+            for scene_id, date, ndvi, properties in rows
+        ]
+
+
+def _shift(date: str, days: int) -> str:
+    return (datetime.strptime(date, '%Y-%m-%d') + timedelta(days=days)).strftime('%Y-%m-%d')
+
+
+def _days_between(start_date: str, end_date: str) -> int:
+    delta = datetime.strptime(end_date, '%Y-%m-%d') - datetime.strptime(start_date, '%Y-%m-%d')
+    return max(0, delta.days)
+
+
+observation_store = ObservationStore(
+    path=os.getenv('OBSERVATION_STORE_PATH', 'soilsense_observations.db'),
+    lookback_days=int(os.getenv('OBSERVATION_LOOKBACK_DAYS', DEFAULT_LOOKBACK_DAYS))
+)
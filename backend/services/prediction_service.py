@@ -1,86 +1,219 @@
 import numpy as np
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 import pickle
+import json
+import logging
 import os
+import threading
+
+from services.feature_service import extract_features_batch, feature_rows
+from services.forecast_service import FORECAST_HORIZONS, FORECAST_PATHS, monte_carlo_forecast
+from services.metrics_service import stage, log_event
+
+# Model file stem; <stem>.json or <stem>.ubj (native XGBoost) are preferred
+# over <stem>.pkl, which is only loaded when no native model exists
+MODEL_PATH = os.getenv('PREDICTION_MODEL_PATH', 'models/degradation_model')
+
+# 'linear' (the original projection) or 'monte_carlo' (percentile bands from
+# simulated trajectories, opt-in)
+FORECAST_MODES = ('monte_carlo', 'linear')
+FORECAST_MODE = os.getenv('PREDICTION_FORECAST_MODE', 'linear')
+if FORECAST_MODE not in FORECAST_MODES:
+    raise ValueError(f"PREDICTION_FORECAST_MODE must be one of {', '.join(FORECAST_MODES)}")
+
+# Feature order for models that don't record their own feature names. New
+# features go at the end so older unnamed models keep their leading columns.
+FEATURE_NAMES = (
+    'current_ndvi',
+    'ndvi_trend',
+    'ndvi_volatility',
+    'moisture',
+    'bare_soil',
+    'erosion_risk',
+    'time_since_last',
+    'ndvi_trend_30d',
+    'ndvi_mean_30d',
+    'ndvi_mean_90d',
+    'ndvi_momentum',
+    'ndvi_seasonal_anomaly',
+    'ndvi_drop_count',
+    'ndvi_largest_drop',
+    'days_since_last'
+)
 
 class PredictionService:
     """Service for predicting future soil degradation trends"""
     
-    def __init__(self):
+    def __init__(self, model_path: Optional[str] = None, forecast_mode: Optional[str] = None, forecast_paths: Optional[int] = None):
         self.model = None
-        self.model_path = 'models/degradation_model.pkl'
+        self.model_path = model_path or MODEL_PATH
+        self.forecast_mode = forecast_mode or FORECAST_MODE
+        self.forecast_paths = forecast_paths or FORECAST_PATHS
+        self.model_source: Optional[str] = None
+        self._model_loaded = False
+        self._model_lock = threading.Lock()
+        self._feature_names: Tuple[str, ...] = FEATURE_NAMES
+        self._probability_output = False
     
-    def predict_degradation_risk(self, historical_data: List[Dict], current_indicators: Dict) -> Dict:
-        """Predict 6-month degradation risk
+    def predict_degradation_risk(
+        self,
+        historical_data: List[Dict],
+        current_indicators: Dict,
+        forecast_mode: Optional[str] = None,
+        horizons: Optional[Tuple[int, ...]] = None
+    ) -> Dict:
+        """Predict degradation risk and its forecast over the horizons
         
         Args:
             historical_data: List of historical NDVI and indicator measurements
             current_indicators: Current soil health indicators
+            forecast_mode: 'monte_carlo' or 'linear' (default: the service's mode)
+            horizons: Forecast months (default FORECAST_HORIZONS)
         
         Returns:
             Dict with prediction, confidence, and risk factors
         """
+        return self.predict_degradation_risk_batch([(historical_data, current_indicators)], forecast_mode, horizons)[0]
+    
+    def predict_degradation_risk_batch(
+        self,
+        items: List[Tuple[List[Dict], Dict]],
+        forecast_mode: Optional[str] = None,
+        horizons: Optional[Tuple[int, ...]] = None
+    ) -> List[Dict]:
+        """Predict degradation risk for many locations with one model call
+        
+        Args:
+            items: (historical_data, current_indicators) per location
+            forecast_mode: 'monte_carlo' or 'linear' (default: the service's mode)
+            horizons: Forecast months (default FORECAST_HORIZONS)
+        
+        Returns:
+            One predict_degradation_risk result per item, in order
+        """
+        if not items:
+            return []
+        
+        forecast_mode = forecast_mode or self.forecast_mode
+        horizons = tuple(horizons or FORECAST_HORIZONS)
+        
         try:
-            # Extract features from historical data
-            features = self._extract_features(historical_data, current_indicators)
-            
-            # Make prediction using simple rule-based model
-            # In production, this would use the trained XGBoost model
-            risk_score = self._calculate_risk_score(features)
-            
-            # Generate forecast
-            forecast = self._generate_forecast(risk_score, current_indicators)
-            
-            return {
-                'risk_level': self._classify_risk(risk_score),
-                'risk_score': round(risk_score, 2),
-                'confidence': 0.78,
-                'forecast': forecast,
-                'key_drivers': self._identify_drivers(features),
-                'prediction_date': datetime.now().isoformat()
-            }
-            
+            with stage('feature_extraction'):
+                features = extract_features_batch([history for history, _ in items], [current for _, current in items])
+                rows = feature_rows(features)
+            risk_scores, scorer = self._score(features, rows)
+            if forecast_mode == 'monte_carlo':
+                with stage('forecast_simulation'):
+                    forecasts = self._simulate_forecasts(features, risk_scores, [current for _, current in items], horizons)
+            else:
+                forecasts = [self._generate_forecast(score, current, horizons) for score, (_, current) in zip(risk_scores, items)]
         except Exception as e:
-            return {
-                'error': f'Prediction failed: {str(e)}',
-                'risk_level': 'Unknown',
-                'risk_score': 0
-            }
+            return [self._error_result(e) for _ in items]
+        
+        results = []
+        for row, risk_score, forecast in zip(rows, risk_scores, forecasts):
+            try:
+                results.append({
+                    'risk_level': self._classify_risk(risk_score),
+                    'risk_score': round(risk_score, 2),
+                    'confidence': 0.78,
+                    'forecast': forecast,
+                    'key_drivers': self._identify_drivers(row),
+                    'prediction_date': datetime.now().isoformat(),
+                    'scorer': scorer
+                })
+            except Exception as e:
+                results.append(self._error_result(e))
+        
+        return results
     
-    def _extract_features(self, historical_data: List[Dict], current: Dict) -> Dict:
-        """Extract features for prediction"""
-        if not historical_data:
-            return current
-        
-        # Calculate trends
-        ndvi_values = [d.get('ndvi', 0.5) for d in historical_data]
-        ndvi_trend = self._calculate_trend(ndvi_values)
-        
-        # Feature engineering
-        features = {
-            'current_ndvi': current.get('ndvi', 0.5),
-            'ndvi_trend': ndvi_trend,
-            'ndvi_volatility': np.std(ndvi_values) if ndvi_values else 0,
-            'moisture': current.get('ndmi', 0.3),
-            'bare_soil': current.get('bare_soil_index', 0.2),
-            'erosion_risk': current.get('erosion_risk', 0.3),
-            'time_since_last': len(historical_data)
+    def _error_result(self, error: Exception) -> Dict:
+        return {
+            'error': f'Prediction failed: {str(error)}',
+            'risk_level': 'Unknown',
+            'risk_score': 0
         }
+    
+    def _score(self, features: Dict[str, np.ndarray], rows: List[Dict]) -> Tuple[List[float], str]:
+        """Risk scores for every location, from the model if one is available
+        
+        Args:
+            features: Feature columns from extract_features_batch
+            rows: The same features as one dict per location
+        
+        Returns:
+            (scores, scorer) where scorer is 'xgboost' or 'rules'
+        """
+        model = self._load_model()
+        if model is None:
+            return [self._calculate_risk_score(row) for row in rows], 'rules'
         
-        return features
+        matrix = self._feature_matrix(features, len(rows))
+        with stage('model_predict'):
+            predictions = np.asarray(model.inplace_predict(matrix), dtype=float).reshape(len(rows), -1)[:, -1]
+        if self._probability_output:
+            predictions = predictions * 100
+        return [float(score) for score in np.clip(predictions, 0, 100)], 'xgboost'
+    
+    def _feature_matrix(self, features: Dict[str, np.ndarray], count: int) -> np.ndarray:
+        """Stack feature columns into a float32 matrix in the model's feature order"""
+        missing = np.full(count, np.nan)
+        return np.column_stack([features.get(name, missing) for name in self._feature_names]).astype(np.float32)
     
-    def _calculate_trend(self, values: List[float]) -> float:
-        """Calculate linear trend in time series"""
-        if len(values) < 2:
-            return 0.0
+    def _load_model(self) -> Optional[Any]:
+        """Load the model once per process; None (rule-based scoring) if there isn't one"""
+        if self._model_loaded:
+            return self.model
         
-        x = np.arange(len(values))
-        y = np.array(values)
+        with self._model_lock:
+            if self._model_loaded:
+                return self.model
+            try:
+                with stage('model_load'):
+                    self.model, self.model_source = self._read_model()
+                if self.model is not None:
+                    if self.model.feature_names:
+                        self._feature_names = tuple(self.model.feature_names)
+                    else:
+                        self._feature_names = FEATURE_NAMES[:self.model.num_features()]
+                    objective = json.loads(self.model.save_config())['learner']['objective']['name']
+                    self._probability_output = objective.startswith('binary:')
+                    log_event('prediction_model_loaded', sample=False, path=self.model_source, features=len(self._feature_names))
+            except Exception as e:
+                self.model = None
+                log_event('prediction_model_load_failed', level=logging.WARNING, path=self.model_path, error=str(e))
+            self._model_loaded = True
+            return self.model
+    
+    def _read_model(self) -> Tuple[Optional[Any], Optional[str]]:
+        stem, ext = os.path.splitext(self.model_path)
+        candidates = [self.model_path] if ext else [stem + '.json', stem + '.ubj', stem + '.pkl']
+        
+        for path in candidates:
+            if not os.path.exists(path):
+                continue
+            
+            import xgboost as xgb  # Deferred: only needed once a model file exists
+            
+            if path.endswith('.pkl'):
+                # Legacy format; only reached when no native model is present
+                with open(path, 'rb') as f:
+                    model = pickle.load(f)
+                booster = model.get_booster() if hasattr(model, 'get_booster') else model
+                if not isinstance(booster, xgb.Booster):
+                    raise TypeError(f"{path} does not contain an XGBoost model")
+                return booster, path
+            
+            booster = xgb.Booster()
+            booster.load_model(path)
+            return booster, path
         
-        # Simple linear regression
-        coeffs = np.polyfit(x, y, 1)
-        return coeffs[0]  # Slope
+        return None, None
+    
+    def _extract_features(self, historical_data: List[Dict], current: Dict) -> Dict:
+        """Extract features for prediction"""
+        return feature_rows(extract_features_batch([historical_data], [current]))[0]
     
     def _calculate_risk_score(self, features: Dict) -> float:
         """Calculate risk score from features"""
@@ -125,13 +258,13 @@ class PredictionService:
         else:
             return 'Critical'
     
-    def _generate_forecast(self, risk_score: float, current: Dict) -> List[Dict]:
-        """Generate 6-month forecast"""
+    def _generate_forecast(self, risk_score: float, current: Dict, horizons: Tuple[int, ...] = FORECAST_HORIZONS) -> List[Dict]:
+        """Linear forecast: the score rises by a tenth of the risk score per month"""
         forecast = []
         base_date = datetime.now()
         
         # Simulate degradation progression
-        for month in range(1, 7):
+        for month in horizons:
             forecast_date = base_date + timedelta(days=30 * month)
             
             # Simple degradation model
@@ -147,6 +280,41 @@ class PredictionService:
         
         return forecast
     
+    def _simulate_forecasts(self, features: Dict[str, np.ndarray], risk_scores: List[float], currents: List[Dict], horizons: Tuple[int, ...]) -> List[List[Dict]]:
+        """Monte Carlo forecasts for every location, with p10/p50/p90 score bands"""
+        start_scores = np.array([current.get('degradation_score', 50) for current in currents], dtype=float)
+        bands = monte_carlo_forecast(
+            start_scores,
+            np.asarray(risk_scores),
+            features['current_ndvi'],
+            features['ndvi_trend_30d'],
+            features['ndvi_monthly_volatility'],
+            horizons=horizons,
+            paths=self.forecast_paths
+        )
+        
+        base_date = datetime.now()
+        dates = [(base_date + timedelta(days=30 * month)).strftime('%Y-%m-%d') for month in horizons]
+        p10, p50, p90 = (bands[key].round(1).tolist() for key in ('p10', 'p50', 'p90'))
+        p_degraded = bands['p_degraded'].round(3).tolist()
+        return [
+            [
+                {
+                    'month': month,
+                    'date': dates[h],
+                    'projected_score': p50[i][h],
+                    'p10': p10[i][h],
+                    'p50': p50[i][h],
+                    'p90': p90[i][h],
+                    'p_degraded': p_degraded[i][h],
+                    # Narrower bands mean a more certain projection
+                    'confidence': round(max(0.0, 1 - (p90[i][h] - p10[i][h]) / 100), 2)
+                }
+                for h, month in enumerate(horizons)
+            ]
+            for i in range(len(currents))
+        ]
+    
     def _identify_drivers(self, features: Dict) -> List[str]:
         """Identify key risk drivers"""
         drivers = []
@@ -166,4 +334,10 @@ class PredictionService:
         if features['ndvi_volatility'] > 0.1:
             drivers.append('Unstable vegetation cover')
         
+        if features.get('ndvi_seasonal_anomaly', 0) < -0.1:
+            drivers.append('Vegetation below seasonal norm')
+        
+        if features.get('ndvi_drop_count', 0) > 0:
+            drivers.append('Recent sharp vegetation loss')
+        
         return drivers[:3]  # Return top 3 drivers
@@ -0,0 +1,275 @@
+import os
+import json
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import suppress
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from services.executor_service import run_blocking
+from services.metrics_service import log_event
+
+# SQLSTATE classes for rows the database refuses rather than failing to reach
+# it: data exceptions, integrity constraint violations, undefined columns
+REJECTED_SQLSTATE_CLASSES = ('22', '23', '42')
+
+
+def is_rejected(error: BaseException) -> bool:
+    """Whether a write failed because of the rows themselves, so retrying can't help
+
+    Postgres errors carry a SQLSTATE code and PostgREST's own errors a PGRST
+    code, where group 0 (PGRST0xx) means the database couldn't be reached.
+    Anything without a code (timeouts, connection errors) counts as the
+    database being unavailable.
+    """
+    code = str(getattr(error, 'code', None) or '')
+    if code.startswith('PGRST'):
+        return not code.startswith('PGRST0')
+    return code[:2] in REJECTED_SQLSTATE_CLASSES
+
+
+class WriteBehindQueue:
+    """Buffers analysis writes and flushes them to the database in bulk
+
+    enqueue() returns immediately. A background task flushes when max_batch
+    entries are waiting or every flush_interval seconds, with one multi-row
+    insert per table. Batches that fail are appended to a JSONL journal and
+    replayed before the next flush, so a database outage loses nothing.
+
+    A batch the database rejects for its content is retried row by row, and
+    rows that still fail are moved to <journal>.rejected, so one bad row
+    can't hold up the queue. Unreadable journal lines (e.g. from a crash
+    mid-append) are moved to <journal>.corrupt.
+    """
+
+    def __init__(self, db, max_batch: int = 100, flush_interval: float = 2.0, journal_path: Optional[str] = None):
+        self.db = db
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.journal_path = journal_path
+
+        self._pending: deque = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._journal_entries = self._count_journal()
+        self._stats = {
+            'queued': 0,
+            'written': 0,
+            'flushes': 0,
+            'failed_flushes': 0,
+            'journaled': 0,
+            'replayed': 0,
+            'rejected': 0,
+            'corrupt': 0
+        }
+
+    def enqueue(self, location_data: Dict, analysis_result: Dict) -> None:
+        """Queue an analysis for saving; the timestamp is taken now, not at flush time"""
+        entry = {
+            'location': location_data,
+            'result': analysis_result,
+            'created_at': datetime.now().isoformat()
+        }
+        with self._lock:
+            self._pending.append(entry)
+            self._stats['queued'] += 1
+            full = len(self._pending) >= self.max_batch
+        if full and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def start(self) -> None:
+        """Start the background flush task on the running event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush task and write out everything still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        # Off the database executor, so no backend timeout: the process is
+        # exiting, and whatever can't be written must still reach the journal
+        await asyncio.to_thread(self.flush, True)
+
+    async def _run(self) -> None:
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            self._wake.clear()
+            try:
+                await run_blocking('database', self.flush)
+            except Exception as e:
+                log_event('write_flush_failed', level=logging.WARNING, error=str(e))
+
+    def flush(self, wait: bool = False) -> int:
+        """Replay the journal, then write queued entries in max_batch chunks
+
+        Args:
+            wait: Block until a flush already in progress finishes instead of returning
+
+        Returns:
+            Number of analysis rows written
+        """
+        if not self._flush_lock.acquire(blocking=wait):
+            return 0
+        try:
+            written, healthy = self._replay_journal()
+            while True:
+                with self._lock:
+                    if not healthy:
+                        # Database is down: don't pay a failing round trip per chunk
+                        batch = list(self._pending)
+                        self._pending.clear()
+                    else:
+                        batch = [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+                if not batch:
+                    break
+                if not healthy:
+                    self._journal(batch)
+                    break
+                saved, unsaved = self._write(batch)
+                written += saved
+                if unsaved:
+                    healthy = False
+                    self._journal(unsaved)
+            with self._lock:
+                self._stats['written'] += written
+            return written
+        finally:
+            self._flush_lock.release()
+
+    def _write(self, batch: List[Dict]) -> tuple:
+        """Save a batch; returns (rows written, entries left unsaved because the database is unavailable)"""
+        try:
+            written = self.db.save_analyses(batch)
+            with self._lock:
+                self._stats['flushes'] += 1
+            return written, []
+        except Exception as e:
+            with self._lock:
+                self._stats['failed_flushes'] += 1
+            log_event('write_flush_failed', level=logging.WARNING, entries=len(batch), error=str(e))
+            if not is_rejected(e):
+                return 0, batch
+
+        # Find the rows the database refuses; the rest still go in
+        written = 0
+        for i, entry in enumerate(batch):
+            try:
+                written += self.db.save_analyses([entry])
+            except Exception as e:
+                if not is_rejected(e):
+                    return written, batch[i:]
+                self._quarantine('.rejected', [json.dumps(entry, default=str)], 'rejected', error=str(e))
+        return written, []
+
+    def _quarantine(self, suffix: str, lines: List[str], stat: str, **fields) -> None:
+        """Set entries aside in <journal><suffix> for inspection, out of the replay path"""
+        with self._lock:
+            self._stats[stat] += len(lines)
+        if not self.journal_path:
+            log_event('write_entries_dropped', level=logging.ERROR, entries=len(lines), reason=stat, **fields)
+            return
+        path = self.journal_path + suffix
+        with open(path, 'a') as f:
+            for line in lines:
+                f.write(line.rstrip('\n') + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        log_event('write_entries_quarantined', level=logging.ERROR, entries=len(lines), reason=stat, path=path, **fields)
+
+    def _journal(self, entries: List[Dict]) -> None:
+        if not self.journal_path:
+            log_event('write_entries_dropped', level=logging.ERROR, entries=len(entries))
+            return
+        with open(self.journal_path, 'a') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            self._journal_entries += len(entries)
+            self._stats['journaled'] += len(entries)
+
+    def _replay_journal(self) -> tuple:
+        """Write journaled entries back to the database; returns (rows written, database reachable)"""
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            return 0, True
+
+        entries, corrupt = [], []
+        with open(self.journal_path, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    corrupt.append(line)
+        if corrupt:
+            self._quarantine('.corrupt', corrupt, 'corrupt')
+            self._rewrite_journal(entries)
+
+        written = 0
+        for start in range(0, len(entries), self.max_batch):
+            saved, unsaved = self._write(entries[start:start + self.max_batch])
+            written += saved
+            if unsaved:
+                remaining = unsaved + entries[start + self.max_batch:]
+                log_event('write_replay_failed', level=logging.WARNING, remaining=len(remaining))
+                self._rewrite_journal(remaining)
+                with self._lock:
+                    self._stats['replayed'] += written
+                return written, False
+
+        os.unlink(self.journal_path)
+        with self._lock:
+            self._journal_entries = 0
+            self._stats['replayed'] += written
+        return written, True
+
+    def _rewrite_journal(self, entries: List[Dict]) -> None:
+        tmp_path = self.journal_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+        with self._lock:
+            self._journal_entries = len(entries)
+
+    def _count_journal(self) -> int:
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            return 0
+        with open(self.journal_path, 'r') as f:
+            return sum(1 for line in f if line.strip())
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+            stats['journal_entries'] = self._journal_entries
+        stats['max_batch'] = self.max_batch
+        stats['flush_interval'] = self.flush_interval
+        return stats
+
+
+def write_queue_from_env(db) -> Optional[WriteBehindQueue]:
+    """Build the write-behind queue for db, or None when DB_WRITE_BEHIND is off"""
+    if os.getenv('DB_WRITE_BEHIND', 'true').lower() not in ('1', 'true', 'yes'):
+        return None
+    journal_path = os.getenv('DB_WRITE_JOURNAL_PATH', 'soilsense_write_journal.jsonl')
+    return WriteBehindQueue(
+        db,
+        max_batch=int(os.getenv('DB_WRITE_BATCH_SIZE', 100)),
+        flush_interval=float(os.getenv('DB_WRITE_FLUSH_SECONDS', 2.0)),
+        journal_path=journal_path if journal_path.lower() != 'none' else None
+    )
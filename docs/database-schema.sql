@@ -10,4 +10,13 @@ CREATE TABLE IF NOT EXISTS analysis_results (
     location_id INTEGER REFERENCES locations(id),
     result JSONB,
     created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
-);
\ No newline at end of file
+);
+
+-- History pages are read newest first per location and keyset-paginated on
+-- (created_at, id); this index serves each page as a single range scan
+CREATE INDEX IF NOT EXISTS analysis_results_location_created_idx
+    ON analysis_results (location_id, created_at DESC, id DESC);
+
+-- Spatial lookups on monitored locations
+CREATE INDEX IF NOT EXISTS locations_geom_gist_idx
+    ON locations USING GIST (geom);